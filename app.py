@@ -0,0 +1,105 @@
+"""
+Module with the application factory of the project. create_app() builds
+the WSGI application from the configuration: registers the routes,
+creates the connection pool and the mapper registry and wraps the
+application with the middleware. No database connection is opened here:
+the pool opens the connections on the first request of every worker
+process (and re-opens them after a fork), so the processes never share
+them.
+"""
+from core.decorators import UrlPaths
+from core.front_controllers import front_controller
+from core.middleware import AdmissionMiddleware, DeadlineMiddleware, \
+    GzipMiddleware, UnitOfWorkMiddleware
+from core.views import StatsView
+from core.wsgi_core import Application, LoggingApplication
+from mappers import ProjectMapperRegistry
+from orm.connections import ConnectionPool
+
+DEFAULT_CONFIG = {
+    # path to the SQLite database file
+    'database': 'test_db.sqlite3',
+    # pragmas overriding the default ones of the connection pool
+    'pragmas': None,
+    # url prefix and directory of the static files
+    'static_url': '/static/',
+    'static_directory': 'static',
+    # merge the commits of concurrent requests into group transactions
+    # written by a background thread (write-behind mode), and whether the
+    # responses wait for the group commits (otherwise the failed ones are
+    # only logged)
+    'write_behind': False,
+    'write_behind_wait': True,
+    # reserve the IDs of the new objects in blocks of this size in the
+    # database, so they're unique across the worker processes; None to
+    # number them per process until they're inserted
+    'id_block_size': None,
+    # compress the responses for the clients accepting gzip
+    'gzip': True,
+    # admission control: the maximum number of requests processed at once
+    # (None to admit all of them), the size of the queue of the waiting
+    # requests and how long they may wait before a 503 response
+    'max_concurrency': None,
+    'max_queue': 32,
+    'queue_timeout': 1.0,
+    # deadline (in seconds) of the views without their own timeout, None
+    # for no deadline; the views past their deadlines get 504 responses
+    'request_timeout': 10.0,
+    # url of the JSON metrics of the admission control and the deadlines,
+    # None to hide them
+    'stats_url': '/api/stats/',
+    # log every request in stdout (LoggingApplication)
+    'logging': False,
+    # compile all the templates when the application is created, e.g. in
+    # the master process before the workers are forked
+    'preload_templates': False,
+}
+
+
+def create_app(config: dict = None) -> Application:
+    """
+    Creates the WSGI application of the project.
+
+    :param config: configuration overriding the DEFAULT_CONFIG
+    :return: the application wrapped with the middleware
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    from views import register_routes
+
+    routes = UrlPaths()
+    register_routes(routes)
+    if config['static_url']:
+        routes.add_static(config['static_url'], config['static_directory'])
+
+    pool = ConnectionPool(config['database'], config['pragmas'])
+    registry = ProjectMapperRegistry(pool)
+    if config['write_behind']:
+        registry.enable_write_behind()
+    if config['id_block_size']:
+        registry.enable_id_allocation(config['id_block_size'])
+
+    application_class = LoggingApplication if config['logging'] \
+        else Application
+    application = application_class(
+        routes.URLS, [front_controller], routes.MOUNTS,
+        config['request_timeout'])
+    application = UnitOfWorkMiddleware(
+        application, registry, config['write_behind_wait'])
+    application = DeadlineMiddleware(application)
+    stats_sources = {'deadlines': application}
+    if config['gzip']:
+        application = GzipMiddleware(application)
+    if config['max_concurrency']:
+        application = AdmissionMiddleware(
+            application, config['max_concurrency'], config['max_queue'],
+            config['queue_timeout'])
+        stats_sources['admission'] = application
+    if config['stats_url']:
+        routes.add_route(config['stats_url'])(StatsView, stats_sources)
+    # exposed for the scripts working with the database of the application
+    application.mapper_registry = registry
+
+    if config['preload_templates']:
+        from core.templator import preload_templates
+        preload_templates()
+    return application
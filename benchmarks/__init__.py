@@ -0,0 +1,12 @@
+"""
+Benchmarks of the framework. They call the WSGI application directly
+(without sockets) on a synthetic database of a configurable size, and
+save the results as JSON, so that the runs on different commits can be
+compared. Run them from the root of the project:
+
+    python -m benchmarks routes --students 10000 --output before.json
+    python -m benchmarks compare before.json after.json
+
+The benchmarks work in a temporary directory, so neither the database
+nor the logs of the project are touched.
+"""
@@ -0,0 +1,331 @@
+"""
+Command line interface of the benchmarks, see the benchmarks package.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.dataset import Dataset  # noqa: E402
+from benchmarks.runner import measure  # noqa: E402
+from core.templator import BUNDLE_PATH  # noqa: E402
+
+
+def prepare_workdir(dataset: Dataset) -> str:
+    """
+    Creates a temporary working directory with the templates (and their
+    compiled bundle if it's been built) and the static files of the
+    project, the logs directory and the database
+    filled with the dataset, and makes it the current directory.
+
+    :param dataset: sizes of the dataset
+    :return: path to the directory
+    """
+    workdir = tempfile.mkdtemp(prefix='benchmarks-')
+    for name in ('templates', 'static', BUNDLE_PATH):
+        if os.path.exists(os.path.join(ROOT, name)):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    os.mkdir(os.path.join(workdir, 'logs'))
+    dataset.populate(os.path.join(workdir, 'test_db.sqlite3'),
+                     os.path.join(ROOT, 'migrations'))
+    os.chdir(workdir)
+    return workdir
+
+
+def build_application():
+    """
+    Builds the application of the project with the default configuration.
+    """
+    from app import create_app
+
+    return create_app()
+
+
+# Script measuring the startup in a fresh interpreter: the import of the
+# application factory, the creation of the application and the first
+# request. Prints the results as JSON.
+STARTUP_SCRIPT = """
+import json, sys
+from time import perf_counter
+sys.path.insert(0, sys.argv[1])
+start = perf_counter()
+from app import create_app
+imported = perf_counter()
+application = create_app()
+created = perf_counter()
+connections = len(application.mapper_registry.pool.connections)
+from benchmarks.runner import Scenario, call
+status = call(application, Scenario('index', '/').environ(0))[0]
+status = int(status.split()[0])
+served = perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'connections_at_startup': connections,
+    'first_request_status': status,
+    'modules': len(sys.modules),
+}))
+"""
+
+
+def metadata(arguments: argparse.Namespace) -> dict:
+    """
+    Returns the description of the run: commit, versions, time and
+    the parameters.
+
+    :param arguments: command line arguments
+    """
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+            text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'parameters': {key: value for key, value in vars(arguments).items()
+                       if key not in ('command', 'handler')},
+    }
+
+
+def print_table(results: dict):
+    """
+    Prints the results of the scenarios as a table.
+
+    :param results: statistics by the names of the scenarios
+    """
+    print(f'{"scenario":<28}{"req/s":>10}{"p50 ms":>9}{"p90 ms":>9}'
+          f'{"p99 ms":>9}{"peak KiB":>10}{"blocks":>8}  errors')
+    for name, stats in results.items():
+        print(f'{name:<28}{stats["rps"]:>10.1f}{stats["p50_ms"]:>9.2f}'
+              f'{stats["p90_ms"]:>9.2f}{stats["p99_ms"]:>9.2f}'
+              f'{stats["peak_alloc_bytes"] / 1024:>10.1f}'
+              f'{stats["retained_blocks"]:>8.0f}  '
+              f'{stats["errors"] or ""}')
+
+
+def save(results: dict, arguments: argparse.Namespace):
+    """
+    Prints the results and saves them as JSON if requested.
+
+    :param results: statistics by the names of the scenarios
+    :param arguments: command line arguments
+    """
+    print_table(results)
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump({'meta': metadata(arguments), 'results': results},
+                      file, indent=2)
+        print(f'Results saved to {arguments.output}')
+
+
+def run_routes(arguments: argparse.Namespace):
+    """
+    Runs the benchmarks of the routes.
+
+    :param arguments: command line arguments
+    """
+    from benchmarks.routes import scenarios
+
+    if arguments.output:
+        arguments.output = os.path.abspath(arguments.output)
+    dataset = Dataset(arguments.categories, arguments.courses,
+                      arguments.students, arguments.enrollments)
+    prepare_workdir(dataset)
+    results = {}
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull):
+            application = build_application()
+        for scenario in scenarios(dataset):
+            if arguments.only and scenario.name not in arguments.only:
+                continue
+            with contextlib.redirect_stdout(devnull):
+                results[scenario.name] = measure(
+                    application, scenario, arguments.requests,
+                    arguments.warmup, arguments.traced)
+    save(results, arguments)
+
+
+def run_data_layer(arguments: argparse.Namespace):
+    """
+    Runs the micro-benchmarks of the ORM and the models.
+
+    :param arguments: command line arguments
+    """
+    from benchmarks import data_layer
+
+    results = data_layer.run(
+        tempfile.mkdtemp(prefix='benchmarks-'), arguments.sizes,
+        arguments.objects, arguments.depth, arguments.repeat)
+    print(f'{"benchmark":<36}{"ops/s":>12}{"best us":>11}{"median us":>11}'
+          f'{"peak KiB":>10}')
+    memory = {}
+    for name, stats in results.items():
+        if 'bytes_per_entity' in stats:
+            memory[name] = stats['bytes_per_entity']
+            continue
+        print(f'{name:<36}{stats["ops_per_sec"]:>12.1f}'
+              f'{stats["best_us"]:>11.2f}{stats["median_us"]:>11.2f}'
+              f'{stats["peak_bytes"] / 1024:>10.1f}')
+    print(f'\n{"memory":<36}{"bytes/entity":>12}{"unslotted":>11}'
+          f'{"saved":>8}')
+    for name, size in memory.items():
+        baseline = memory.get(name.replace('[', '_unslotted[', 1))
+        if '_unslotted[' in name:
+            continue
+        if baseline is None:
+            print(f'{name:<36}{size:>12.1f}')
+            continue
+        print(f'{name:<36}{size:>12.1f}{baseline:>11.1f}'
+              f'{1 - size / baseline:>8.0%}')
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump({'meta': metadata(arguments), 'results': results},
+                      file, indent=2)
+        print(f'Results saved to {arguments.output}')
+
+
+def run_startup(arguments: argparse.Namespace):
+    """
+    Measures the startup of the application in fresh interpreters and
+    checks it against the budget: exits with an error if the median time
+    of the import and the creation of the application exceeds it, or if
+    a database connection is opened before the first request.
+
+    :param arguments: command line arguments
+    """
+    from statistics import median
+
+    if arguments.output:
+        arguments.output = os.path.abspath(arguments.output)
+    prepare_workdir(Dataset(2, 5, 10, 10))
+    runs = []
+    for _ in range(arguments.repeat):
+        completed = subprocess.run(
+            [sys.executable, '-c', STARTUP_SCRIPT, ROOT],
+            capture_output=True, text=True)
+        if completed.returncode:
+            sys.exit(completed.stderr)
+        runs.append(json.loads(completed.stdout.splitlines()[-1]))
+    results = {key: median(run[key] for run in runs) for key in runs[0]}
+    results['startup_ms'] = results['import_ms'] + results['create_ms']
+    for key, value in results.items():
+        print(f'{key:<24}{value:>10.2f}')
+    if arguments.output:
+        with open(arguments.output, 'w') as file:
+            json.dump({'meta': metadata(arguments), 'results': results},
+                      file, indent=2)
+        print(f'Results saved to {arguments.output}')
+    if results['first_request_status'] != 200:
+        sys.exit('The first request has failed.')
+    if results['connections_at_startup']:
+        sys.exit('Database connections are opened at startup.')
+    if arguments.budget_ms and results['startup_ms'] > arguments.budget_ms:
+        sys.exit(f'Startup takes {results["startup_ms"]:.1f} ms, the budget '
+                 f'is {arguments.budget_ms} ms.')
+
+
+def compare(arguments: argparse.Namespace):
+    """
+    Compares two saved runs (of the same command): prints
+    the throughput (or the memory per entity) of every benchmark with
+    the relative change.
+
+    :param arguments: command line arguments
+    """
+    runs = []
+    for path in (arguments.before, arguments.after):
+        with open(path) as file:
+            runs.append(json.load(file))
+    before, after = (run['results'] for run in runs)
+    print(f'before: {runs[0]["meta"]["commit"]}, '
+          f'after: {runs[1]["meta"]["commit"]}')
+    print(f'{"benchmark":<36}{"before":>12}{"after":>12}{"change":>9}')
+    for name in before:
+        if name not in after:
+            continue
+        old, new = (stats.get('rps', stats.get('ops_per_sec',
+                                               stats.get('bytes_per_entity')))
+                    for stats in (before[name], after[name]))
+        change = (new / old - 1) * 100 if old else 0
+        print(f'{name:<36}{old:>12.1f}{new:>12.1f}{change:>+8.1f}%')
+
+
+def main(argv: list = None):
+    """
+    Parses the command line and runs the requested command.
+
+    :param argv: command line arguments, by default sys.argv
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    routes = commands.add_parser(
+        'routes', help='benchmark every route of the project in-process')
+    routes.add_argument('--categories', type=int, default=20)
+    routes.add_argument('--courses', type=int, default=200)
+    routes.add_argument('--students', type=int, default=1000)
+    routes.add_argument('--enrollments', type=int, default=3000)
+    routes.add_argument('--requests', type=int, default=200,
+                        help='measured requests per scenario')
+    routes.add_argument('--warmup', type=int, default=10)
+    routes.add_argument('--traced', type=int, default=20,
+                        help='requests traced for the allocations')
+    routes.add_argument('--only', nargs='*',
+                        help='names of the scenarios to run')
+    routes.add_argument('--output', help='path to save the JSON results')
+    routes.set_defaults(handler=run_routes)
+
+    data_layer = commands.add_parser(
+        'orm', help='micro-benchmark the ORM and the models')
+    data_layer.add_argument('--sizes', type=int, nargs='+',
+                            default=[1000, 10000, 100000],
+                            help='numbers of rows in the table')
+    data_layer.add_argument('--objects', type=int, default=1000,
+                            help='objects per commit and in the models')
+    data_layer.add_argument('--depth', type=int, default=200,
+                            help='depth of the categories chain')
+    data_layer.add_argument('--repeat', type=int, default=5)
+    data_layer.add_argument('--output', help='path to save the JSON results')
+    data_layer.set_defaults(handler=run_data_layer)
+
+    startup = commands.add_parser(
+        'startup', help='measure the import and the creation of the '
+                        'application against a budget')
+    startup.add_argument('--repeat', type=int, default=5,
+                         help='number of fresh interpreters')
+    startup.add_argument('--budget-ms', type=float, default=150.0,
+                         help='maximum import and creation time, '
+                              '0 to disable the check')
+    startup.add_argument('--output', help='path to save the JSON results')
+    startup.set_defaults(handler=run_startup)
+
+    comparison = commands.add_parser(
+        'compare', help='compare two saved runs')
+    comparison.add_argument('before')
+    comparison.add_argument('after')
+    comparison.set_defaults(handler=compare)
+
+    arguments = parser.parse_args(argv)
+    if getattr(arguments, 'requests', 1) < 1:
+        parser.error('--requests must be positive')
+    arguments.handler(arguments)
+
+
+if __name__ == '__main__':
+    main()
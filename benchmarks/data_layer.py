@@ -0,0 +1,399 @@
+"""
+Module with the micro-benchmarks of the data layer: the ORM (units of
+work, mappers, the registry) and the models of the project, measured
+without the WSGI application. The table sizes and the numbers of objects
+are configurable, the peak memory of every operation is traced with
+tracemalloc.
+"""
+import os
+import random
+import tracemalloc
+from statistics import median
+from time import perf_counter
+from typing import Callable
+
+from benchmarks.dataset import Dataset
+from mappers import ProjectMapperRegistry
+from models import OnlineUniversity, Student, CourseCategory, OnlineCourse
+from orm.connections import ConnectionPool
+from orm.core import UnitOfWork
+from orm.mappers import compile_hydrator
+
+
+def bench(func: Callable, setup: Callable = None, per: int = 1,
+          repeat: int = 5) -> dict:
+    """
+    Measures the function: calls it repeat times (every call gets a fresh
+    result of the setup function, which isn't measured) and once more
+    with tracemalloc to find the peak of the allocated memory.
+
+    :param func: function taking in the result of the setup
+    :param setup: function preparing the data for one call, or None
+    :param per: number of operations done by one call, the times are
+        reported per operation
+    :param repeat: number of measured calls
+    :return: operations per second, best and median time of one operation
+        in microseconds, peak memory of one call in bytes
+    """
+    times = []
+    for _ in range(repeat):
+        data = setup() if setup else None
+        start = perf_counter()
+        func(data)
+        times.append((perf_counter() - start) / per)
+    data = setup() if setup else None
+    tracemalloc.start()
+    try:
+        func(data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    middle = median(times)
+    return {
+        'ops_per_sec': 1 / middle if middle else 0.0,
+        'best_us': min(times) * 1e6,
+        'median_us': middle * 1e6,
+        'peak_bytes': peak,
+    }
+
+
+def new_unit_of_work(registry: ProjectMapperRegistry) -> UnitOfWork:
+    """
+    Sets a new unit of work with the registry as the current one.
+
+    :param registry: mapper registry
+    """
+    UnitOfWork.new_current()
+    unit_of_work = UnitOfWork.get_current()
+    unit_of_work.set_mapper_registry(registry)
+    return unit_of_work
+
+
+def commit_benchmarks(registry: ProjectMapperRegistry, objects: int,
+                      repeat: int) -> dict:
+    """
+    Benchmarks UnitOfWork.commit with the given number of new, dirty
+    and removed students.
+
+    :param registry: registry working with a filled database
+    :param objects: number of objects in one commit
+    :param repeat: number of measured commits
+    """
+    mapper = registry.get_current_mapper('student')
+
+    def setup_new():
+        unit_of_work = new_unit_of_work(registry)
+        for number in range(objects):
+            unit_of_work.register_new(Student(f'New student {number}'))
+        return unit_of_work
+
+    def setup_dirty():
+        unit_of_work = new_unit_of_work(registry)
+        for student in mapper.return_all().order_by('id')[:objects]:
+            student.name = f'{student.name}!'
+            unit_of_work.register_dirty(student)
+        return unit_of_work
+
+    def setup_removed():
+        unit_of_work = setup_new()
+        unit_of_work.commit()
+        for student in mapper.return_all().order_by('-id')[:objects]:
+            unit_of_work.register_removed(student)
+        return unit_of_work
+
+    def commit(unit_of_work: UnitOfWork):
+        unit_of_work.commit()
+
+    return {
+        f'commit_new[{objects}]': bench(commit, setup_new, objects, repeat),
+        f'commit_dirty[{objects}]': bench(
+            commit, setup_dirty, objects, repeat),
+        f'commit_removed[{objects}]': bench(
+            commit, setup_removed, objects, repeat),
+    }
+
+
+def mapper_benchmarks(registry: ProjectMapperRegistry, size: int,
+                      lookups: int, repeat: int) -> dict:
+    """
+    Benchmarks reading all the rows of a table with the given number of
+    rows, and the lookups by ID: through the database (the caches are
+    cleared), through the row cache and through the identity map.
+
+    :param registry: registry working with a filled database
+    :param size: number of rows in the students table
+    :param lookups: number of lookups by ID in one call
+    :param repeat: number of measured calls
+    """
+    mapper = registry.get_current_mapper('student')
+    ids = random.Random(size).sample(range(1, size + 1), min(lookups, size))
+
+    def setup_all():
+        new_unit_of_work(registry)
+
+    def read_all(_):
+        for _ in mapper.return_all():
+            pass
+
+    def setup_cold():
+        mapper.cache.clear()
+        new_unit_of_work(registry)
+
+    def setup_cached():
+        find(None)
+        new_unit_of_work(registry)
+
+    def find(_):
+        for entry_id in ids:
+            mapper.find_by_id(entry_id)
+
+    return {
+        f'return_all[{size}]': bench(read_all, setup_all, size, repeat),
+        f'find_by_id_db[{size}]': bench(find, setup_cold, len(ids), repeat),
+        f'find_by_id_cache[{size}]': bench(
+            find, setup_cached, len(ids), repeat),
+        f'find_by_id_identity_map[{size}]': bench(
+            find, None, len(ids), repeat),
+    }
+
+
+def registry_benchmarks(registry: ProjectMapperRegistry, calls: int,
+                        repeat: int) -> dict:
+    """
+    Benchmarks the resolution of the mappers of the objects, with the
+    cache of the registry and without it (the MRO walk).
+
+    :param registry: mapper registry
+    :param calls: number of resolutions in one call
+    :param repeat: number of measured calls
+    """
+    site = OnlineUniversity()
+    category = CourseCategory('Topic', None)
+    objects = [site.create_course(type_, 'Course', category)
+               for type_ in ('online', 'offline', 'webinar')] + \
+        [Student('Student'), category]
+    objects = (objects * (calls // len(objects) + 1))[:calls]
+
+    def resolve(_):
+        for obj in objects:
+            registry.get_mapper(obj)
+
+    def resolve_uncached(_):
+        for obj in objects:
+            registry.type_cache.clear()
+            registry.get_mapper(obj)
+
+    return {
+        'get_mapper': bench(resolve, None, calls, repeat),
+        'get_mapper_uncached': bench(resolve_uncached, None, calls, repeat),
+    }
+
+
+def model_benchmarks(objects: int, depth: int, repeat: int) -> dict:
+    """
+    Benchmarks the in-memory models: the lookups of OnlineUniversity
+    among the given number of courses and students, the cloning of
+    a course with the given number of students and counting the courses
+    of a category at the bottom of a chain of the given depth.
+
+    :param objects: number of courses, categories, students and students
+        of a course
+    :param depth: depth of the chain of categories
+    :param repeat: number of measured calls
+    """
+    site = OnlineUniversity()
+    root = site.create_category('Topic 0')
+    site.add_category(root)
+    for number in range(objects):
+        site.add_course(site.create_course(
+            'online', f'Course {number}', root))
+        site.students.append(site.create_user('student', f'Student {number}'))
+        site.add_category(site.create_category(f'Topic {number + 1}'))
+    last = objects - 1
+    last_category = site.course_categories[-1]
+
+    course = site.courses[0]
+    for student in site.students:
+        course.students.append(student)
+
+    category = root
+    for number in range(1, depth + 1):
+        category = site.create_category(f'Topic {number}', category)
+        site.create_course('online', f'Chain course {number}', category)
+
+    return {
+        f'get_course[{objects}]': bench(
+            lambda _: site.get_course(f'Course {last}'), None, 1, repeat),
+        f'get_student[{objects}]': bench(
+            lambda _: site.get_student(f'Student {last}'), None, 1, repeat),
+        f'find_category[{objects}]': bench(
+            lambda _: site.find_category(last_category.id), None, 1, repeat),
+        f'search[{objects}]': bench(
+            lambda _: site.search('cour 1'), None, 1, repeat),
+        f'clone[{objects}]': bench(
+            lambda _: course.clone(), None, 1, repeat),
+        f'count_courses[{depth}]': bench(
+            lambda _: category.count_courses(), None, 1, repeat),
+    }
+
+
+class DictEntity:
+    """
+    Baseline of the memory benchmarks: keeps the attributes of a model
+    object in its __dict__, with all the lists created, the way the models
+    stored them before they got __slots__ and lazy lists. Every model gets
+    its own subclass (see unslotted), so the instance dictionaries share
+    their keys like the ones of the old model classes did.
+    """
+    classes = {}
+
+
+def unslotted(obj) -> DictEntity:
+    """
+    Returns the baseline copy of the model object with the same attribute
+    values. Reading the lazy lists creates them, as the old models did in
+    their __init__().
+
+    :param obj: model object
+    """
+    model = type(obj)
+    cls = DictEntity.classes.get(model)
+    if cls is None:
+        cls = DictEntity.classes[model] = type(
+            f'Unslotted{model.__name__}', (DictEntity,), {})
+    copy = cls()
+    for base in model.__mro__:
+        for name in vars(base).get('__slots__', ()):
+            if name != '__weakref__' and hasattr(obj, name):
+                setattr(copy, name, getattr(obj, name))
+    return copy
+
+
+def retained_bytes(create: Callable, objects: int) -> float:
+    """
+    Measures the memory retained by the objects created by the function.
+
+    :param create: function taking in the number of objects and returning
+        a list of them
+    :param objects: number of objects
+    :return: bytes per object, including the list holding them
+    """
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        created = create(objects)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del created
+    return (after - before) / objects
+
+
+def memory_benchmarks(objects: int) -> dict:
+    """
+    Measures the memory held by one entity of every model (with its name
+    and relationships): new categories, courses and students, students
+    enlisted on a course and courses hydrated from table rows. Every
+    entity is measured next to its unslotted baseline (see DictEntity),
+    so the saving of the slots is reproduced by every run; the baseline
+    copies replace the models in the lists of the related objects, so
+    the models themselves aren't counted.
+
+    :param objects: number of entities of every kind
+    """
+    category = CourseCategory('Topic', None)
+    hydrate = compile_hydrator(
+        OnlineCourse, OnlineCourse.columns, OnlineCourse.transient_fields)
+
+    def categories(number):
+        return [CourseCategory(f'Topic {index}', category)
+                for index in range(number)]
+
+    def courses(number):
+        return [OnlineCourse(f'Course {index}', category)
+                for index in range(number)]
+
+    def students(number):
+        return [Student(f'Student {index}') for index in range(number)]
+
+    def enrolled_students(number):
+        course = OnlineCourse('Course', None)
+        created = students(number)
+        for student in created:
+            course.add_student(student)
+        return created
+
+    def hydrated_courses(number):
+        return [hydrate((index, f'Course {index}', 'online', 1, 1))
+                for index in range(number)]
+
+    def unslotted_courses(number):
+        created = [unslotted(course) for course in courses(number)]
+        category.existing_courses[:] = created
+        return created
+
+    def unslotted_enrolled_students(number):
+        created = enrolled_students(number)
+        course = created[0].courses_in_attendance[0]
+        course.students[:] = created = [
+            unslotted(student) for student in created]
+        return created
+
+    def unslotted_all(create):
+        return lambda number: [unslotted(obj) for obj in create(number)]
+
+    results = {}
+    for name, create, create_unslotted in (
+            ('category', categories, unslotted_all(categories)),
+            ('course', courses, unslotted_courses),
+            ('student', students, unslotted_all(students)),
+            ('enrolled_student', enrolled_students,
+             unslotted_enrolled_students),
+            ('hydrated_course', hydrated_courses,
+             unslotted_all(hydrated_courses))):
+        for suffix, function in (('', create),
+                                 ('_unslotted', create_unslotted)):
+            results[f'memory_{name}{suffix}[{objects}]'] = {
+                'bytes_per_entity': retained_bytes(function, objects)}
+            category.existing_courses.clear()
+    return results
+
+
+def run(workdir: str, sizes: list, objects: int, depth: int,
+        repeat: int) -> dict:
+    """
+    Runs all the data layer benchmarks. A database is created for every
+    table size in the working directory.
+
+    :param workdir: directory for the databases
+    :param sizes: numbers of rows in the table
+    :param objects: number of objects for the commits and the models
+    :param depth: depth of the categories chain
+    :param repeat: number of measured calls of every benchmark
+    :return: statistics by the names of the benchmarks
+    """
+    results = {}
+    registry = None
+    if not sizes:
+        raise ValueError('At least one table size is required.')
+    for size in sizes:
+        database = os.path.join(workdir, f'students_{size}.sqlite3')
+        Dataset(1, 1, size, 0).populate(database, migrations_directory())
+        registry = ProjectMapperRegistry(ConnectionPool(database))
+        results.update(mapper_benchmarks(registry, size, 1000, repeat))
+        if size == sizes[0]:
+            results.update(commit_benchmarks(registry, objects, repeat))
+    results.update(registry_benchmarks(registry, 100000, repeat))
+    results.update(model_benchmarks(objects, depth, repeat))
+    results.update(memory_benchmarks(objects))
+    UnitOfWork.set_current(None)
+    return results
+
+
+def migrations_directory() -> str:
+    """
+    Returns the path to the migrations of the project.
+    """
+    return os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'migrations')
@@ -0,0 +1,94 @@
+"""
+Module generating the synthetic dataset for the benchmarks. The rows are
+written with plain SQL in one transaction, so even large datasets are
+created quickly. The names are predictable (Student 1, Course 1,
+Topic 1...), which the scenarios rely on.
+"""
+from sqlite3 import connect
+
+from orm.migrations import Migrator
+
+COURSE_TYPES = ('online', 'offline', 'webinar')
+
+
+class Dataset:
+    """
+    Sizes of the synthetic dataset.
+    """
+
+    def __init__(self, categories: int = 20, courses: int = 200,
+                 students: int = 1000, enrollments: int = 3000):
+        """
+        Initializes the dataset.
+
+        :param categories: number of categories, each one but the first
+            four has a parent, so they form a tree
+        :param courses: number of courses, spread over the categories
+        :param students: number of students
+        :param enrollments: number of enrollments of the students
+            on the courses (at most students * courses)
+        """
+        if not categories or not courses or not students:
+            raise ValueError('The dataset needs at least one category, '
+                             'course and student.')
+        self.categories = categories
+        self.courses = courses
+        self.students = students
+        self.enrollments = min(enrollments, students * courses)
+
+    def as_dict(self) -> dict:
+        """
+        Returns the sizes as a dictionary.
+        """
+        return {
+            'categories': self.categories,
+            'courses': self.courses,
+            'students': self.students,
+            'enrollments': self.enrollments,
+        }
+
+    def enrollment(self, number: int) -> (int, int):
+        """
+        Returns the numbers of the student and the course of the given
+        enrollment (all numbers start with 1). The students are enrolled
+        on the courses from the first one on.
+
+        :param number: number of the enrollment
+        """
+        number -= 1
+        return number % self.students + 1, number // self.students + 1
+
+    def populate(self, database: str, migrations: str):
+        """
+        Creates the database with the migrations and fills it.
+
+        :param database: path to the database file
+        :param migrations: directory with the migrations
+        """
+        connection = connect(database)
+        Migrator(connection, migrations).migrate()
+        with connection:
+            connection.executemany(
+                'INSERT INTO categories (id, name, category_id) '
+                'VALUES (?, ?, ?)',
+                ((number, f'Topic {number}',
+                  number // 4 if number > 4 else None)
+                 for number in range(1, self.categories + 1)))
+            connection.executemany(
+                'INSERT INTO courses (id, name, course_type, category_id) '
+                'VALUES (?, ?, ?, ?)',
+                ((number, f'Course {number}',
+                  COURSE_TYPES[number % len(COURSE_TYPES)],
+                  number % self.categories + 1)
+                 for number in range(1, self.courses + 1)))
+            connection.executemany(
+                'INSERT INTO students (id, name) VALUES (?, ?)',
+                ((number, f'Student {number}')
+                 for number in range(1, self.students + 1)))
+            connection.executemany(
+                'INSERT INTO course_students (course_id, student_id) '
+                'VALUES (?, ?)',
+                (self.enrollment(number)[::-1]
+                 for number in range(1, self.enrollments + 1)))
+        connection.execute('ANALYZE')
+        connection.close()
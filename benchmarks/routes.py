@@ -0,0 +1,83 @@
+"""
+Module with the scenarios of the route benchmarks: GET-requests to every
+page and API view of the project and POST-requests to every form. The
+requests refer to the objects of the synthetic dataset by their names.
+"""
+from typing import List
+from urllib.parse import quote
+
+from benchmarks.dataset import Dataset
+from benchmarks.runner import Scenario
+
+
+def form(**values) -> str:
+    """
+    Encodes the values as the body of a form.
+
+    :param values: names of the fields with their values
+    """
+    return '&'.join(f'{key}={quote(str(value), safe="")}'
+                    for key, value in values.items())
+
+
+def scenarios(dataset: Dataset) -> List[Scenario]:
+    """
+    Returns the scenarios for the dataset. The POST-requests create new
+    objects with unique names (the enrollments - on the courses from
+    the last one backwards, so they don't clash with the existing ones).
+
+    :param dataset: sizes of the dataset in the database
+    """
+    def course(number: int) -> str:
+        return f'Course {number % dataset.courses + 1}'
+
+    def student(number: int) -> str:
+        return f'Student {number % dataset.students + 1}'
+
+    def enlist(number: int) -> str:
+        course_number = dataset.courses - \
+            number // dataset.students % dataset.courses
+        return form(course_name=f'Course {course_number}',
+                    student_name=student(number))
+
+    gzip = {'HTTP_ACCEPT_ENCODING': 'gzip'}
+    return [
+        Scenario('index', '/'),
+        Scenario('about', '/about/'),
+        Scenario('contacts', '/contacts/'),
+        Scenario('contacts_post', '/contacts/', 'POST', body=lambda n: form(
+            email='bench@example.com', header=f'Message {n}',
+            message='Hello')),
+        Scenario('courses_list', '/all_courses/'),
+        Scenario('courses_list_gzip', '/all_courses/', headers=gzip),
+        Scenario('courses_list_last_page', '/all_courses/',
+                 query=lambda n: f'page={max(dataset.courses // 50, 1)}'),
+        Scenario('courses_api', '/api/'),
+        Scenario('create_course_form', '/create_course/'),
+        Scenario('create_course', '/create_course/', 'POST',
+                 body=lambda n: form(
+                     name=f'New course {n}',
+                     category_id=n % dataset.categories + 1)),
+        Scenario('copy_course', '/copy_course/',
+                 query=lambda n: f'name={quote(course(n))}'),
+        Scenario('categories_list', '/all_categories/'),
+        Scenario('create_category_form', '/create_category/'),
+        Scenario('create_category', '/create_category/', 'POST',
+                 body=lambda n: form(
+                     name=f'New topic {n}',
+                     category_id=n % dataset.categories + 1)),
+        Scenario('students_list', '/all_students/'),
+        Scenario('create_student_form', '/create_student/'),
+        Scenario('create_student', '/create_student/', 'POST',
+                 body=lambda n: form(name=f'New student {n}')),
+        Scenario('enlist_student_form', '/enlist_student/'),
+        Scenario('enlist_student', '/enlist_student/', 'POST', body=enlist),
+        Scenario('search', '/search/', query=lambda n: 'q=cour'),
+        Scenario('search_api', '/api/search/',
+                 query=lambda n: f'q={quote(course(n))}'),
+        Scenario('autocomplete_students', '/api/autocomplete/students/',
+                 query=lambda n: f'q={quote(student(n)[:9])}'),
+        Scenario('autocomplete_courses', '/api/autocomplete/courses/',
+                 query=lambda n: f'q={quote(course(n)[:8])}'),
+        Scenario('static_css', '/static/css/main.css'),
+    ]
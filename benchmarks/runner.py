@@ -0,0 +1,175 @@
+"""
+Module measuring the WSGI application. Every request is built as
+a WSGI environment and passed to the application in-process, the response
+body is consumed completely, as a server would do it. Latencies are
+measured in one pass and allocations in a separate one, since tracing
+the allocations slows the requests down.
+"""
+import io
+import sys
+import tracemalloc
+from time import perf_counter
+from typing import Callable, List
+
+
+class Scenario:
+    """
+    Class describing the requests to one route.
+    """
+
+    def __init__(self, name: str, path: str, method: str = 'GET',
+                 query: Callable = None, body: Callable = None,
+                 headers: dict = None):
+        """
+        Initializes the scenario.
+
+        :param name: name of the scenario in the results
+        :param path: url path
+        :param method: HTTP method
+        :param query: function taking in the number of the request and
+            returning the query string, or None
+        :param body: function taking in the number of the request and
+            returning the urlencoded body, or None
+        :param headers: additional WSGI environment variables, e.g.
+            HTTP_ACCEPT_ENCODING
+        """
+        self.name = name
+        self.path = path
+        self.method = method
+        self.query = query
+        self.body = body
+        self.headers = headers or {}
+
+    def environ(self, number: int) -> dict:
+        """
+        Returns the WSGI environment of the request.
+
+        :param number: number of the request, starting with 0
+        """
+        body = self.body(number).encode('utf-8') if self.body else b''
+        environment = {
+            'REQUEST_METHOD': self.method,
+            'PATH_INFO': self.path,
+            'QUERY_STRING': self.query(number) if self.query else '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.version': (1, 0),
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if body:
+            environment['CONTENT_LENGTH'] = str(len(body))
+            environment['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        environment.update(self.headers)
+        return environment
+
+
+def call(application: Callable, environment: dict) -> (str, int):
+    """
+    Calls the application and consumes the response.
+
+    :param application: WSGI application
+    :param environment: WSGI environment
+    :return: response status and the size of the body
+    """
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = status
+
+    body = application(environment, start_response)
+    try:
+        size = sum(len(chunk) for chunk in body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return response['status'], size
+
+
+def percentile(values: List[float], share: float) -> float:
+    """
+    Returns the percentile of the sorted values (nearest rank).
+
+    :param values: sorted list of values
+    :param share: percentile from 0 to 1, e.g. 0.99
+    """
+    if not values:
+        return 0.0
+    return values[min(int(share * len(values)), len(values) - 1)]
+
+
+def measure(application: Callable, scenario: Scenario, requests: int,
+            warmup: int = 10, traced: int = 20, offset: int = 0) -> dict:
+    """
+    Runs the requests of the scenario and returns the statistics:
+    requests per second, latency percentiles (in milliseconds), average
+    size of the response, errors, and the average number of bytes and
+    memory blocks allocated per request (the peak traced by tracemalloc
+    and the blocks left allocated after it).
+
+    :param application: WSGI application
+    :param scenario: requests to run
+    :param requests: number of the measured requests
+    :param warmup: number of requests before the measurement
+    :param traced: number of requests for the allocations pass
+    :param offset: number of the first request (so that the POST-requests
+        of different runs create different objects)
+    """
+    number = offset
+    errors = {}
+    sizes = []
+
+    def run() -> float:
+        nonlocal number
+        environment = scenario.environ(number)
+        number += 1
+        start = perf_counter()
+        try:
+            status, size = call(application, environment)
+        except Exception as e:
+            status, size = type(e).__name__, 0
+        elapsed = perf_counter() - start
+        if status[:1] not in ('2', '3'):
+            errors[status] = errors.get(status, 0) + 1
+        sizes.append(size)
+        return elapsed
+
+    for _ in range(warmup):
+        run()
+    sizes.clear()
+    started = perf_counter()
+    latencies = sorted(run() for _ in range(requests))
+    total = perf_counter() - started
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    try:
+        for _ in range(traced):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            allocated = sys.getallocatedblocks()
+            run()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+            blocks.append(sys.getallocatedblocks() - allocated)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'requests': requests,
+        'rps': requests / total if total else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p90_ms': percentile(latencies, 0.9) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'response_bytes': sum(sizes) / len(sizes) if sizes else 0,
+        'peak_alloc_bytes': sum(peaks) / len(peaks) if peaks else 0,
+        'retained_blocks': sum(blocks) / len(blocks) if blocks else 0,
+        'errors': errors,
+    }
@@ -3,13 +3,13 @@ Module with metaclasses and abstract metaclasses for various classes
 throughout the framework. This module includes a Singleton metaclass
 for the logging module, a mixin for the Prototype pattern, Observer and
 Subject classes for Observer pattern, BaseSerializer for the framework
+and the LazyList descriptor for the usually empty lists of the slotted
+classes.
 """
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
 from typing import Any
 
-from jsonpickle import dumps, loads
-
 
 class NamedSingleton(type):
     """
@@ -50,10 +50,70 @@ class NamedSingleton(type):
             return cls.__instance[name]
 
 
+class LazyList:
+    """
+    Descriptor wrapping the slot of a list attribute that is usually
+    empty (e.g. the observers of a subject). The list is created when
+    the attribute is first read, so the objects that never use it don't
+    carry an empty list. Assigning None resets the attribute to a new
+    list on the next read.
+    """
+
+    def __init__(self, slot):
+        """
+        Initializes the descriptor.
+
+        :param slot: member descriptor of the slot storing the list
+        """
+        self.slot = slot
+
+    def __get__(self, obj, owner=None):
+        """
+        Returns the list stored in the slot, creating it if necessary.
+        """
+        if obj is None:
+            return self
+        try:
+            value = self.slot.__get__(obj, owner)
+        except AttributeError:
+            value = None
+        if value is None:
+            value = []
+            self.slot.__set__(obj, value)
+        return value
+
+    def __set__(self, obj, value):
+        """
+        Stores the list in the slot.
+        """
+        self.slot.__set__(obj, value)
+
+    def __delete__(self, obj):
+        """
+        Empties the slot.
+        """
+        self.slot.__delete__(obj)
+
+
+def lazy_lists(*names: str):
+    """
+    Class decorator that wraps the given slots of the class with
+    the LazyList descriptors.
+
+    :param names: names of the slots storing the lists
+    """
+    def decorator(cls: type) -> type:
+        for name in names:
+            setattr(cls, name, LazyList(cls.__dict__[name]))
+        return cls
+    return decorator
+
+
 class PrototypeMixin:
     """
     The mixin for Prototype pattern
     """
+    __slots__ = ()
 
     def clone(self):
         """
@@ -65,17 +125,13 @@ class PrototypeMixin:
         return deepcopy(self)
 
 
+@lazy_lists('observers')
 class Subject:
     """
-    Abstract subject (emitter) class for the Observer pattern.
+    Abstract subject (emitter) class for the Observer pattern. The list
+    of all known observers is created when it's first used.
     """
-
-    def __init__(self):
-        """
-        Initializes the class object, prepares the list of all
-        know observers.
-        """
-        self.observers = []
+    __slots__ = ('observers',)
 
     def notify(self):
         """
@@ -104,6 +160,7 @@ class User(metaclass=ABCMeta):
     """
     Base metaclass for a user. Main functionality TBD
     """
+    __slots__ = ('name',)
 
     def __init__(self, name: str):
         """
@@ -130,7 +187,9 @@ class Factory(metaclass=ABCMeta):
 
 class BaseSerializer:
     """
-    Basic serializer for use in the framework. Utilizes the jsonpickle lib.
+    Basic serializer for use in the framework. Utilizes the jsonpickle lib,
+    which is imported on the first use, so importing the framework stays
+    fast.
     """
 
     def __init__(self, obj):
@@ -145,6 +204,7 @@ class BaseSerializer:
         """
         Serializes the data utilizing the jsonpickle lib.
         """
+        from jsonpickle import dumps
         return dumps(self.object)
 
     @staticmethod
@@ -152,6 +212,7 @@ class BaseSerializer:
         """
         Deserializes the data using the jsonpickle lib.
         """
+        from jsonpickle import loads
         return loads(data)
 
 
@@ -8,6 +8,7 @@ from time import perf_counter
 from typing import Callable
 
 from core.bases import NamedSingleton
+from core.static import StaticFiles
 
 
 class UrlPaths(metaclass=NamedSingleton):
@@ -17,9 +18,11 @@ class UrlPaths(metaclass=NamedSingleton):
     link to the CBV-object in the memory serves as the value. The metaclass
     here is NamedSingleton to ensure that the object returned does indeed
     have the URLs added into it earlier. The class uses a decorator function
-    add_route to gather the URL routes.
+    add_route to gather the URL routes. Handlers that serve everything under
+    a URL prefix (e.g. static files) are stored in the MOUNTS dictionary.
     """
     URLS = {}
+    MOUNTS = {}
 
     def __init__(self, name='urlpaths'):
         """
@@ -31,13 +34,15 @@ class UrlPaths(metaclass=NamedSingleton):
         """
         self.name = name
 
-    def add_route(self, url: str) -> Callable:
+    def add_route(self, url: str, timeout: float = None) -> Callable:
         """
         Decorates the callable view class to update the list of url-paths
         in the framework. The url-string becomes the key in the
         url-paths dictionary.
 
         :param url: a string with the url-address
+        :param timeout: deadline of the view (in seconds), overriding
+            the timeout attribute of the view class
         """
 
         def wrapped(view: Callable, *args, **kwargs):
@@ -48,9 +53,22 @@ class UrlPaths(metaclass=NamedSingleton):
             :param view: class-based view
             """
             self.URLS[url] = view(*args, **kwargs)
+            if timeout is not None:
+                self.URLS[url].timeout = timeout
 
         return wrapped
 
+    def add_static(self, prefix: str, directory: str, **kwargs):
+        """
+        Mounts the static files handler under the given url prefix.
+        Every path starting with the prefix is served from the directory.
+
+        :param prefix: url prefix, e.g. '/static/'
+        :param directory: directory with the static files
+        :param kwargs: any additional parameters of the StaticFiles handler
+        """
+        self.MOUNTS[prefix] = StaticFiles(directory, **kwargs)
+
 
 def debug(func: Callable) -> Callable:
     """
@@ -0,0 +1,619 @@
+"""
+Module with the WSGI middleware for the framework. Each middleware takes
+in the application (or another middleware) and wraps its callable, so
+they can be stacked around the main Application object in main.py.
+"""
+import heapq
+import zlib
+from gzip import compress
+from itertools import count
+from threading import Event, Lock
+from time import monotonic
+from typing import Callable, Iterable, Iterator
+
+from orm.cache import LRUCache
+from orm.core import UnitOfWork
+from orm.errors import DatabaseCommitError, DeadlineExceededError, \
+    StaleObjectError
+
+
+class GzipMiddleware:
+    """
+    Compresses the responses with gzip whenever the client accepts it.
+    Bodies given as lists are compressed at once (if they are larger
+    than the threshold), other iterable bodies are compressed on the fly
+    chunk by chunk. The files handed over to the server's
+    wsgi.file_wrapper are passed through untouched, so the server can
+    still send them without copying. Compressed variants of cacheable
+    list bodies (the ones with an ETag, see Application.add_etag) up to
+    max_cached_size bytes are kept in a small thread-safe LRU-cache, so
+    every version of such a response is compressed only once.
+    The compressed responses get their own ETag with the gzip suffix.
+    The data given to the write() callable is sent in front of the body.
+    """
+    compressible_types = (
+        'text/', 'application/json', 'application/javascript',
+        'application/xml', 'image/svg+xml',
+    )
+    etag_suffix = '-gzip"'
+
+    def __init__(self, app: Callable, minimum_size: int = 500,
+                 compress_level: int = 6, cache_size: int = 256,
+                 max_cached_size: int = 256 * 1024):
+        """
+        Initializes the middleware.
+
+        :param app: WSGI application to wrap
+        :param minimum_size: bodies smaller than this are sent as is
+        :param compress_level: gzip compression level
+        :param cache_size: maximum number of cached compressed variants
+        :param max_cached_size: larger compressed variants aren't cached
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compress_level = compress_level
+        self.cache = LRUCache(cache_size)
+        self.max_cached_size = max_cached_size
+
+    @staticmethod
+    def accepts_gzip(environment: dict) -> bool:
+        """
+        Checks the Accept-Encoding header of the request.
+
+        :param environment: WSGI environment
+        """
+        for coding in environment.get('HTTP_ACCEPT_ENCODING', '').split(','):
+            name, _, params = coding.partition(';')
+            if name.strip() in ('gzip', '*'):
+                return params.replace(' ', '') not in ('q=0', 'q=0.0')
+        return False
+
+    def is_compressible(self, status: str, headers: dict) -> bool:
+        """
+        Checks whether the response is worth compressing: it must be
+        a complete successful response of a textual type that hasn't
+        been encoded already.
+
+        :param status: response status
+        :param headers: response headers with lowercase names
+        """
+        if not status.startswith('200') or 'content-encoding' in headers:
+            return False
+        return headers.get('content-type', '').startswith(
+            self.compressible_types)
+
+    def __call__(self, environment: dict, start_response: Callable):
+        """
+        Main callable method. Calls the wrapped application and then
+        compresses its response if possible.
+
+        :param environment: WSGI environment
+        :param start_response: WSGI start_response callable
+        """
+        if not self.accepts_gzip(environment):
+            return self.app(environment, start_response)
+        if_none_match = environment.get('HTTP_IF_NONE_MATCH', '')
+        gzip_validator = if_none_match.endswith(self.etag_suffix)
+        if gzip_validator:
+            environment['HTTP_IF_NONE_MATCH'] = \
+                if_none_match[:-len(self.etag_suffix)] + '"'
+        response = []
+        written = []
+
+        def capture(status: str, headers: list, exc_info=None):
+            # nothing has been sent yet, so an error page may always
+            # replace the headers given before
+            response[:] = [status, headers]
+            return written.append
+
+        body = self.app(environment, capture)
+        chunks = iter(body)
+        first = written
+        while not response:
+            chunk = next(chunks, None)
+            if chunk is None:
+                # start_response has never been called: the response is
+                # passed on as is, as if there were no middleware
+                return self.chain(first, chunks, body)
+            first.append(chunk)
+        status, headers = response
+        header_dict = {name.lower(): value for name, value in headers}
+        etag = header_dict.get('etag')
+        if status.startswith('304') and etag and gzip_validator:
+            # the client has revalidated its compressed copy
+            headers = self.replace_headers(headers, {
+                'ETag': etag[:-1] + self.etag_suffix})
+        if not self.is_compressible(status, header_dict) \
+                or self.is_file_wrapper(environment, body):
+            start_response(status, headers)
+            return body if not first else self.chain(first, chunks, body)
+        if not isinstance(body, list):
+            changes = {
+                'Content-Encoding': 'gzip',
+                'Vary': 'Accept-Encoding',
+                'Content-Length': None,
+            }
+            if etag:
+                changes['ETag'] = etag[:-1] + self.etag_suffix
+            start_response(status, self.replace_headers(headers, changes))
+            return self.compress_stream(self.chain(first, chunks, body))
+        key = (environment.get('PATH_INFO'),
+               environment.get('QUERY_STRING'), etag)
+        data = self.cache.get(key) if etag else None
+        if data is not None:
+            return self.send(start_response, status, headers, data, etag)
+        data = b''.join(first + [bytes(chunk) for chunk in chunks])
+        if len(data) < self.minimum_size:
+            start_response(status, self.replace_headers(
+                headers, {'Vary': 'Accept-Encoding'}))
+            return [data]
+        data = compress(data, self.compress_level, mtime=0)
+        if etag and len(data) <= self.max_cached_size:
+            self.cache.set(key, data)
+        return self.send(start_response, status, headers, data, etag)
+
+    @staticmethod
+    def is_file_wrapper(environment: dict, body: Iterable) -> bool:
+        """
+        Checks whether the body is a file handed over to the server's
+        wsgi.file_wrapper, which the server may send without copying.
+
+        :param environment: WSGI environment
+        :param body: body of the response
+        """
+        file_wrapper = environment.get('wsgi.file_wrapper')
+        return isinstance(file_wrapper, type) \
+            and isinstance(body, file_wrapper)
+
+    def send(self, start_response: Callable, status: str, headers: list,
+             data: bytes, etag: str = None) -> list:
+        """
+        Starts the response with the compressed body.
+
+        :param start_response: WSGI start_response callable
+        :param status: response status
+        :param headers: original response headers
+        :param data: compressed body
+        :param etag: ETag of the original response, if any
+        """
+        changes = {
+            'Content-Encoding': 'gzip',
+            'Vary': 'Accept-Encoding',
+            'Content-Length': str(len(data)),
+        }
+        if etag:
+            changes['ETag'] = etag[:-1] + self.etag_suffix
+        start_response(status, self.replace_headers(headers, changes))
+        return [data]
+
+    def compress_stream(self, chunks: Iterable) -> Iterator[bytes]:
+        """
+        Compresses the body chunk by chunk, flushing the compressor after
+        every chunk so the client receives the data as soon as it's ready.
+
+        :param chunks: body of the response
+        """
+        compressor = zlib.compressobj(
+            self.compress_level, zlib.DEFLATED, 31)
+        try:
+            for chunk in chunks:
+                if chunk:
+                    yield compressor.compress(chunk) + \
+                        compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+        finally:
+            self.close(chunks)
+
+    @staticmethod
+    def replace_headers(headers: list, changes: dict) -> list:
+        """
+        Returns the new list of headers with the given headers replaced.
+        A header with the None value is removed.
+
+        :param headers: original headers
+        :param changes: new header values by header names
+        """
+        replaced = {name.lower() for name in changes}
+        result = [(name, value) for name, value in headers
+                  if name.lower() not in replaced]
+        result.extend((name, value)
+                      for name, value in changes.items() if value is not None)
+        return result
+
+    @staticmethod
+    def chain(first: list, chunks: Iterator, body: Iterable):
+        """
+        Generator that puts the chunk pulled in advance back in front
+        of the rest of the body and closes the body afterwards.
+
+        :param first: chunks already pulled from the body
+        :param chunks: iterator over the rest of the body
+        :param body: original body
+        """
+        try:
+            yield from first
+            yield from chunks
+        finally:
+            GzipMiddleware.close(body)
+
+    @staticmethod
+    def close(body: Iterable):
+        """
+        Closes the body if it can be closed, as the WSGI spec requires.
+
+        :param body: body of the response
+        """
+        if hasattr(body, 'close'):
+            body.close()
+
+
+class UnitOfWorkMiddleware:
+    """
+    Manages the lifecycle of the ORM's unit of work: every request gets
+    a fresh unit of work, which is committed once the view has returned
+    the response, or rolled back if the view raised an exception. After
+    that the unit of work is released, so nothing accumulates between
+    the requests and every thread (or task) of the server has its own.
+    The status and the headers of the response are held back until
+    the commit has succeeded. A commit that fails (or a view that gives
+    up on a conflict) is rolled back and answered with 409 Conflict
+    instead, so the client is never told that unsaved changes succeeded.
+    In the write-behind mode the response waits for the group commit
+    (unless wait is False, then the failed commits are only logged).
+    """
+    conflict_errors = (DatabaseCommitError, StaleObjectError)
+
+    def __init__(self, app: Callable, registry, wait: bool = True):
+        """
+        Initializes the middleware.
+
+        :param app: WSGI application to wrap
+        :param registry: mapper registry for the units of work
+        :param wait: whether to wait for the write-behind commits
+        """
+        self.app = app
+        self.registry = registry
+        self.wait = wait
+
+    def __call__(self, environment: dict, start_response: Callable):
+        """
+        Main callable method. Calls the wrapped application within
+        a new unit of work and starts the response once it's committed.
+
+        :param environment: WSGI environment
+        :param start_response: WSGI start_response callable
+        """
+        UnitOfWork.new_current()
+        unit_of_work = UnitOfWork.get_current()
+        unit_of_work.set_mapper_registry(self.registry)
+        response = []
+        written = []
+        committed = []
+
+        def delay(status: str, headers: list, exc_info=None):
+            if committed:
+                return start_response(status, headers, exc_info)
+            # nothing has been sent yet, so an error page may always
+            # replace the headers given before
+            response[:] = [status, headers]
+            return written.append
+
+        body = None
+        try:
+            body = self.app(environment, delay)
+            unit_of_work.commit(self.wait)
+        except self.conflict_errors as e:
+            unit_of_work.rollback()
+            if body is not None:
+                GzipMiddleware.close(body)
+            return self.conflict(start_response, e)
+        except Exception:
+            unit_of_work.rollback()
+            raise
+        finally:
+            UnitOfWork.set_current(None)
+        committed.append(True)
+        if not response:
+            # start_response is called while the body is iterated, so
+            # it's passed on as is
+            return body
+        write = start_response(*response)
+        for data in written:
+            write(data)
+        return body
+
+    @staticmethod
+    def conflict(start_response: Callable, error: Exception) -> list:
+        """
+        Starts the 409 response to the request whose changes conflict
+        with the data in the database.
+
+        :param start_response: WSGI start_response callable
+        :param error: error of the commit or of the view
+        :return: body of the response
+        """
+        body = (f'The changes could not be saved, please try again: '
+                f'{error}').encode()
+        start_response('409 Conflict', [
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+        ])
+        return [body]
+
+
+class AdmissionMiddleware:
+    """
+    Admission control for the application: at most max_concurrency
+    requests are processed at once, the others wait in a bounded queue
+    and are admitted by priority (then in the order of arrival) as the
+    running requests finish. The priority of a request is set by the
+    first matching rule (path prefix, method, priority), the lower the
+    number the higher the priority. When the queue is full, a new request
+    either takes the place of the lowest-priority waiting request (if it
+    has a higher priority) or is rejected at once; a request that can't
+    be admitted within queue_timeout is rejected as well. The rejected
+    requests get a 503 response with a Retry-After header, so the latency
+    of the admitted ones stays bounded under overload. A request holds
+    its slot until its body has been sent.
+    """
+    default_priorities = (
+        ('/api/', None, 0),
+        ('/static/', None, 0),
+        ('', 'GET', 1),
+        ('', 'HEAD', 1),
+        ('', None, 2),
+    )
+
+    def __init__(self, app: Callable, max_concurrency: int = 8,
+                 max_queue: int = 32, queue_timeout: float = 1.0,
+                 retry_after: int = 1, priorities: tuple = None):
+        """
+        Initializes the middleware.
+
+        :param app: WSGI application to wrap
+        :param max_concurrency: maximum number of requests processed
+            at once
+        :param max_queue: maximum number of requests waiting to be
+            processed
+        :param queue_timeout: how long a request may wait (in seconds)
+        :param retry_after: value of the Retry-After header (in seconds)
+        :param priorities: tuples of a path prefix, a method (None for
+            any) and a priority, the first matching one is used
+        """
+        if max_concurrency < 1 or max_queue < 0:
+            raise ValueError('Invalid admission limits.')
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.priorities = priorities or self.default_priorities
+        self.lock = Lock()
+        self.active = 0
+        self.waiting = []
+        self.queued = 0
+        self.counter = count()
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.shed = 0
+        self.max_queued = 0
+        self.wait_time = 0.0
+
+    def get_priority(self, environment: dict) -> int:
+        """
+        Returns the priority of the request.
+
+        :param environment: WSGI environment
+        """
+        path = environment.get('PATH_INFO', '')
+        method = environment.get('REQUEST_METHOD', 'GET')
+        for prefix, rule_method, priority in self.priorities:
+            if path.startswith(prefix) and rule_method in (None, method):
+                return priority
+        return self.priorities[-1][2]
+
+    def acquire(self, priority: int) -> bool:
+        """
+        Takes a processing slot for the request, waiting in the queue
+        if all of them are taken.
+
+        :param priority: priority of the request
+        :return: whether the request has been admitted
+        """
+        with self.lock:
+            if self.active < self.max_concurrency and not self.queued:
+                self.active += 1
+                self.admitted += 1
+                return True
+            if self.queued >= self.max_queue \
+                    and not self.shed_lowest(priority):
+                self.rejected += 1
+                return False
+            # the entry of a waiting request: priority, order of arrival,
+            # the event and the outcome (None while it's waiting)
+            entry = [priority, next(self.counter), Event(), None]
+            heapq.heappush(self.waiting, entry)
+            self.queued += 1
+            self.delayed += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        start = monotonic()
+        entry[2].wait(self.queue_timeout)
+        with self.lock:
+            self.wait_time += monotonic() - start
+            if entry[3] is None:
+                entry[3] = False
+                self.queued -= 1
+                self.timed_out += 1
+            if entry[3]:
+                self.admitted += 1
+            else:
+                self.rejected += 1
+            return entry[3]
+
+    def shed_lowest(self, priority: int) -> bool:
+        """
+        Rejects the waiting request with the lowest priority (the latest
+        of them) if it's lower than the given one. Called with the lock
+        held.
+
+        :param priority: priority of the new request
+        :return: whether a request has been rejected
+        """
+        waiting = [entry for entry in self.waiting if entry[3] is None]
+        if not waiting:
+            return False
+        lowest = max(waiting, key=lambda entry: (entry[0], entry[1]))
+        if lowest[0] <= priority:
+            return False
+        lowest[3] = False
+        lowest[2].set()
+        self.queued -= 1
+        self.shed += 1
+        return True
+
+    def release(self):
+        """
+        Frees the slot of a finished request: passes it to the waiting
+        request with the highest priority, if there is one.
+        """
+        with self.lock:
+            while self.waiting:
+                entry = heapq.heappop(self.waiting)
+                if entry[3] is None:
+                    entry[3] = True
+                    entry[2].set()
+                    self.queued -= 1
+                    return
+            self.active -= 1
+
+    def reject(self, start_response: Callable) -> list:
+        """
+        Sends the response to a rejected request.
+
+        :param start_response: WSGI start_response callable
+        """
+        body = b'The server is overloaded, please retry later.'
+        start_response('503 Service Unavailable', [
+            ('Content-Type', 'text/plain; charset=utf-8'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(self.retry_after)),
+        ])
+        return [body]
+
+    def __call__(self, environment: dict, start_response: Callable):
+        """
+        Main callable method. Admits the request (or rejects it) and
+        calls the wrapped application.
+
+        :param environment: WSGI environment
+        :param start_response: WSGI start_response callable
+        """
+        if not self.acquire(self.get_priority(environment)):
+            return self.reject(start_response)
+        try:
+            body = self.app(environment, start_response)
+        except BaseException:
+            self.release()
+            raise
+        if isinstance(body, list):
+            self.release()
+            return body
+        return self.release_after(body)
+
+    def release_after(self, body: Iterable) -> Iterator[bytes]:
+        """
+        Generator sending the body and freeing the slot afterwards.
+
+        :param body: body of the response
+        """
+        try:
+            yield from body
+        finally:
+            GzipMiddleware.close(body)
+            self.release()
+
+    def stats(self) -> dict:
+        """
+        Returns the metrics of the admission: the numbers of the requests
+        being processed and waiting (and the peak of the latter), the
+        numbers of the admitted requests, of the ones that had to wait
+        and of the rejected ones (with the ones rejected after waiting
+        too long and the ones shed for the higher-priority requests),
+        and the average wait in the queue.
+        """
+        with self.lock:
+            return {
+                'active': self.active,
+                'queued': self.queued,
+                'max_queued': self.max_queued,
+                'admitted': self.admitted,
+                'delayed': self.delayed,
+                'rejected': self.rejected,
+                'timed_out': self.timed_out,
+                'shed': self.shed,
+                'average_wait': self.wait_time / self.delayed
+                if self.delayed else 0.0,
+            }
+
+
+class DeadlineMiddleware:
+    """
+    Answers the requests whose views have run past their deadlines (see
+    Application.call_view) with a 504 response and counts them. Placed
+    outside the UnitOfWorkMiddleware, so the changes of such a request
+    are rolled back before the response is sent.
+    """
+
+    def __init__(self, app: Callable):
+        """
+        Initializes the middleware.
+
+        :param app: WSGI application to wrap
+        """
+        self.app = app
+        self.lock = Lock()
+        self.requests = 0
+        self.timeouts = 0
+        self.path_timeouts = {}
+
+    def __call__(self, environment: dict, start_response: Callable):
+        """
+        Main callable method. Calls the wrapped application and sends
+        the 504 response if the deadline of the view has passed.
+
+        :param environment: WSGI environment
+        :param start_response: WSGI start_response callable
+        """
+        try:
+            body = self.app(environment, start_response)
+        except DeadlineExceededError as e:
+            path = environment.get('PATH_INFO', '')
+            with self.lock:
+                self.requests += 1
+                self.timeouts += 1
+                self.path_timeouts[path] = self.path_timeouts.get(path, 0) + 1
+            body = f'The request took longer than {e.timeout} sec.'.encode()
+            start_response('504 Gateway Timeout', [
+                ('Content-Type', 'text/plain; charset=utf-8'),
+                ('Content-Length', str(len(body))),
+            ])
+            return [body]
+        with self.lock:
+            self.requests += 1
+        return body
+
+    def stats(self) -> dict:
+        """
+        Returns the metrics of the deadlines: the numbers of the requests
+        and of the ones that timed out, in total and by url path.
+        """
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'timeouts': self.timeouts,
+                'timeout_ratio': self.timeouts / self.requests
+                if self.requests else 0.0,
+                'path_timeouts': dict(self.path_timeouts),
+            }
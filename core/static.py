@@ -0,0 +1,199 @@
+"""
+Module with the static files handler for the framework. The handler is
+mounted under a URL prefix (see UrlPaths.add_static) and serves the files
+from a directory on disk without passing them through the templator.
+Whenever the WSGI server provides wsgi.file_wrapper (gunicorn does, and
+it uses os.sendfile underneath), the file is handed over to the server
+as is, otherwise it is memory-mapped and sent in blocks.
+"""
+import os
+from mimetypes import guess_type
+from mmap import mmap, ACCESS_READ
+from typing import Iterator, Optional, Tuple
+
+
+class StaticFile:
+    """
+    Precomputed metadata of a single static file: everything needed
+    for the response headers is calculated once per file version.
+    """
+    __slots__ = ('path', 'size', 'mtime', 'etag', 'content_type')
+
+    def __init__(self, path: str, stat: os.stat_result):
+        """
+        Initializes the file metadata from the result of os.stat.
+
+        :param path: absolute path to the file
+        :param stat: result of os.stat for the file
+        """
+        self.path = path
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime_ns
+        self.etag = f'"{self.size:x}-{self.mtime:x}"'
+        content_type, encoding = guess_type(path)
+        self.content_type = content_type or 'application/octet-stream'
+
+
+class RangeFileWrapper:
+    """
+    Iterable that sends a part of the file in blocks. It's used for
+    Range-requests and for servers without wsgi.file_wrapper. The file
+    is memory-mapped, so the blocks are sliced straight from the page
+    cache instead of being read into intermediate buffers.
+    """
+
+    def __init__(self, file, start: int, length: int, block_size: int):
+        """
+        Initializes the wrapper.
+
+        :param file: file object opened in binary mode
+        :param start: first byte to send
+        :param length: number of bytes to send
+        :param block_size: size of a single block
+        """
+        self.file = file
+        self.start = start
+        self.length = length
+        self.block_size = block_size
+        self.map = mmap(file.fileno(), 0, access=ACCESS_READ) \
+            if length else None
+
+    def __iter__(self) -> Iterator[bytes]:
+        """
+        Yields the requested part of the file block by block.
+        """
+        position = self.start
+        end = self.start + self.length
+        while position < end:
+            next_position = min(position + self.block_size, end)
+            yield self.map[position:next_position]
+            position = next_position
+
+    def close(self):
+        """
+        Releases the memory map and closes the file. Called by the
+        WSGI server once the response has been sent.
+        """
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class StaticFiles:
+    """
+    Callable handler serving the files from the given directory. It
+    supports conditional requests (ETag / If-None-Match), single byte
+    ranges and HEAD-requests, and marks all the responses as cacheable
+    for a long time.
+    """
+    block_size = 64 * 1024
+
+    def __init__(self, directory: str, max_age: int = 31536000):
+        """
+        Initializes the handler.
+
+        :param directory: directory with the static files
+        :param max_age: value of max-age in the Cache-Control header
+        """
+        self.directory = os.path.realpath(directory)
+        self.cache_control = f'public, max-age={max_age}'
+        self.files = {}
+
+    def get_file(self, relative_path: str) -> Optional[StaticFile]:
+        """
+        Returns the metadata of the requested file, or None if there's
+        no such file in the directory. The symbolic links are resolved
+        before the check, so a link can't point outside the directory.
+        The metadata is cached and only recomputed when the file's size
+        or modification time change.
+
+        :param relative_path: path to the file relative to the directory
+        """
+        path = os.path.realpath(os.path.join(self.directory, relative_path))
+        if not path.startswith(self.directory + os.sep):
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        static_file = self.files.get(path)
+        if static_file is None or static_file.mtime != stat.st_mtime_ns \
+                or static_file.size != stat.st_size:
+            static_file = self.files[path] = StaticFile(path, stat)
+        return static_file
+
+    @staticmethod
+    def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+        """
+        Parses the Range header. Only single byte ranges are supported,
+        anything else results in the full file being sent.
+
+        :param header: value of the Range header
+        :param size: size of the file
+        :return: tuple with the first and the last byte, or None
+        :raise ValueError: if the range can't be satisfied
+        """
+        unit, _, ranges = header.partition('=')
+        if unit.strip() != 'bytes' or ',' in ranges:
+            return None
+        first, _, last = ranges.strip().partition('-')
+        if not first.isdigit() and not last.isdigit():
+            return None
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last.isdigit() else size - 1
+        if start > end or start >= size:
+            raise ValueError(header)
+        return start, end
+
+    def __call__(self, request: dict) -> (str, list, list):
+        """
+        Main callable method. Returns the status, the body (either the
+        server's file wrapper or the memory-mapped file) and the headers.
+
+        :param request: HTTP-request
+        """
+        static_file = None
+        if request['method'] in ('GET', 'HEAD'):
+            static_file = self.get_file(request['path'])
+        if static_file is None:
+            return '404 NOT FOUND', [b'PAGE NOT FOUND'], [
+                ('Content-Type', 'text/html')]
+        environment = request['environ']
+        headers = [
+            ('Content-Type', static_file.content_type),
+            ('ETag', static_file.etag),
+            ('Cache-Control', self.cache_control),
+            ('Accept-Ranges', 'bytes'),
+        ]
+        if environment.get('HTTP_IF_NONE_MATCH') == static_file.etag:
+            return '304 Not Modified', [], headers
+        status, start, length = '200 OK', 0, static_file.size
+        range_header = environment.get('HTTP_RANGE')
+        if range_header and environment.get(
+                'HTTP_IF_RANGE', static_file.etag) == static_file.etag:
+            try:
+                byte_range = self.parse_range(range_header, static_file.size)
+            except ValueError:
+                headers.append(
+                    ('Content-Range', f'bytes */{static_file.size}'))
+                return '416 Range Not Satisfiable', [], headers
+            if byte_range:
+                start, end = byte_range
+                status, length = '206 Partial Content', end - start + 1
+                headers.append((
+                    'Content-Range',
+                    f'bytes {start}-{end}/{static_file.size}'))
+        headers.append(('Content-Length', str(length)))
+        if request['method'] == 'HEAD':
+            return status, [], headers
+        file = open(static_file.path, 'rb')
+        file_wrapper = environment.get('wsgi.file_wrapper')
+        if file_wrapper and length == static_file.size:
+            return status, file_wrapper(file, self.block_size), headers
+        return status, RangeFileWrapper(
+            file, start, length, self.block_size), headers
@@ -3,20 +3,179 @@ Module that renders the templates. The main function here
 takes in the name of the template, the folder the templates are stored in
 and any keyword arguments you might want to pass into the template, and then
 renders the HTML-page with the help of Jinja2.
+
+The templates are compiled once per process and cached by the Jinja2
+environment. They can also be compiled ahead of time into a bundle
+(a zip archive with the compiled Python modules and their bytecode):
+
+    python -m core.templator
+
+If the bundle exists and is newer than all the templates, the templates
+are loaded from it, so the workers don't compile anything when they
+serve their first requests. Otherwise, or for the templates missing in
+the bundle, the sources are compiled as usual.
+
+Jinja2 is imported when the environment is created rather than with this
+module, so importing the views doesn't pay for it before the first render.
+
+Within a request with a deadline (see orm.deadlines) the template is
+rendered piece by piece, and the rendering stops with
+the DeadlineExceededError as soon as the deadline has passed.
 """
-from jinja2 import Environment, FileSystemLoader
+import os
+import py_compile
+import sys
+import tempfile
+from itertools import islice
+from threading import Lock
+from typing import TYPE_CHECKING
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from orm.deadlines import Deadline
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+
+TEMPLATES_DIRECTORY = 'templates'
+BUNDLE_PATH = 'templates_bundle.zip'
+# number of the pieces of the output rendered between the deadline checks
+DEADLINE_CHECK_PIECES = 16
+
+environment = None
+environment_lock = Lock()
+
+
+def bundle_is_fresh(directory: str = TEMPLATES_DIRECTORY,
+                    bundle: str = BUNDLE_PATH) -> bool:
+    """
+    Checks that the bundle exists and no template has been changed
+    after it was built.
+
+    :param directory: directory with the templates
+    :param bundle: path to the bundle
+    """
+    try:
+        built = os.path.getmtime(bundle)
+    except OSError:
+        return False
+    for root, _, file_names in os.walk(directory):
+        for file_name in file_names:
+            if os.path.getmtime(os.path.join(root, file_name)) > built:
+                return False
+    return True
+
+
+def create_environment(directory: str = TEMPLATES_DIRECTORY,
+                       bundle: str = BUNDLE_PATH) -> 'Environment':
+    """
+    Creates the Jinja2 environment loading the templates from the bundle
+    if it's fresh, and from the directory otherwise.
+
+    :param directory: directory with the templates
+    :param bundle: path to the bundle
+    """
+    from jinja2 import ChoiceLoader, Environment, FileSystemLoader, \
+        ModuleLoader
+
+    loader = FileSystemLoader(directory)
+    if bundle_is_fresh(directory, bundle):
+        loader = ChoiceLoader([ModuleLoader(bundle), loader])
+    return Environment(loader=loader)
+
+
+def get_environment() -> 'Environment':
+    """
+    Returns the environment of the process, creating it on the first call.
+    """
+    global environment
+    if environment is None:
+        with environment_lock:
+            if environment is None:
+                environment = create_environment()
+    return environment
+
+
+def template_name_in_directory(template_name: str) -> str:
+    """
+    Returns the name of the template relative to the templates directory
+    (the views pass the names with the directory, e.g.
+    'templates/index.html').
+
+    :param template_name: name of html-file
+    """
+    prefix = f'{TEMPLATES_DIRECTORY}/'
+    if template_name.startswith(prefix):
+        return template_name[len(prefix):]
+    return template_name
 
 
 def render_template(template_name, **kwargs) -> str:
     """
-    Function that renders the templates using Jinja2.
+    Function that renders the templates using Jinja2. The deadline of
+    the current request is checked after every DEADLINE_CHECK_PIECES
+    pieces of the output.
 
     :param template_name: name of html-file
     :param kwargs: any data passed into template
     :return: rendered HTML template
     """
-    with open(template_name, encoding='utf-8') as temp:
-        template = temp.read()
-        template = Environment(loader=FileSystemLoader(
-            'templates/')).from_string(template)
-    return template.render(**kwargs)
+    template = get_environment().get_template(
+        template_name_in_directory(template_name))
+    deadline = Deadline.get_current()
+    if deadline is None:
+        return template.render(**kwargs)
+    pieces = template.generate(**kwargs)
+    batches = []
+    batch = ''.join(islice(pieces, DEADLINE_CHECK_PIECES))
+    while batch:
+        batches.append(batch)
+        deadline.check()
+        batch = ''.join(islice(pieces, DEADLINE_CHECK_PIECES))
+    return ''.join(batches)
+
+
+def preload_templates():
+    """
+    Loads all the templates into the cache of the environment. Meant to
+    be called in the master process before the workers are forked, so
+    they inherit the compiled templates.
+    """
+    current = get_environment()
+    for name in current.list_templates():
+        current.get_template(name)
+
+
+def compile_bundle(directory: str = TEMPLATES_DIRECTORY,
+                   bundle: str = BUNDLE_PATH) -> list:
+    """
+    Compiles all the templates into Python modules and packs them into
+    the bundle together with their bytecode (the bytecode is used if
+    it's been built by the same version of Python, otherwise the modules
+    are compiled on import). The bundle is replaced atomically.
+
+    :param directory: directory with the templates
+    :param bundle: path to the bundle
+    :return: names of the compiled templates
+    """
+    from jinja2 import Environment, FileSystemLoader
+
+    source = Environment(loader=FileSystemLoader(directory))
+    names = source.list_templates()
+    with tempfile.TemporaryDirectory() as target:
+        source.compile_templates(target, zip=None, ignore_errors=False,
+                                 log_function=None)
+        partial = f'{bundle}.tmp'
+        with ZipFile(partial, 'w', ZIP_DEFLATED) as archive:
+            for file_name in sorted(os.listdir(target)):
+                path = os.path.join(target, file_name)
+                py_compile.compile(path, cfile=f'{path}c', doraise=True)
+                archive.write(path, file_name)
+                archive.write(f'{path}c', f'{file_name}c')
+        os.replace(partial, bundle)
+    return names
+
+
+if __name__ == '__main__':
+    compiled = compile_bundle(*sys.argv[1:3])
+    print(f'Compiled {len(compiled)} templates into '
+          f'{sys.argv[2] if len(sys.argv) > 2 else BUNDLE_PATH}')
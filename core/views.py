@@ -2,6 +2,8 @@
 Module with base CBVs used throughout the framework as parent classes for
 user's templates.
 """
+import json
+
 from core.decorators import debug
 from core.templator import render_template
 from logs.config import Logger
@@ -13,13 +15,20 @@ class TemplateView:
     """
     Base template view. It simply renders the template with the given name
     using the 'render_template' function from the framework's templator.
+    The timeout is the deadline of the view in seconds (None to use
+    the default one of the application). The views with a true etag
+    attribute send an ETag, so the clients can revalidate their pages.
     """
     template_name = 'template.html'
+    timeout = None
+    etag = False
 
     @debug
-    def get_context_data(self) -> dict:
+    def get_context_data(self, request: dict = None) -> dict:
         """
         Returns the dictionary with the context data for further rendering.
+
+        :param request: HTTP-request
         """
         return {}
 
@@ -31,12 +40,15 @@ class TemplateView:
         return self.template_name
 
     @debug
-    def render_template_with_context(self) -> (str, list):
+    def render_template_with_context(self, request: dict = None) \
+            -> (str, list):
         """
         Renders the template with the given name and given context data.
+
+        :param request: HTTP-request
         """
         template_name = self.get_template()
-        context_data = self.get_context_data()
+        context_data = self.get_context_data(request)
         return '200 Ok', [render_template(
             template_name, **context_data).encode('utf-8')]
 
@@ -51,23 +63,30 @@ class TemplateView:
         """
         logger.logger(f'Rendering template: {self.template_name} '
                       f'for {self.__class__.__name__}')
-        return self.render_template_with_context()
+        return self.render_template_with_context(request)
 
 
 class ListView(TemplateView):
     """
     Base view for a list of objects. Takes in the template name, the
     queryset of the objects and the name of this queryset for use in
-    the template itself.
+    the template itself. The queryset can be either a list or a lazy
+    QuerySet of the ORM. If paginate_by is set, only one page of the
+    queryset is put into the context (for a QuerySet only the rows of
+    this page are read from the database), and the number of the page
+    is taken from the 'page' query parameter.
     """
     template_name = 'list.html'
     queryset = []
     context_objects_name = 'objects_list'
+    paginate_by = None
 
     @debug
-    def get_queryset(self) -> list:
+    def get_queryset(self, request: dict = None) -> list:
         """
         Returns the queryset.
+
+        :param request: HTTP-request
         """
         return self.queryset
 
@@ -78,14 +97,50 @@ class ListView(TemplateView):
         """
         return self.context_objects_name
 
+    @staticmethod
+    def get_page_number(request: dict = None) -> int:
+        """
+        Returns the number of the requested page, the first by default.
+
+        :param request: HTTP-request
+        """
+        if request:
+            page = request['req_params'].get('page', '')
+            if page.isdigit() and int(page) > 0:
+                return int(page)
+        return 1
+
+    def paginate_queryset(self, queryset, page: int) -> (list, bool):
+        """
+        Slices one page out of the queryset. Reads one extra object to
+        find out whether there's a next page.
+
+        :param queryset: list or QuerySet
+        :param page: number of the page
+        :return: objects of the page and whether there's a next page
+        """
+        start = (page - 1) * self.paginate_by
+        objects = list(queryset[start:start + self.paginate_by + 1])
+        return objects[:self.paginate_by], len(objects) > self.paginate_by
+
     @debug
-    def get_context_data(self) -> dict:
+    def get_context_data(self, request: dict = None) -> dict:
         """
         Returns the context data for further rendering.
+
+        :param request: HTTP-request
         """
-        queryset = self.get_queryset()
+        queryset = self.get_queryset(request)
         context_objects_name = self.get_context_objects_name()
-        context = {context_objects_name: queryset}
+        if not self.paginate_by:
+            return {context_objects_name: queryset}
+        page = self.get_page_number(request)
+        objects, has_next = self.paginate_queryset(queryset, page)
+        context = {
+            context_objects_name: objects,
+            'page': page,
+            'has_next': has_next,
+        }
         return context
 
 
@@ -126,6 +181,37 @@ class CreateView(TemplateView):
         if request['method'] == 'POST':
             data = self.get_request_data(request)
             self.create_object(data)
-            return self.render_template_with_context()
+            return self.render_template_with_context(request)
         else:
             return super().__call__(request)
+
+
+class StatsView:
+    """
+    View sending the metrics of the given sources (any objects with
+    a stats() method, e.g. the AdmissionMiddleware and the
+    DeadlineMiddleware) as JSON, so the operators can watch the load
+    shedding and the missed deadlines of the running application.
+    """
+
+    def __init__(self, sources: dict):
+        """
+        Initializes the view.
+
+        :param sources: objects with the stats() method by their names
+        """
+        self.sources = sources
+
+    def __call__(self, request: dict) -> (str, list, list):
+        """
+        Main callable method. Returns the current metrics of all the
+        sources, which must never be cached.
+
+        :param request: HTTP-request
+        """
+        stats = {name: source.stats()
+                 for name, source in self.sources.items()}
+        return '200 Ok', [json.dumps(stats).encode('utf-8')], [
+            ('Content-Type', 'application/json'),
+            ('Cache-Control', 'no-store'),
+        ]
@@ -2,32 +2,52 @@
 The core module of the WSGI framework. Contains the main Application
 class for the framework and also several subclasses for logging and testing.
 """
+from hashlib import blake2b
 from quopri import decodestring
 from typing import Callable
 from wsgiref.util import setup_testing_defaults
 
+from orm.deadlines import Deadline
+from orm.errors import DeadlineExceededError
+
 
 class Application:
     """
     The core class of the WSGI framework.
     """
 
-    def __init__(self, urls: dict, fronts: list):
+    def __init__(self, urls: dict, fronts: list, mounts: dict = None,
+                 default_timeout: float = None):
         """
-        Takes in the dict with url-patterns and the list of front controllers.
+        Takes in the dict with url-patterns, the list of front controllers
+        and optionally the dict with the handlers mounted under url
+        prefixes (e.g. static files) and the deadline of the views that
+        don't set their own.
 
         :param urls: url paths
         :param fronts: front controllers
+        :param mounts: url prefixes with their handlers
+        :param default_timeout: time given to a view (in seconds), or None
+            for no deadline
         """
         self.urls = urls
         self.front_controllers = fronts
-        self.request = {}
+        self.mounts = mounts if mounts is not None else {}
+        self.default_timeout = default_timeout
 
     def __call__(self, environment: dict, start_response: Callable) -> list:
         """
         Main callable method of the class. Does all the work:
         analyzes the HTTP-request and then chooses an appropriate view
-        based on the URL path given.
+        based on the URL path given. Views return the status and the
+        body, and may also return the list of headers as the third
+        element, otherwise the response is sent as HTML. The view runs
+        under its deadline (the timeout attribute of the view or
+        the default one): the ORM interrupts the queries running past it,
+        the templator stops rendering past it, and
+        the DeadlineExceededError is raised if the view hasn't finished
+        in time. The responses of the views with a true etag
+        attribute get an ETag (see add_etag).
 
         :param environment:
         :param start_response:
@@ -37,25 +57,99 @@ class Application:
         request_method = environment['REQUEST_METHOD']
         query_string = environment['QUERY_STRING']
         path = environment['PATH_INFO']
+        view, mounted_path = self.get_mounted_view(path)
         if not path.endswith('/'):
             path = f'{path}/'
-        data = self.get_wsgi_input_data(environment)
-        data = self.parse_wsgi_input_data(data)
-        request_parameters = self.parse_input_data(query_string)
-        if path in self.urls:
-            view = self.urls[path]
-            self.request['method'] = request_method
-            self.request['data'] = data
-            self.request['req_params'] = request_parameters
-            for controller in self.front_controllers:
-                controller(self.request)
-            resp, body = view(self.request)
-            start_response(resp, [('Content-Type', 'text/html')])
+        if view is None:
+            view = self.urls.get(path)
+        if view is not None:
+            data = self.get_wsgi_input_data(environment)
+            data = self.parse_wsgi_input_data(data)
+            request_parameters = self.parse_input_data(query_string)
+            request = {
+                'method': request_method,
+                'data': data,
+                'req_params': request_parameters,
+                'path': mounted_path,
+                'environ': environment,
+            }
+            resp, body, *headers = self.call_view(view, request)
+            headers = headers[0] if headers else [
+                ('Content-Type', 'text/html')]
+            if getattr(view, 'etag', False):
+                resp, body, headers = self.add_etag(
+                    environment, resp, body, headers)
+            start_response(resp, headers)
             return body
         else:
             start_response('404 NOT FOUND', [('Content-Type', 'text/html')])
             return [b'PAGE NOT FOUND']
 
+    def call_view(self, view: Callable, request: dict) -> tuple:
+        """
+        Runs the front controllers and the view under the deadline of
+        the view.
+
+        :param view: view for the request
+        :param request: request dictionary
+        :return: the response of the view
+        """
+        timeout = getattr(view, 'timeout', None) or self.default_timeout
+        with Deadline.applied(timeout) as deadline:
+            try:
+                for controller in self.front_controllers:
+                    controller(request)
+                response = view(request)
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                if deadline is not None and deadline.expired():
+                    raise DeadlineExceededError(deadline.timeout) from e
+                raise
+            if deadline is not None:
+                deadline.check()
+            return response
+
+    @staticmethod
+    def add_etag(environment: dict, status: str, body: list,
+                 headers: list) -> (str, list, list):
+        """
+        Adds the ETag computed from the body to a successful response,
+        so it can be cached by the clients (and its compressed variant
+        by the GzipMiddleware). The ETag only depends on the content, so
+        it's the same in all the worker processes. If the client already
+        has this version of the response, it's replaced with 304.
+
+        :param environment: WSGI environment
+        :param status: response status
+        :param body: response body
+        :param headers: response headers
+        :return: the status, the body and the headers to send
+        """
+        if not status.startswith('200') or not isinstance(body, list):
+            return status, body, headers
+        digest = blake2b(digest_size=16)
+        for chunk in body:
+            digest.update(chunk)
+        etag = f'"{digest.hexdigest()}"'
+        headers = headers + [('ETag', etag)]
+        if environment.get('HTTP_IF_NONE_MATCH') == etag:
+            return '304 Not Modified', [], headers
+        return status, body, headers
+
+    def get_mounted_view(self, path: str) -> (Callable, str):
+        """
+        Looks for a handler mounted under a prefix of the given path.
+
+        :param path: url path
+        :return: the handler and the rest of the path after the prefix,
+            or None and the full path if nothing is mounted there
+        """
+        for prefix, view in self.mounts.items():
+            if path.startswith(prefix):
+                return view, path[len(prefix):]
+        return None, path
+
     @staticmethod
     def parse_input_data(data: str) -> dict:
         """
@@ -89,15 +183,17 @@ class Application:
 
     def parse_wsgi_input_data(self, raw_data: bytes) -> dict:
         """
-        Converts the data from a POST-request to a dictionary.
+        Converts the data from a POST-request to a dictionary. Like the
+        query parameters, the values are left encoded (see decode_value):
+        decoding the whole body before splitting it would break on
+        the values that look like escape sequences (e.g. 'id=12').
 
         :param raw_data: raw input data
         :return: dictionary with values
         """
         result = {}
         if raw_data:
-            data_string = self.decode_value(raw_data.decode('utf-8'))
-            result = self.parse_input_data(data_string)
+            result = self.parse_input_data(raw_data.decode('utf-8'))
         return result
 
     @staticmethod
@@ -119,7 +215,8 @@ class LoggingApplication(Application):
     prints some useful information in stdout.
     """
 
-    def __init__(self, urls: dict, fronts: list):
+    def __init__(self, urls: dict, fronts: list, mounts: dict = None,
+                 default_timeout: float = None):
         """
         The Application subclass for logging. First creates the main
         application for future purposes, then calls the super.__init__
@@ -127,9 +224,11 @@ class LoggingApplication(Application):
 
         :param urls: url paths
         :param fronts: front controllers
+        :param mounts: url prefixes with their handlers
+        :param default_timeout: time given to a view, or None
         """
-        self.app = Application(urls, fronts)
-        super().__init__(urls, fronts)
+        self.app = Application(urls, fronts, mounts, default_timeout)
+        super().__init__(urls, fronts, mounts, default_timeout)
 
     def __call__(self, environment: dict, start_response: Callable) -> list:
         """
@@ -157,16 +256,19 @@ class SpoofApplication(Application):
     any request it receives.
     """
 
-    def __init__(self, urls: dict, fronts: list):
+    def __init__(self, urls: dict, fronts: list, mounts: dict = None,
+                 default_timeout: float = None):
         """
         Dummy application subclass. Does nothing but return one phrase for
         any request it receives.
 
         :param urls: url routes
         :param fronts: front controllers
+        :param mounts: url prefixes with their handlers
+        :param default_timeout: time given to a view, or None
         """
-        self.app = Application(urls, fronts)
-        super().__init__(urls, fronts)
+        self.app = Application(urls, fronts, mounts, default_timeout)
+        super().__init__(urls, fronts, mounts, default_timeout)
 
     def __call__(self, environment: dict, start_response: Callable) -> list:
         """
@@ -1,14 +1,21 @@
 """
-Small script for the database creation.
+Small script for the database creation and migration. Applies the
+pending migrations from the migrations directory (the existing data is
+kept) and then checks the query plans of the lookups the views run,
+warning about the ones scanning a whole table.
 """
 from sqlite3 import connect
 
+from mappers import ProjectMapperRegistry
+from orm.migrations import Migrator, find_full_scans
+
 connection = connect('test_db.sqlite3')
-cursor = connection.cursor()
 
-with open('create_db.sql', 'r') as file:
-    script = file.read()
+for migration in Migrator(connection).migrate():
+    print(f'Applied migration {migration}')
+
+registry = ProjectMapperRegistry(connection)
+for statement, step in find_full_scans(connection, registry.lookup_queries()):
+    print(f'WARNING: full table scan ({step}) in: {statement}')
 
-cursor.executescript(script)
-cursor.close()
 connection.close()
@@ -1,18 +1,125 @@
 from models import *
-from orm.mappers import Mapper, MapperRegistry
+from orm.mappers import Mapper, MapperRegistry, compile_hydrator
 
 
 class StudentMapper(Mapper):
+    model = Student
+    autocomplete_column = 'name'
+
+
+class CategoryMapper(Mapper):
+    model = CourseCategory
+    search_table = 'categories_search'
+
+    def load_parents(self, categories: list) -> dict:
+        """
+        Sets the parent categories of the given categories, loading
+        the whole chain of parents one level per query.
+
+        :param categories: list of categories
+        :return: the given categories and all their parents by IDs
+        """
+        result = {category.id: category for category in categories}
+        pending = list(categories)
+        while pending:
+            parents = self.find_by_ids(
+                category.category_id for category in pending
+                if category.category is None)
+            for category in pending:
+                if category.category is None and category.category_id:
+                    category.category = parents.get(category.category_id)
+            pending = [parent for parent in parents.values()
+                       if parent.id not in result]
+            result.update(parents)
+        return result
+
+
+class CourseMapper(Mapper):
+    model = Course
+    search_table = 'courses_search'
+    autocomplete_column = 'name'
+
     def __init__(self, connection):
         super().__init__(connection)
-        self.table_name = 'students'
+        self.type_column = self.columns.index('course_type')
+        self.hydrators = {
+            type_: compile_hydrator(
+                course_class, self.columns, course_class.transient_fields)
+            for type_, course_class in CourseFactory.course_types.items()}
+
+    def do_load(self, row: tuple) -> Course:
+        return self.hydrators[row[self.type_column]](row)
+
+
+class EnrollmentMapper(Mapper):
+    model = Enrollment
 
 
 class ProjectMapperRegistry(MapperRegistry):
     mappers = {
-        'student': StudentMapper
+        'student': StudentMapper,
+        'category': CategoryMapper,
+        'course': CourseMapper,
+        'enrollment': EnrollmentMapper,
     }
-    models = {Student}
 
     def __init__(self, connection):
         super().__init__(connection)
+
+    def load_categories(self, categories: list):
+        """
+        Loads the parents and the courses of the given categories in
+        batches, so that count_courses() doesn't query the database.
+
+        :param categories: list of categories
+        """
+        categories = self.get_current_mapper('category').load_parents(
+            categories)
+        courses = {category_id: [] for category_id in categories}
+        for course in self.get_current_mapper('course').filter_in(
+                'category_id', categories):
+            course.category = categories[course.category_id]
+            courses[course.category_id].append(course)
+        for category_id, category in categories.items():
+            category.existing_courses = courses[category_id]
+
+    def load_courses_in_attendance(self, students: list):
+        """
+        Loads the courses attended by the given students in batches.
+
+        :param students: list of students
+        """
+        enrollments = self.get_current_mapper('enrollment').filter_in(
+            'student_id', [student.id for student in students])
+        courses = self.get_current_mapper('course').find_by_ids(
+            enrollment.course_id for enrollment in enrollments)
+        attendance = {student.id: [] for student in students}
+        for enrollment in enrollments:
+            attendance[enrollment.student_id].append(
+                courses[enrollment.course_id])
+        for student in students:
+            student.courses_in_attendance = attendance[student.id]
+
+    def lookup_queries(self) -> list:
+        """
+        Returns the lookups the views run by a column value, so that their
+        query plans can be checked for the full-table scans (see
+        orm.migrations.find_full_scans).
+
+        :return: list of tuples with a statement and its parameters
+        """
+        student = self.get_current_mapper('student')
+        category = self.get_current_mapper('category')
+        course = self.get_current_mapper('course')
+        enrollment = self.get_current_mapper('enrollment')
+        querysets = [
+            student.return_all().filter(name=''),
+            course.return_all().filter(name=''),
+            course.return_all().filter(category_id__in=[0]),
+            category.return_all().filter(category_id__in=[0]),
+            enrollment.return_all().filter(student_id__in=[0]),
+            enrollment.return_all().filter(course_id__in=[0]),
+        ]
+        return [(mapper.find_statement, (0,)) for mapper in (
+            student, category, course, enrollment)] + \
+            [queryset.statement() for queryset in querysets]
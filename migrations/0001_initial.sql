@@ -0,0 +1,29 @@
+CREATE TABLE IF NOT EXISTS students
+(
+    id   INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
+    name VARCHAR(32)
+);
+
+CREATE TABLE IF NOT EXISTS categories
+(
+    id          INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
+    name        VARCHAR(64),
+    category_id INTEGER REFERENCES categories (id)
+);
+
+CREATE TABLE IF NOT EXISTS courses
+(
+    id          INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
+    name        VARCHAR(64),
+    course_type VARCHAR(16) NOT NULL,
+    category_id INTEGER REFERENCES categories (id),
+    version     INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS course_students
+(
+    id         INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL UNIQUE,
+    course_id  INTEGER NOT NULL REFERENCES courses (id) ON DELETE CASCADE,
+    student_id INTEGER NOT NULL REFERENCES students (id) ON DELETE CASCADE,
+    UNIQUE (course_id, student_id)
+);
@@ -0,0 +1,8 @@
+-- Secondary indexes for the lookups by name and the foreign keys.
+-- course_students (course_id) is covered by its UNIQUE constraint.
+CREATE INDEX IF NOT EXISTS students_name ON students (name);
+CREATE INDEX IF NOT EXISTS courses_name ON courses (name);
+CREATE INDEX IF NOT EXISTS courses_category_id ON courses (category_id);
+CREATE INDEX IF NOT EXISTS categories_category_id ON categories (category_id);
+CREATE INDEX IF NOT EXISTS course_students_student_id
+    ON course_students (student_id);
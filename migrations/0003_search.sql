@@ -0,0 +1,43 @@
+-- Full-text search over the names of the courses and the categories.
+-- The FTS5 tables are external-content ones: they only store the index,
+-- the text is read from the tables themselves. The triggers keep the
+-- index in sync with every write, whether it comes from the ORM or not.
+CREATE VIRTUAL TABLE courses_search USING fts5(
+    name, content='courses', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+CREATE VIRTUAL TABLE categories_search USING fts5(
+    name, content='categories', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+);
+
+CREATE TRIGGER courses_search_insert AFTER INSERT ON courses BEGIN
+    INSERT INTO courses_search (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER courses_search_delete AFTER DELETE ON courses BEGIN
+    INSERT INTO courses_search (courses_search, rowid, name)
+    VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER courses_search_update AFTER UPDATE OF name ON courses BEGIN
+    INSERT INTO courses_search (courses_search, rowid, name)
+    VALUES ('delete', old.id, old.name);
+    INSERT INTO courses_search (rowid, name) VALUES (new.id, new.name);
+END;
+
+CREATE TRIGGER categories_search_insert AFTER INSERT ON categories BEGIN
+    INSERT INTO categories_search (rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER categories_search_delete AFTER DELETE ON categories BEGIN
+    INSERT INTO categories_search (categories_search, rowid, name)
+    VALUES ('delete', old.id, old.name);
+END;
+CREATE TRIGGER categories_search_update AFTER UPDATE OF name ON categories
+BEGIN
+    INSERT INTO categories_search (categories_search, rowid, name)
+    VALUES ('delete', old.id, old.name);
+    INSERT INTO categories_search (rowid, name) VALUES (new.id, new.name);
+END;
+
+-- Index the rows that existed before the migration.
+INSERT INTO courses_search (courses_search) VALUES ('rebuild');
+INSERT INTO categories_search (categories_search) VALUES ('rebuild');
@@ -1,28 +1,39 @@
 """
 Module containing models for future use with the ORM and classes
-(e.g. factories) used by the main OnlineUniversity class.
+(e.g. factories) used by the main OnlineUniversity class. The models
+store their attributes in __slots__ and create the usually empty lists of
+the related objects on first use, so large catalogues stay compact in
+memory.
 """
-from core.bases import User, Factory, PrototypeMixin, Subject, Observer
-from orm.core import DomainObject
+from core.bases import User, Factory, PrototypeMixin, Subject, Observer, \
+    lazy_lists
+from orm.core import DomainObject, UnitOfWork
+from orm.ids import CounterIdAllocator
+from orm.search import InvertedIndex
 
 
-class CourseCategory:
+class CourseCategory(DomainObject):
     """
     Class representing the categories of the courses in the ORM.
     """
-    auto_id = 0
+    __slots__ = ('id', 'name', 'category', 'category_id', 'existing_courses',
+                 '__weakref__')
+    table_name = 'categories'
+    columns = ('id', 'name', 'category_id')
+    transient_fields = {'category': None, 'existing_courses': list}
+    id_allocator = CounterIdAllocator()
 
     def __init__(self, name: str, category):
         """
-        Initializes the course category, increases the auto_id by 1.
+        Initializes the course category with a new ID.
 
         :param name: category name
         :param category: can be either a CourseCategory object or None
         """
-        self.id = CourseCategory.auto_id
-        CourseCategory.auto_id += 1
+        self.id = self.allocate_id()
         self.name = name
         self.category = category
+        self.category_id = category.id if category else None
         self.existing_courses = []
 
     def count_courses(self) -> int:
@@ -37,25 +48,38 @@ class CourseCategory:
         return res
 
 
-class Course(PrototypeMixin, Subject):
+@lazy_lists('students')
+class Course(PrototypeMixin, Subject, DomainObject):
     """
     Main abstract class for courses, inherits from the Prototype Mixin
-    which allows for cloning of existing courses.
+    which allows for cloning of existing courses. The type of the course
+    is stored in the course_type column, the subclasses set it as
+    a class-attribute.
     """
+    __slots__ = ('id', 'version', 'name', 'category', 'category_id',
+                 'students', '__weakref__')
+    course_type = None
+    table_name = 'courses'
+    columns = ('id', 'name', 'course_type', 'category_id', 'version')
+    transient_fields = {'category': None, 'students': None, 'observers': None}
+    version_column = 'version'
+    id_allocator = CounterIdAllocator()
 
     def __init__(self, course_name: str, course_category: CourseCategory):
         """
-        Initializes the Course object and appends it to the list of
-        existing courses.
+        Initializes the Course object with a new ID and appends it to
+        the list of existing courses of its category (if it has one).
 
         :param course_name:
         :param course_category:
         """
+        self.id = self.allocate_id()
+        self.version = None
         self.name = course_name
         self.category = course_category
-        self.category.existing_courses.append(self)
-        self.students = []
-        super().__init__()
+        self.category_id = course_category.id if course_category else None
+        if self.category:
+            self.category.existing_courses.append(self)
 
     def __getitem__(self, item):
         """
@@ -71,19 +95,28 @@ class Course(PrototypeMixin, Subject):
     def add_student(self, student):
         """
         Handles the addition of a new student to the course on the course's
-        side.
+        side. Within a unit of work the observers are notified once its
+        changes have been committed, so nobody is told about an enrollment
+        that hasn't been saved.
 
         :param student:
         """
         self.students.append(student)
         student.courses_in_attendance.append(self)
-        self.notify()
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is None:
+            self.notify()
+        else:
+            unit_of_work.register_after_commit(self.notify)
 
 
 class OnlineCourse(Course):
     """
     Class representing the online (pre-recorded) courses in the ORM.
     """
+    __slots__ = ('number_of_lessons',)
+    course_type = 'online'
+    transient_fields = {**Course.transient_fields, 'number_of_lessons': int}
 
     def __init__(self, course_name: str, course_category: CourseCategory):
         """
@@ -101,6 +134,9 @@ class OfflineCourse(Course):
     """
     Class representing the offline courses in the ORM.
     """
+    __slots__ = ('address',)
+    course_type = 'offline'
+    transient_fields = {**Course.transient_fields, 'address': None}
 
     def __init__(self, course_name: str, course_category: CourseCategory):
         """
@@ -118,6 +154,8 @@ class WebinarCourse(Course):
     """
     Class representing the webinars in the ORM.
     """
+    __slots__ = ()
+    course_type = 'webinar'
 
     def __init__(self, course_name: str, course_category: CourseCategory):
         """
@@ -160,23 +198,28 @@ class Teacher(User):
     """
     Class representing teachers in the ORM.
     """
+    __slots__ = ()
 
 
+@lazy_lists('courses_in_attendance')
 class Student(User, DomainObject):
     """
     Class representing students in the ORM.
     """
+    __slots__ = ('id', 'courses_in_attendance', '__weakref__')
+    table_name = 'students'
+    columns = ('id', 'name')
+    transient_fields = {'courses_in_attendance': None}
 
     def __init__(self, name: str):
         """
-        Initializes the instance of Student class and creates
-        the list with courses this student is attending
+        Initializes the instance of Student class. The list with courses
+        this student is attending is created on first use.
 
         :param name: student's login
         """
         super().__init__(name)
-        self.id = None
-        self.courses_in_attendance = []
+        self.id = self.allocate_id()
 
     def attend_course(self, course: Course):
         """
@@ -205,6 +248,27 @@ class Student(User, DomainObject):
             print('You are not attending this course!')
 
 
+class Enrollment(DomainObject):
+    """
+    Class representing the enrollment of a student on a course in the ORM.
+    """
+    __slots__ = ('id', 'course_id', 'student_id', '__weakref__')
+    table_name = 'course_students'
+    columns = ('id', 'course_id', 'student_id')
+
+    def __init__(self, course: Course, student: Student):
+        """
+        Initializes the enrollment of the given student on the given
+        course. Both of them must already be saved to the database.
+
+        :param course: the course the student is enlisted on
+        :param student: the student
+        """
+        self.id = self.allocate_id()
+        self.course_id = course.id
+        self.student_id = student.id
+
+
 class UserFactory(Factory):
     """
     Factory class used for creation of the users.
@@ -279,6 +343,7 @@ class OnlineUniversity:
         self.students = []
         self.course_categories = []
         self.courses = []
+        self.search_index = InvertedIndex()
 
     @staticmethod
     def create_user(type_: str, name: str) -> User:
@@ -331,6 +396,34 @@ class OnlineUniversity:
         """
         return CourseFactory.create(type_, name, category)
 
+    def add_category(self, category: CourseCategory):
+        """
+        Adds the category to the existing ones and to the search index.
+
+        :param category: an instance of the CourseCategory class
+        """
+        self.course_categories.append(category)
+        self.search_index.add(category, category.name)
+
+    def add_course(self, course: Course):
+        """
+        Adds the course to the existing ones and to the search index.
+
+        :param course: an instance of one of Course subclasses
+        """
+        self.courses.append(course)
+        self.search_index.add(course, course.name)
+
+    def search(self, text: str) -> list:
+        """
+        Searches the existing courses and categories by the words of
+        their names (the words of the query may be incomplete).
+
+        :param text: search query
+        :return: matching courses and categories, the most relevant first
+        """
+        return self.search_index.search(text)
+
     def get_course(self, name: str) -> (Course, None):
         """
         Tries to fetch a course by name. If nothing has been found
@@ -0,0 +1,107 @@
+"""
+Module containing the LRU-cache used by the framework's mappers for
+the point lookups and small hot queries. The cache stores the rows read
+from the database (not the objects), so it can be safely shared between
+the threads and the units of work.
+"""
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe cache discarding the least recently used items
+    first. Keeps the statistics of hits and misses. Every invalidation
+    increases the version of the cache: a value read from the database
+    before an invalidation is not stored, so a stale row can't get back
+    into the cache after it's been invalidated.
+    """
+
+    def __init__(self, max_size: int = 1024):
+        """
+        Initializes the cache.
+
+        :param max_size: maximum number of items in the cache
+        """
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        """
+        Returns the number of items in the cache.
+        """
+        return len(self.items)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Returns the cached value and marks it as recently used, or
+        the default value if there's no such key in the cache.
+
+        :param key: key of the item
+        :param default: value returned on a miss
+        """
+        with self.lock:
+            try:
+                self.items.move_to_end(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return self.items[key]
+
+    def set(self, key: Hashable, value: Any, version: int = None):
+        """
+        Stores the value in the cache, discarding the least recently used
+        item if the cache is full.
+
+        :param key: key of the item
+        :param value: value to store
+        :param version: version of the cache when the value was read,
+            the value isn't stored if the cache has been invalidated since
+        """
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        """
+        Removes the given keys from the cache.
+
+        :param keys: keys of the items
+        """
+        with self.lock:
+            self.version += 1
+            for key in keys:
+                self.items.pop(key, None)
+
+    def clear(self):
+        """
+        Removes all the items from the cache.
+        """
+        with self.lock:
+            self.version += 1
+            self.items.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the statistics of the cache: the number of hits, misses,
+        items and the hit ratio.
+        """
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.items),
+                'max_size': self.max_size,
+                'hit_ratio': self.hits / requests if requests else 0.0,
+            }
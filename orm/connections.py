@@ -0,0 +1,206 @@
+"""
+Module with the connection pools for the framework's ORM. SQLite
+connections can't be shared between threads by default, so the pool
+hands out a separate read-only connection to every thread and keeps
+a single write connection, which is used by one thread at a time.
+In WAL-mode the readers never block behind the writer.
+"""
+import os
+from contextlib import contextmanager
+from sqlite3 import Connection, Cursor, Error, connect
+from threading import RLock, local
+from typing import Iterator
+from weakref import WeakSet
+
+from orm.deadlines import Deadline, interrupt_expired
+from orm.errors import DatabaseCommitError, DeadlineExceededError
+
+
+class PooledConnection(Connection):
+    """
+    Connection created by the pool. Unlike the plain sqlite3 connection
+    it can be weakly referenced, so the pool doesn't keep the connections
+    of finished threads alive.
+    """
+
+
+class SingleConnectionPool:
+    """
+    Pool-like wrapper around one existing connection. Both the reads and
+    the writes go through this connection, the writes are serialized with
+    a lock. Used when the mappers are given a plain sqlite3 connection.
+    The statements are interrupted when the deadline of the current
+    request passes (checked every progress_steps SQLite instructions).
+    """
+    progress_steps = 1000
+
+    def __init__(self, connection: Connection):
+        """
+        Initializes the wrapper.
+
+        :param connection: database connection
+        """
+        self.connection = connection
+        self.write_lock = RLock()
+        connection.set_progress_handler(
+            interrupt_expired, self.progress_steps)
+
+    def reader(self) -> Connection:
+        """
+        Returns the connection for reading.
+        """
+        return self.connection
+
+    @contextmanager
+    def writer(self) -> Iterator[Connection]:
+        """
+        Context manager that holds the write lock and returns
+        the connection for writing. Within a request with a deadline
+        the lock is awaited only until the deadline.
+        """
+        deadline = Deadline.get_current()
+        if deadline is None:
+            self.write_lock.acquire()
+        elif not self.write_lock.acquire(timeout=deadline.remaining()):
+            raise DeadlineExceededError(deadline.timeout)
+        try:
+            yield self.connection
+        finally:
+            self.write_lock.release()
+
+    @contextmanager
+    def transaction(self) -> Iterator[Cursor]:
+        """
+        Context manager wrapping a block of statements into a single
+        transaction on the write connection. Commits it if the block
+        succeeds, otherwise rolls everything back and re-raises
+        the exception.
+
+        :return: cursor to execute the statements with
+        """
+        with self.writer() as connection:
+            if connection.isolation_level is None \
+                    and not connection.in_transaction:
+                connection.execute('BEGIN IMMEDIATE')
+            cursor = connection.cursor()
+            try:
+                yield cursor
+                connection.commit()
+            except Error as e:
+                connection.rollback()
+                raise DatabaseCommitError(e.args)
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close_all(self):
+        """
+        Closes the connection.
+        """
+        self.connection.close()
+
+
+class ConnectionPool(SingleConnectionPool):
+    """
+    Pool of connections to an SQLite database file. Every thread gets its
+    own read-only connection, and all the writes go through one write
+    connection guarded by a lock. All the connections are configured with
+    the pragmas from default_pragmas (WAL journal, relaxed synchronous
+    mode, larger page cache and memory-mapped I/O), which can be
+    overridden. The connections are opened lazily and re-opened after
+    a fork, so the worker processes never share them.
+    """
+    default_pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 268435456,
+        'busy_timeout': 5000,
+        'foreign_keys': 'ON',
+    }
+
+    def __init__(self, database: str, pragmas: dict = None,
+                 timeout: float = 5.0):
+        """
+        Initializes the pool. No connections are opened here.
+
+        :param database: path to the database file
+        :param pragmas: pragmas overriding the default ones
+        :param timeout: how long to wait for a lock held by another process
+        """
+        self.database = database
+        self.pragmas = {**self.default_pragmas, **(pragmas or {})}
+        self.timeout = timeout
+        self.write_lock = RLock()
+        self.reset()
+
+    def reset(self):
+        """
+        Forgets all the connections opened by the pool, without closing
+        them. Called after a fork in the child process.
+        """
+        self.pid = os.getpid()
+        self.local = local()
+        self.write_connection = None
+        self.connections = WeakSet()
+
+    def check_pid(self):
+        """
+        Resets the pool if it's been inherited from a parent process.
+        """
+        if self.pid != os.getpid():
+            with self.write_lock:
+                if self.pid != os.getpid():
+                    self.reset()
+
+    def connect(self, readonly: bool = False) -> Connection:
+        """
+        Opens a new configured connection in autocommit mode,
+        the transactions are opened explicitly.
+
+        :param readonly: whether the connection is only for reading
+        """
+        connection = connect(
+            self.database, timeout=self.timeout, isolation_level=None,
+            check_same_thread=False, factory=PooledConnection)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name}={value}')
+        connection.set_progress_handler(
+            interrupt_expired, self.progress_steps)
+        if readonly:
+            connection.execute('PRAGMA query_only=ON')
+        self.connections.add(connection)
+        return connection
+
+    @property
+    def connection(self) -> Connection:
+        """
+        Returns the write connection, opening it if necessary.
+        """
+        self.check_pid()
+        if self.write_connection is None:
+            with self.write_lock:
+                if self.write_connection is None:
+                    self.write_connection = self.connect()
+        return self.write_connection
+
+    def reader(self) -> Connection:
+        """
+        Returns the read-only connection of the current thread,
+        opening it if necessary.
+        """
+        self.check_pid()
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = self.connect(readonly=True)
+        return connection
+
+    def close_all(self):
+        """
+        Closes all the connections opened by the pool in this process.
+        """
+        for connection in list(self.connections):
+            connection.close()
+        self.reset()
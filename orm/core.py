@@ -2,9 +2,98 @@
 This module contains realizations for two basic classes required
 for an ORM - UnitOfWork (based on the patter of the same name) and
 DomainObject, which is an abstract parent class for any object
-that should be able to be committed to the database.
+that should be able to be committed to the database. It also contains
+the IdentityMap (based on the pattern of the same name) that ensures
+each row is represented by only one object in memory.
 """
-from threading import local
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Callable, Optional
+from weakref import WeakValueDictionary
+
+
+class IdentityMap:
+    """
+    A realization of the Identity Map pattern. Keeps the objects loaded
+    from the database by their model and ID, so that loading the same row
+    twice returns the same object instead of creating a new one. It can
+    have a fallback map (e.g. a process-wide one), which is consulted
+    when the object isn't found in this map and updated along with it.
+    """
+
+    def __init__(self, fallback=None):
+        """
+        Initializes the map.
+
+        :param fallback: another identity map to fall back to, or None
+        """
+        self.objects = {}
+        self.fallback = fallback
+
+    def __len__(self) -> int:
+        """
+        Returns the number of objects in the map.
+        """
+        return len(self.objects)
+
+    def get(self, model: type, obj_id: int):
+        """
+        Returns the object of the given model with the given ID if it's
+        already been loaded, otherwise returns None.
+
+        :param model: model class the mapper works with
+        :param obj_id: ID of the object
+        """
+        key = (model, obj_id)
+        obj = self.objects.get(key)
+        if obj is None and self.fallback is not None:
+            obj = self.fallback.get(model, obj_id)
+            if obj is not None:
+                self.objects[key] = obj
+        return obj
+
+    def add(self, model: type, obj: object):
+        """
+        Adds the object to the map.
+
+        :param model: model class the mapper works with
+        :param obj: object with an ID
+        """
+        self.objects[(model, obj.id)] = obj
+        if self.fallback is not None:
+            self.fallback.add(model, obj)
+
+    def remove(self, model: type, obj: object):
+        """
+        Removes the object from the map if it's there.
+
+        :param model: model class the mapper works with
+        :param obj: object with an ID
+        """
+        self.objects.pop((model, obj.id), None)
+        if self.fallback is not None:
+            self.fallback.remove(model, obj)
+
+    def clear(self):
+        """
+        Removes all the objects from the map (but not from the fallback).
+        """
+        self.objects.clear()
+
+
+class WeakIdentityMap(IdentityMap):
+    """
+    Identity map that holds only weak references to the objects, so an
+    object is dropped from the map as soon as nothing else uses it.
+    Suitable as a process-wide map shared by all the units of work.
+    """
+
+    def __init__(self):
+        """
+        Initializes the map with a weak-valued dictionary.
+        """
+        super().__init__()
+        self.objects = WeakValueDictionary()
 
 
 class UnitOfWork:
@@ -12,19 +101,32 @@ class UnitOfWork:
     A realization of the Unit Of Work pattern - common pattern
     used to work with databases. It keeps track of the changes
     to the objects and doesn't allow for multiple simultaneous
-    changes of the same object.
+    changes of the same object. The current unit of work is stored in
+    a context variable, so every thread (and every asyncio task or
+    greenlet) has its own.
     """
-    current = local()
+    current = ContextVar('unit_of_work', default=None)
+    shared_identity_map = None
 
     def __init__(self):
         """
         Initializes the session class. Creates the lists with
-        new, modified and deleted objects.
+        new, modified and deleted objects and the identity map of
+        the session. If the class-attribute shared_identity_map is set
+        (e.g. to a WeakIdentityMap), it's used as the fallback of the
+        session's map, so the objects are shared between the sessions.
+        The callbacks registered with register_after_commit are called
+        once the changes have been committed. The identities of the new
+        and the modified objects are also kept in a set, so checking
+        whether an object is registered doesn't scan the lists.
         """
         self.mapper_registry = None
         self.new_objects = []
         self.dirty_objects = []
+        self.registered_ids = set()
         self.removed_objects = []
+        self.after_commit = []
+        self.identity_map = IdentityMap(self.shared_identity_map)
 
     def set_mapper_registry(self, registry):
         """
@@ -36,105 +138,316 @@ class UnitOfWork:
 
     def register_new(self, obj: object):
         """
-        First it clears the list with new objects in case
-        there are any left from previous iterations, then
-        adds a new object to the session.
+        Adds a new object to the session.
 
         :param obj: any object
         """
-        self.new_objects.clear()
         self.new_objects.append(obj)
+        self.registered_ids.add(id(obj))
 
     def register_dirty(self, obj: object):
         """
-        First it clears the list with modified objects in case
-        there are any left from previous iterations, then
-        adds a modified object to the session.
+        Adds a modified object to the session, unless it's already
+        registered as a new or a modified one (a versioned row can only be
+        updated once per commit).
 
         :param obj: any object
         """
-        self.dirty_objects.append(obj)
+        if id(obj) not in self.registered_ids:
+            self.dirty_objects.append(obj)
+            self.registered_ids.add(id(obj))
 
     def register_removed(self, obj):
         """
-        First it clears the list with objects for deletion in case
-        there are any left from previous iterations, then
-        adds an object for deletion to the session.
+        Adds an object for deletion to the session.
 
         :param obj: any object
         """
         self.removed_objects.append(obj)
 
-    def commit(self):
+    def register_after_commit(self, callback: Callable):
+        """
+        Registers a callable to be called without arguments once the
+        changes of the session have been committed (e.g. to notify
+        someone of them). It's never called if the commit fails or
+        the session is rolled back.
+
+        :param callback: any callable
+        """
+        self.after_commit.append(callback)
+
+    def commit(self, wait: bool = False) -> Optional[Future]:
+        """
+        Commits the changes to the database in a single transaction by
+        consecutively triggering three different methods that first insert
+        new entries to the database, then update the existing entries,
+        and then delete the existing entries from the database. If any
+        of them fails, the whole transaction is rolled back and the
+        registered objects are kept in the session. Otherwise the session
+        is finished (see the finish method).
+
+        If the mapper registry has a write-behind writer, the changes are
+        handed over to it instead, and the session is cleared at once.
+        The writer commits them together with the changes of other
+        sessions, and the returned future is resolved when they're
+        durable. The callbacks registered with register_after_commit are
+        called after a successful commit: in the write-behind mode
+        without waiting, by the writer thread.
+
+        :param wait: whether to wait for the write-behind commit
+        :return: the future of the write-behind commit or None
         """
-        Commits the changes to the database by consecutively triggering
-        three different methods that first insert new entries to the
-        database, then update the existing entries, and then delete
-        the existing entries from the database.
+        if not (self.new_objects or self.dirty_objects
+                or self.removed_objects):
+            self.run_after_commit()
+            return None
+        writer = self.mapper_registry.writer
+        if writer is not None:
+            future = writer.submit(self.detach())
+            if wait:
+                future.result().run_after_commit()
+            else:
+                future.add_done_callback(self.run_after_commit_of)
+            return future
+        self.write_transaction()
+        self.finish()
+        self.run_after_commit()
+
+    def run_after_commit(self):
+        """
+        Calls the callbacks registered with register_after_commit and
+        forgets them.
+        """
+        callbacks, self.after_commit = self.after_commit, []
+        for callback in callbacks:
+            callback()
+
+    @staticmethod
+    def run_after_commit_of(future: Future):
+        """
+        Calls the callbacks of the unit of work committed by the writer,
+        if the commit has succeeded.
+
+        :param future: resolved future of a write-behind commit
+        """
+        if future.exception() is None:
+            future.result().run_after_commit()
+
+    def rollback(self):
+        """
+        Discards all the registered changes and forgets the loaded
+        objects, since they may have been modified.
+        """
+        self.new_objects.clear()
+        self.dirty_objects.clear()
+        self.removed_objects.clear()
+        self.registered_ids.clear()
+        self.after_commit.clear()
+        self.identity_map.clear()
+
+    def write_transaction(self):
+        """
+        Writes all the changes of the session in a new transaction. If
+        the transaction fails, the new objects get back the IDs they had
+        before it, so the IDs of the rolled back rows aren't taken for
+        allocated ones when the objects are written again.
+        """
+        ids = [obj.id for obj in self.new_objects]
+        try:
+            with self.mapper_registry.transaction() as cursor:
+                self.write(cursor)
+        except Exception:
+            for obj, id_ in zip(self.new_objects, ids):
+                obj.id = id_
+            raise
+
+    def write(self, cursor):
+        """
+        Writes all the changes of the session within the transaction
+        of the given cursor.
+
+        :param cursor: cursor of the current transaction
+        """
+        self.insert_new(cursor)
+        self.update_dirty(cursor)
+        self.delete_removed(cursor)
+
+    def finish(self):
+        """
+        Finishes the session after its changes have been committed.
+        The mappers are notified of the changes (after the commit, so that
+        a concurrent reader can't put the old row back into their caches),
+        the inserted objects are added to the identity map, the deleted
+        ones are removed from it and the session is cleared.
         """
-        self.insert_new()
-        self.update_dirty()
-        self.delete_removed()
+        for mapper, objects in self.group_by_mapper(self.new_objects):
+            mapper.after_insert(objects)
+            for obj in objects:
+                self.identity_map.add(mapper.model, obj)
+        for mapper, objects in self.group_by_mapper(self.dirty_objects):
+            mapper.after_update(objects)
+        for mapper, objects in self.group_by_mapper(self.removed_objects):
+            mapper.after_delete(objects)
+            for obj in objects:
+                self.identity_map.remove(mapper.model, obj)
+        self.new_objects.clear()
+        self.dirty_objects.clear()
+        self.removed_objects.clear()
+        self.registered_ids.clear()
+
+    def detach(self):
+        """
+        Moves all the registered changes into a new unit of work sharing
+        the registry and the identity map with this one, and clears this
+        session.
 
-    def insert_new(self):
+        :return: a new instance of the class with the changes
         """
-        Inserts new entries to the database. Uses a for-loop
-        on the list and inserts each object one by one using
-        the object's mapper.
+        unit_of_work = UnitOfWork()
+        unit_of_work.mapper_registry = self.mapper_registry
+        unit_of_work.identity_map = self.identity_map
+        unit_of_work.new_objects, self.new_objects = self.new_objects, []
+        unit_of_work.dirty_objects, self.dirty_objects = \
+            self.dirty_objects, []
+        unit_of_work.removed_objects, self.removed_objects = \
+            self.removed_objects, []
+        unit_of_work.registered_ids, self.registered_ids = \
+            self.registered_ids, set()
+        unit_of_work.after_commit, self.after_commit = self.after_commit, []
+        return unit_of_work
+
+    @staticmethod
+    def merge(units_of_work: list):
         """
-        for obj in self.new_objects:
-            self.mapper_registry.get_mapper(obj).insert(obj)
+        Creates a unit of work with all the changes of the given ones,
+        so they can be written with one batch per mapper.
 
-    def update_dirty(self):
+        :param units_of_work: list of instances of the class
+        :return: a new instance of the class
         """
-        Updates the entries in the database. Uses a for-loop
-        on the list and updates each object one by one using
-        the object's mapper.
+        unit_of_work = UnitOfWork()
+        unit_of_work.mapper_registry = units_of_work[0].mapper_registry
+        for item in units_of_work:
+            unit_of_work.new_objects.extend(item.new_objects)
+            unit_of_work.dirty_objects.extend(item.dirty_objects)
+            unit_of_work.removed_objects.extend(item.removed_objects)
+            unit_of_work.registered_ids.update(item.registered_ids)
+        return unit_of_work
+
+    def group_by_mapper(self, objects: list) -> list:
         """
-        for obj in self.dirty_objects:
-            self.mapper_registry.get_mapper(obj).update(obj)
+        Groups the objects by their mappers, keeping the order in which
+        the types of the objects first appear. The mapper is looked up
+        once per type instead of once per object.
 
-    def delete_removed(self):
+        :param objects: list of objects registered in the session
+        :return: list of tuples with a mapper and its objects
         """
-        Deletes the entries from the database. Uses a for-loop
-        on the list and deletes each object one by one using
-        the object's mapper.
+        groups = {}
+        for obj in objects:
+            groups.setdefault(type(obj), []).append(obj)
+        return [(self.mapper_registry.get_mapper(group[0]), group)
+                for group in groups.values()]
+
+    def insert_new(self, cursor):
+        """
+        Inserts new entries to the database. Objects are grouped by
+        their mappers and each group is inserted in one batch.
+
+        :param cursor: cursor of the current transaction
+        """
+        for mapper, objects in self.group_by_mapper(self.new_objects):
+            mapper.insert_many(objects, cursor)
+
+    def update_dirty(self, cursor):
         """
-        for obj in self.removed_objects:
-            self.mapper_registry.get_mapper(obj).delete(obj)
+        Updates the entries in the database. Objects are grouped by
+        their mappers and each group is updated in one batch.
+
+        :param cursor: cursor of the current transaction
+        """
+        for mapper, objects in self.group_by_mapper(self.dirty_objects):
+            mapper.update_many(objects, cursor)
+
+    def delete_removed(self, cursor):
+        """
+        Deletes the entries from the database. Objects are grouped by
+        their mappers and each group is deleted in one batch.
+
+        :param cursor: cursor of the current transaction
+        """
+        for mapper, objects in self.group_by_mapper(self.removed_objects):
+            mapper.delete_many(objects, cursor)
 
     @staticmethod
     def new_current():
         """
-        Static method that triggers the setting of the new
-        current thread.
+        Static method that sets a new unit of work as the current one.
         """
         __class__.set_current(UnitOfWork())
 
     @classmethod
     def set_current(cls, unit_of_work):
         """
-        Main method that sets the new local thread.
+        Main method that sets the current unit of work.
 
-        :param unit_of_work: an instance of the class
+        :param unit_of_work: an instance of the class or None
         """
-        cls.current.unit_of_work = unit_of_work
+        cls.current.set(unit_of_work)
 
     @classmethod
     def get_current(cls):
         """
-        Returns the current local thread.
+        Returns the current unit of work.
 
-        :return: current instance of the class
+        :return: current instance of the class or None if there's no
+            unit of work in this thread (or task)
         """
-        return cls.current.unit_of_work
+        return cls.current.get()
 
 
 class DomainObject:
     """
     Abstract parent class for an abstract object to be used
-    in the ORM.
+    in the ORM. The subclasses declare the name of their table and
+    its columns (the 'id' primary key first), the column names are also
+    the names of the attributes. The transient fields are the attributes
+    not stored in the table, with the factories of their initial values
+    for the objects loaded from the database (None for the attributes
+    that are initially None). If version_column is set to one of the
+    columns, the ORM uses it as the row version for the optimistic
+    concurrency control: an update or a deletion only succeeds if nobody
+    else has changed the row since the object was read. The subclasses
+    may declare __slots__ to save memory, with '__weakref__' among them
+    for the WeakIdentityMap. The new objects get their IDs from
+    the allocator of the mapper registry of the current unit of work (see
+    MapperRegistry.enable_id_allocation), otherwise from the id_allocator
+    of their class (see orm.ids) if it's set.
     """
+    __slots__ = ()
+    table_name = ''
+    columns = ('id',)
+    transient_fields = {}
+    version_column = None
+    id_allocator = None
+
+    @classmethod
+    def allocate_id(cls) -> Optional[int]:
+        """
+        Returns a new ID from the allocator of the current registry or of
+        the class, or None if there's no allocator (the ID is then set
+        when the object is inserted).
+        """
+        allocator = None
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None \
+                and unit_of_work.mapper_registry is not None:
+            allocator = unit_of_work.mapper_registry.get_id_allocator(cls)
+        if allocator is None:
+            allocator = cls.id_allocator
+        if allocator is None:
+            return None
+        return allocator.allocate()
 
     def mark_new(self):
         """
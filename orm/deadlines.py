@@ -0,0 +1,98 @@
+"""
+Module containing the deadlines for the framework's ORM. The deadline of
+the current request is stored in a context variable, so every thread (or
+task) has its own. The connections of the pool check it while SQLite
+executes a statement (through the progress handler) and interrupt
+the statement once the deadline has passed, so a slow query doesn't hold
+the worker beyond the time given to the request.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from typing import Iterator, Optional
+
+from orm.errors import DeadlineExceededError
+
+
+class Deadline:
+    """
+    The point in time by which the current request must be finished.
+    """
+    current = ContextVar('deadline', default=None)
+
+    def __init__(self, timeout: float):
+        """
+        Initializes the deadline.
+
+        :param timeout: time given from now on (in seconds)
+        """
+        self.timeout = timeout
+        self.expires_at = monotonic() + timeout
+
+    def remaining(self) -> float:
+        """
+        Returns the time left until the deadline (in seconds).
+        """
+        return max(0.0, self.expires_at - monotonic())
+
+    def expired(self) -> bool:
+        """
+        Checks whether the deadline has passed.
+        """
+        return monotonic() >= self.expires_at
+
+    def check(self):
+        """
+        Raises the DeadlineExceededError if the deadline has passed.
+        """
+        if self.expired():
+            raise DeadlineExceededError(self.timeout)
+
+    @classmethod
+    def get_current(cls) -> Optional['Deadline']:
+        """
+        Returns the deadline of the current context, or None.
+        """
+        return cls.current.get()
+
+    @classmethod
+    def check_current(cls):
+        """
+        Raises the DeadlineExceededError if the deadline of the current
+        context has passed.
+        """
+        deadline = cls.current.get()
+        if deadline is not None:
+            deadline.check()
+
+    @classmethod
+    @contextmanager
+    def applied(cls, timeout: Optional[float]) -> Iterator[
+            Optional['Deadline']]:
+        """
+        Context manager setting a new deadline for the current context
+        for the duration of the block.
+
+        :param timeout: time given to the block (in seconds), or None for
+            no deadline
+        :return: the deadline, or None
+        """
+        if timeout is None:
+            yield None
+            return
+        deadline = cls(timeout)
+        token = cls.current.set(deadline)
+        try:
+            yield deadline
+        finally:
+            cls.current.reset(token)
+
+
+def interrupt_expired() -> bool:
+    """
+    Progress handler of the SQLite connections: returns True (which
+    interrupts the running statement) if the deadline of the current
+    context has passed.
+    """
+    deadline = Deadline.current.get()
+    return deadline is not None and monotonic() >= deadline.expires_at
@@ -58,3 +58,62 @@ class DatabaseDeleteError(Exception):
         :param message:
         """
         super().__init__(f'Error deleting from database: {message}')
+
+
+class MapperNotFoundError(Exception):
+    """
+    Exception raised when there's no mapper registered for an object.
+    """
+
+    def __init__(self, message: str):
+        """
+        Initializes the error with the custom error message.
+
+        :param message:
+        """
+        super().__init__(f'No mapper registered for: {message}')
+
+
+class WriteQueueFullError(Exception):
+    """
+    Exception raised when the write-behind queue stays full for too long.
+    """
+
+    def __init__(self, message: int):
+        """
+        Initializes the error with the custom error message.
+
+        :param message:
+        """
+        super().__init__(f'Write-behind queue is full: {message} commits '
+                         f'waiting to be written')
+
+
+class StaleObjectError(Exception):
+    """
+    Exception raised when an object has been changed or deleted in the DB
+    by someone else since it was read (its row version doesn't match).
+    """
+
+    def __init__(self, message: str):
+        """
+        Initializes the error with the custom error message.
+
+        :param message:
+        """
+        super().__init__(f'Object is out of date: {message}')
+
+
+class DeadlineExceededError(Exception):
+    """
+    Exception raised when the deadline of the current request has passed.
+    """
+
+    def __init__(self, timeout: float):
+        """
+        Initializes the error with the custom error message.
+
+        :param timeout: time given to the request (in seconds)
+        """
+        super().__init__(f'Deadline exceeded: {timeout} sec.')
+        self.timeout = timeout
@@ -0,0 +1,122 @@
+"""
+Module containing the ID allocators for the framework's ORM. The models
+get their IDs when they're created (see DomainObject.allocate_id), so the
+creation doesn't wait for the database and the objects can be referenced
+before they're saved. The CounterIdAllocator hands out the IDs of one
+process; the HiLoIdAllocator reserves blocks of IDs in the database, so
+they stay unique across all the processes using it.
+"""
+import os
+from itertools import count
+from sqlite3 import Error
+from threading import Lock
+
+from orm.errors import DatabaseCommitError
+
+
+class CounterIdAllocator:
+    """
+    Allocator handing out consecutive IDs from an in-process counter.
+    next() on itertools.count is a single call into C, so concurrent
+    threads never get the same ID. The IDs are only unique within one
+    process and aren't stored in the database: the mapper replaces them
+    with the row IDs when it inserts the objects.
+    """
+    persistent = False
+
+    def __init__(self, start: int = 1):
+        """
+        Initializes the allocator.
+
+        :param start: first ID to hand out
+        """
+        self.counter = count(start)
+
+    def allocate(self) -> int:
+        """
+        Returns a new ID.
+        """
+        return next(self.counter)
+
+
+class HiLoIdAllocator:
+    """
+    Allocator handing out the IDs of a table from blocks reserved in the
+    database (the hi/lo algorithm): only the first ID of every block
+    costs a short write transaction, the rest are handed out from memory.
+    The blocks are reserved by advancing the AUTOINCREMENT sequence of
+    the table in sqlite_sequence, so no two processes ever get the same
+    block, and the rows inserted without an ID get theirs above all the
+    reserved blocks. The IDs left in a block when the process exits are
+    skipped. After a fork the child process reserves its own blocks.
+    The allocator must not be called by a thread holding a write
+    transaction on the same database, since the reservation waits for it.
+    """
+    persistent = True
+
+    def __init__(self, pool, table_name: str, block_size: int = 100):
+        """
+        Initializes the allocator. The block is reserved on the first call.
+
+        :param pool: connection pool of the database (a ConnectionPool)
+        :param table_name: table with an AUTOINCREMENT primary key
+        :param block_size: number of IDs reserved at once
+        """
+        if block_size < 1:
+            raise ValueError('The block size must be positive.')
+        self.pool = pool
+        self.table_name = table_name
+        self.block_size = block_size
+        self.lock = Lock()
+        self.connection = None
+        self.pid = None
+        self.next_id = 0
+        self.limit = 0
+
+    def reserve(self) -> int:
+        """
+        Reserves the next block of IDs in its own transaction.
+
+        :return: the last ID of the block
+        """
+        if self.connection is None or self.pid != os.getpid():
+            self.connection = self.pool.connect()
+            self.pid = os.getpid()
+        connection = self.connection
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute(
+                    'SELECT seq FROM sqlite_sequence WHERE name = ?',
+                    (self.table_name,)).fetchone()
+                if row is None:
+                    row = connection.execute(
+                        f'SELECT COALESCE(MAX(id), 0) '
+                        f'FROM {self.table_name}').fetchone()
+                    connection.execute(
+                        'INSERT INTO sqlite_sequence (name, seq) '
+                        'VALUES (?, ?)', (self.table_name, row[0]))
+                last = row[0] + self.block_size
+                connection.execute(
+                    'UPDATE sqlite_sequence SET seq = ? WHERE name = ?',
+                    (last, self.table_name))
+            except BaseException:
+                connection.rollback()
+                raise
+            connection.commit()
+        except Error as e:
+            raise DatabaseCommitError(e.args)
+        return last
+
+    def allocate(self) -> int:
+        """
+        Returns a new ID, reserving a new block if the current one is
+        used up or has been inherited from the parent process.
+        """
+        with self.lock:
+            if self.next_id >= self.limit or self.pid != os.getpid():
+                self.limit = self.reserve() + 1
+                self.next_id = self.limit - self.block_size
+            allocated = self.next_id
+            self.next_id += 1
+            return allocated
@@ -4,53 +4,383 @@ registry parent class for existing mappers. Actual mappers to be used
 in the project have to be subclassed to the Mapper class from here
 as well as the MapperRegistry implementations.
 """
-from sqlite3 import Connection
+from sqlite3 import Connection, Cursor, Error
+from threading import Lock, local
+from time import monotonic
+from typing import Callable, ContextManager, Iterable, Optional, Union
+from weakref import ref
 
+from orm.cache import LRUCache
+from orm.connections import ConnectionPool, SingleConnectionPool
+from orm.core import IdentityMap, UnitOfWork
+from orm.ids import HiLoIdAllocator
+from orm.query import QuerySet
+from orm.search import PrefixIndex, SearchQuery
+from orm.writer import GroupCommitWriter
 from orm.errors import RecordNotFoundError, DatabaseCommitError, \
-    DatabaseUpdateError, DatabaseDeleteError
+    DatabaseUpdateError, DatabaseDeleteError, MapperNotFoundError, \
+    StaleObjectError
+
+
+def compile_hydrator(model: type, columns: tuple,
+                     transient_fields: dict) -> Callable:
+    """
+    Generates the function that creates an object of the model from
+    a table row. The generated function doesn't call the model's
+    __init__(), it assigns the columns to the attributes directly (which
+    works for both __dict__- and __slots__-based classes) and initializes
+    the transient attributes with their factories. The columns a slotted
+    class can't store (the constants declared as class attributes, e.g.
+    the type of the model) are skipped.
+
+    :param model: model class
+    :param columns: names of the columns in the order of the row
+    :param transient_fields: names of other attributes with the factories
+        of their initial values (or None for the attributes set to None)
+    :return: function taking in a row and returning an object
+    """
+    namespace = {'new': object.__new__, 'model': model}
+    has_dict = any('__dict__' in vars(cls) for cls in model.__mro__)
+    targets = [
+        f'obj.{column}' if has_dict or hasattr(
+            type(getattr(model, column, None)), '__set__') else '_'
+        for column in columns]
+    lines = ['def hydrate(row):', '    obj = new(model)',
+             f'    {", ".join(targets)}, = row']
+    for number, (name, factory) in enumerate(transient_fields.items()):
+        if factory is None:
+            lines.append(f'    obj.{name} = None')
+            continue
+        namespace[f'factory_{number}'] = factory
+        lines.append(f'    obj.{name} = factory_{number}()')
+    lines.append('    return obj')
+    exec('\n'.join(lines), namespace)
+    return namespace['hydrate']
+
+
+def compile_getter(columns: tuple) -> Callable:
+    """
+    Generates the function that returns the values of the given
+    attributes of an object as a tuple (the parameters of a statement).
+
+    :param columns: names of the attributes
+    :return: function taking in an object and returning a tuple
+    """
+    namespace = {}
+    values = ''.join(f'obj.{column}, ' for column in columns)
+    exec(f'def get_values(obj):\n    return ({values})', namespace)
+    return namespace['get_values']
 
 
 class Mapper:
     """
-    Abstract parent class for the framework's mappers.
+    Abstract parent class for the framework's mappers. The model
+    class-attribute MUST be set in all subclasses to the class of
+    the objects the mapper works with. The model declares its table_name
+    and columns (the first of them must be the 'id' primary key), from
+    which the mapper generates its statements and the row hydrator once,
+    when it's created. The rows read by ID and the results of the cached
+    queries are kept in the LRU-caches of the mapper (unless cache_enabled
+    is set to False in the subclass) and invalidated on every commit
+    changing the table. The changes committed by other connections (e.g.
+    by other worker processes) clear the caches before they're read (see
+    check_cache). If the model has a version_column, the updates
+    and deletions are conditioned on the version the object was read
+    with, and a StaleObjectError is raised if the row has been changed
+    by another writer in the meantime. If search_table is set to the name
+    of an FTS5 table indexing the mapper's table, the mapper supports
+    the full-text search. If autocomplete_column is set, the values of
+    this column can be autocompleted from an in-memory PrefixIndex, which
+    is loaded on the first use, updated on every commit of this process
+    and reloaded after autocomplete_ttl seconds (to pick up the changes
+    made by other processes).
     """
+    model = None
+    id_allocator = None
+    search_table = None
+    autocomplete_column = None
+    autocomplete_ttl = 60.0
+    in_batch_size = 500
+    cache_enabled = True
+    cache_size = 1024
+    query_cache_size = 64
 
-    def __init__(self, conn: Connection):
+    def __init__(self, conn: Union[Connection, SingleConnectionPool]):
         """
-        Initializes the mapper. Takes in the connection to db,
-        creates the cursor for later use and sets up the table name.
-        By default it's a blank string, but this name MUST be modified
-        in all subclasses.
+        Initializes the mapper. Takes in the connection to db (or the
+        pool of connections), sets up the table name and compiles the
+        statements for the model's columns. The reads are executed on the
+        read connection of the current thread, the writes - on the pool's
+        write connection.
 
-        :param conn: database connection
+        :param conn: database connection or connection pool
         """
         self.connection = conn
-        self.cursor = conn.cursor()
-        self.table_name = ''
+        self.pool = get_pool(conn)
+        self.table_name = self.model.table_name
+        self.columns = self.model.columns
+        for column in self.columns:
+            if not column.isidentifier():
+                raise ValueError(f'Invalid column name: {column}')
+        data_columns = self.columns[1:]
+        self.version_column = self.model.version_column
+        if self.version_column is not None \
+                and self.version_column not in data_columns:
+            raise ValueError(f'Invalid version column: {self.version_column}')
+        self.select_columns = ', '.join(self.columns)
+        self.find_statement = f'SELECT {self.select_columns} ' \
+                              f'FROM {self.table_name} WHERE id=?'
+        self.insert_statement = \
+            f'INSERT INTO {self.table_name} ({", ".join(data_columns)}) ' \
+            f'VALUES ({", ".join("?" * len(data_columns))})'
+        self.get_insert_values = compile_getter(data_columns)
+        self.insert_with_id_statement = \
+            f'INSERT INTO {self.table_name} ({self.select_columns}) ' \
+            f'VALUES ({", ".join("?" * len(self.columns))})'
+        self.get_insert_with_id_values = compile_getter(self.columns)
+        if self.version_column is None:
+            self.update_statement = \
+                f'UPDATE {self.table_name} ' \
+                f'SET {", ".join(f"{column}=?" for column in data_columns)} ' \
+                f'WHERE id=?'
+            self.delete_statement = \
+                f'DELETE FROM {self.table_name} WHERE id=?'
+            self.get_update_values = compile_getter(data_columns + ('id',))
+            self.get_delete_values = compile_getter(('id',))
+        else:
+            version = self.version_column
+            data_columns = tuple(column for column in data_columns
+                                 if column != version)
+            self.update_statement = \
+                f'UPDATE {self.table_name} ' \
+                f'SET {"".join(f"{column}=?, " for column in data_columns)}' \
+                f'{version}={version} + 1 WHERE id=? AND {version}=?'
+            self.delete_statement = \
+                f'DELETE FROM {self.table_name} WHERE id=? AND {version}=?'
+            self.get_update_values = compile_getter(
+                data_columns + ('id', version))
+            self.get_delete_values = compile_getter(('id', version))
+        self.hydrate = compile_hydrator(
+            self.model, self.columns, self.model.transient_fields)
+        self.cache = LRUCache(self.cache_size) \
+            if self.cache_enabled else None
+        self.query_cache = LRUCache(self.query_cache_size) \
+            if self.cache_enabled else None
+        self.cache_checks = local()
+        self.prefix_index = None
+        self.prefix_index_loaded = 0.0
+        self.prefix_index_lock = Lock()
 
-    def return_all(self) -> list:
+    @property
+    def identity_map(self) -> Optional[IdentityMap]:
+        """
+        Returns the identity map of the current unit of work, or the
+        process-wide identity map if there's no unit of work in this
+        thread (which may be None as well).
         """
-        Returns all the entries in the given table as a list.
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            return unit_of_work.identity_map
+        return UnitOfWork.shared_identity_map
+
+    def do_load(self, row: tuple):
+        """
+        Creates a new object from the row of the table with the compiled
+        hydrator. Can be overridden in the subclasses.
+
+        :param row: row of the table
         """
-        statement = f'SELECT * FROM {self.table_name}'
-        self.cursor.execute(statement)
-        return self.cursor.fetchall()
+        return self.hydrate(row)
 
-    def find_by_id(self, entry_id: int) -> tuple:
+    def load(self, row: tuple, identity_map: IdentityMap = None):
         """
-        Searches the database for an entry with a given ID, returns
-        tuple with data. If nothing found, raises an exception.
+        Returns the object for the given row. If the object with the ID
+        from the row has already been loaded, returns that object,
+        otherwise creates a new one and adds it to the identity map.
+
+        :param row: row of the table, the ID must be its first column
+        :param identity_map: identity map to use, by default the current
+        """
+        if identity_map is None:
+            identity_map = self.identity_map
+        if identity_map is None:
+            return self.do_load(row)
+        obj = identity_map.get(self.model, row[0])
+        if obj is None:
+            obj = self.do_load(row)
+            identity_map.add(self.model, obj)
+        return obj
+
+    def return_all(self) -> QuerySet:
+        """
+        Returns all the entries in the given table as a lazy QuerySet.
+        The QuerySet can be filtered, ordered and sliced before any rows
+        are read from the database.
+        """
+        return QuerySet(self)
+
+    def search(self, text: str) -> SearchQuery:
+        """
+        Returns the objects matching the full-text query as a lazy
+        SearchQuery, which can be sliced into pages.
+
+        :param text: search query, every word is matched as a prefix
+        """
+        if self.search_table is None:
+            raise ValueError(f'{self.__class__.__name__} has no search table')
+        return SearchQuery(self, text)
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> list:
+        """
+        Returns the values of the autocomplete_column starting with
+        the prefix (case-insensitive), in alphabetical order.
+
+        :param prefix: beginning of a value
+        :param limit: maximum number of values
+        """
+        return self.get_prefix_index().complete(prefix, limit)
+
+    def get_prefix_index(self) -> PrefixIndex:
+        """
+        Returns the prefix index of the autocomplete_column, loading it
+        from the database if it hasn't been loaded or has expired.
+        """
+        column = self.autocomplete_column
+        if column is None:
+            raise ValueError(
+                f'{self.__class__.__name__} has no autocomplete column')
+        with self.prefix_index_lock:
+            if self.prefix_index is None or monotonic() - \
+                    self.prefix_index_loaded > self.autocomplete_ttl:
+                self.prefix_index_loaded = monotonic()
+                self.prefix_index = PrefixIndex(
+                    self.pool.reader().execute(
+                        f'SELECT id, {column} FROM {self.table_name}'))
+            return self.prefix_index
+
+    def check_cache(self):
+        """
+        Clears the caches if the database has been changed by another
+        connection since the last check made by this thread. The data
+        version of the thread's read connection changes with every commit
+        made through the other connections, including the ones of other
+        processes, so the cached rows never outlive a change made by
+        another worker. The check costs one PRAGMA, and it's made once per
+        unit of work (i.e. per request). The caches are cleared on the
+        first check of every connection as well, since the changes made
+        before it are unknown.
+        """
+        checks = self.cache_checks
+        unit_of_work = UnitOfWork.get_current()
+        if unit_of_work is not None:
+            checked = getattr(checks, 'unit_of_work', None)
+            if checked is not None and checked() is unit_of_work:
+                return
+            checks.unit_of_work = ref(unit_of_work)
+        connection = self.pool.reader()
+        state = connection, connection.execute(
+            'PRAGMA data_version').fetchone()[0]
+        if getattr(checks, 'state', None) != state:
+            checks.state = state
+            self.cache.clear()
+            self.query_cache.clear()
+
+    def find_by_id(self, entry_id: int):
+        """
+        Searches for an entry with a given ID and returns the object.
+        The object that has already been loaded is returned without
+        querying the database, the row found in the cache - without
+        querying it as well. If nothing found, raises an exception.
 
         :param entry_id: the ID to be searched for
         """
-        statement = f'SELECT id, name FROM {self.table_name} WHERE id=?'
-        self.cursor.execute(statement, (entry_id,))
-        result = self.cursor.fetchone()
+        identity_map = self.identity_map
+        if identity_map is not None:
+            obj = identity_map.get(self.model, entry_id)
+            if obj is not None:
+                return obj
+        if self.cache is not None:
+            self.check_cache()
+            result = self.cache.get(entry_id)
+            if result is not None:
+                return self.load(result, identity_map)
+            version = self.cache.version
+        result = self.pool.reader().execute(
+            self.find_statement, (entry_id,)).fetchone()
         if result:
-            return result
+            if self.cache is not None:
+                self.cache.set(entry_id, result, version)
+            return self.load(result, identity_map)
         else:
             raise RecordNotFoundError(f'Record with id={entry_id} not found!')
 
+    def find_by_ids(self, ids: Iterable[int]) -> dict:
+        """
+        Returns the objects with the given IDs. The objects that have
+        already been loaded are taken from the identity map, the rows
+        found in the cache are taken from it, the rest are read from the
+        database with 'WHERE id IN (...)' in batches, instead of querying
+        the database once per object. IDs that aren't found are skipped.
+
+        :param ids: IDs to be searched for (None values are ignored)
+        :return: dictionary with the objects by their IDs
+        """
+        identity_map = self.identity_map
+        result = {}
+        missing = []
+        if self.cache is not None:
+            self.check_cache()
+        for entry_id in set(ids):
+            if entry_id is None:
+                continue
+            obj = identity_map.get(self.model, entry_id) \
+                if identity_map is not None else None
+            if obj is None and self.cache is not None:
+                row = self.cache.get(entry_id)
+                if row is not None:
+                    obj = self.load(row, identity_map)
+            if obj is None:
+                missing.append(entry_id)
+            else:
+                result[entry_id] = obj
+        version = self.cache.version if self.cache is not None else None
+        for start in range(0, len(missing), self.in_batch_size):
+            for row in self.return_all().filter(id__in=missing[
+                    start:start + self.in_batch_size]).rows():
+                if self.cache is not None:
+                    self.cache.set(row[0], row, version)
+                result[row[0]] = self.load(row, identity_map)
+        return result
+
+    def filter_in(self, column: str, values: Iterable) -> list:
+        """
+        Returns the objects having one of the given values in the column.
+        The values are split into batches of in_batch_size to stay below
+        the SQLite limit on the number of parameters.
+
+        :param column: name of the column
+        :param values: values to be searched for
+        :return: list of objects
+        """
+        values = list(values)
+        result = []
+        for start in range(0, len(values), self.in_batch_size):
+            result.extend(self.return_all().filter(**{
+                f'{column}__in': values[start:start + self.in_batch_size]}))
+        return result
+
+    def invalidate(self, objects: list):
+        """
+        Removes the rows of the given objects from the cache and clears
+        the query cache, since any change to the table can affect
+        the results of the queries.
+
+        :param objects: objects changed in the database
+        """
+        if self.cache is not None:
+            self.cache.invalidate(*(obj.id for obj in objects))
+            self.query_cache.clear()
+
     def insert(self, obj):
         """
         Tries to insert a new entry into the database. If this doesn't
@@ -58,12 +388,9 @@ class Mapper:
 
         :param obj: a new object to be inserted
         """
-        statement = f'INSERT INTO {self.table_name} (name) VALUES (?)'
-        self.cursor.execute(statement, (obj.name,))
-        try:
-            self.connection.commit()
-        except Exception as e:
-            raise DatabaseCommitError(e.args)
+        with self.pool.transaction() as cursor:
+            self.insert_many([obj], cursor)
+        self.after_insert([obj])
 
     def update(self, obj):
         """
@@ -72,12 +399,9 @@ class Mapper:
 
         :param obj: object to be updated
         """
-        statement = f'UPDATE {self.table_name} SET name=? WHERE id=?'
-        self.cursor.execute(statement, (obj.name, obj.id))
-        try:
-            self.connection.commit()
-        except Exception as e:
-            raise DatabaseUpdateError(e.args)
+        with self.pool.transaction() as cursor:
+            self.update_many([obj], cursor)
+        self.after_update([obj])
 
     def delete(self, obj):
         """
@@ -86,45 +410,282 @@ class Mapper:
 
         :param obj: object to be deleted
         """
-        statement = f'DELETE FROM {self.table_name} WHERE id=?'
-        self.cursor.execute(statement, (obj.id,))
+        with self.pool.transaction() as cursor:
+            self.delete_many([obj], cursor)
+        self.after_delete([obj])
+
+    def insert_many(self, objects: list, cursor: Cursor):
+        """
+        Inserts new entries into the database without committing them,
+        the transaction is handled by the caller. If the model's IDs are
+        allocated in the database (the id_allocator of the mapper is set
+        by MapperRegistry.enable_id_allocation), the objects having them
+        are inserted with one executemany call.
+        Otherwise the statement is executed row by row (sqlite3 reuses
+        the prepared statement) to set the IDs of the new objects from
+        the rows. The versioned objects start with the version 1.
+
+        :param objects: new objects to be inserted
+        :param cursor: cursor of the current transaction
+        """
+        version = self.version_column
+        if version is not None:
+            for obj in objects:
+                setattr(obj, version, 1)
+        allocator = self.id_allocator
         try:
-            self.connection.commit()
-        except Exception as e:
+            if allocator is not None and allocator.persistent:
+                with_ids = [obj for obj in objects if obj.id is not None]
+                cursor.executemany(self.insert_with_id_statement,
+                                   map(self.get_insert_with_id_values,
+                                       with_ids))
+                if len(with_ids) == len(objects):
+                    return
+                objects = [obj for obj in objects if obj.id is None]
+            statement = self.insert_statement
+            get_values = self.get_insert_values
+            for obj in objects:
+                cursor.execute(statement, get_values(obj))
+                obj.id = cursor.lastrowid
+        except Error as e:
+            raise DatabaseCommitError(e.args)
+
+    def update_many(self, objects: list, cursor: Cursor):
+        """
+        Updates the entries in the database without committing them,
+        the transaction is handled by the caller. Unversioned objects are
+        updated with one executemany call, the versioned ones row by row
+        to check that every row has been matched by its expected version.
+        The versions of the objects themselves are advanced only after
+        the commit (see after_update).
+
+        :param objects: objects to be updated
+        :param cursor: cursor of the current transaction
+        """
+        try:
+            if self.version_column is None:
+                cursor.executemany(self.update_statement,
+                                   map(self.get_update_values, objects))
+                return
+            for obj in objects:
+                cursor.execute(self.update_statement,
+                               self.get_update_values(obj))
+                if cursor.rowcount != 1:
+                    self.raise_stale(obj)
+        except Error as e:
+            raise DatabaseUpdateError(e.args)
+
+    def delete_many(self, objects: list, cursor: Cursor):
+        """
+        Deletes the entries from the database without committing them,
+        the transaction is handled by the caller. Unversioned objects are
+        deleted with one executemany call, the versioned ones row by row
+        to check that every row has been matched by its expected version.
+
+        :param objects: objects to be deleted
+        :param cursor: cursor of the current transaction
+        """
+        try:
+            if self.version_column is None:
+                cursor.executemany(self.delete_statement,
+                                   map(self.get_delete_values, objects))
+                return
+            for obj in objects:
+                cursor.execute(self.delete_statement,
+                               self.get_delete_values(obj))
+                if cursor.rowcount != 1:
+                    self.raise_stale(obj)
+        except Error as e:
             raise DatabaseDeleteError(e.args)
 
+    def after_insert(self, objects: list):
+        """
+        Called once the inserted objects have been committed. Invalidates
+        the caches and adds the objects to the prefix index.
+
+        :param objects: objects inserted into the database
+        """
+        self.invalidate(objects)
+        self.update_prefix_index(objects)
+
+    def after_update(self, objects: list):
+        """
+        Called once the updated objects have been committed. Increases
+        their versions by 1 (the same as the update statement did in the
+        database), invalidates the caches and updates the prefix index.
+
+        :param objects: objects updated in the database
+        """
+        version = self.version_column
+        if version is not None:
+            for obj in objects:
+                setattr(obj, version, getattr(obj, version) + 1)
+        self.invalidate(objects)
+        self.update_prefix_index(objects)
+
+    def after_delete(self, objects: list):
+        """
+        Called once the deleted objects have been committed. Invalidates
+        the caches and removes the objects from the prefix index.
+
+        :param objects: objects deleted from the database
+        """
+        self.invalidate(objects)
+        self.update_prefix_index(objects, removed=True)
+
+    def update_prefix_index(self, objects: list, removed: bool = False):
+        """
+        Updates the prefix index with the committed objects, unless it
+        hasn't been loaded yet.
+
+        :param objects: objects changed in the database
+        :param removed: whether the objects have been deleted
+        """
+        if self.prefix_index is None:
+            return
+        with self.prefix_index_lock:
+            for obj in objects:
+                if removed:
+                    self.prefix_index.remove(obj.id)
+                else:
+                    self.prefix_index.add(
+                        obj.id, getattr(obj, self.autocomplete_column))
+
+    def raise_stale(self, obj):
+        """
+        Drops the outdated object from the identity map and its row from
+        the cache (so that the retry reads the current one) and raises
+        a StaleObjectError.
+
+        :param obj: object whose row version doesn't match
+        """
+        identity_map = self.identity_map
+        if identity_map is not None:
+            identity_map.remove(self.model, obj)
+        self.invalidate([obj])
+        raise StaleObjectError(
+            f'{self.table_name} id={obj.id} '
+            f'{self.version_column}={getattr(obj, self.version_column)}')
+
 
 class MapperRegistry:
     """
     Mappers registry parent class. It stores all available data mappers
-    in the class-attribute dictionary. It can return the mapper on
-    demand.
+    in the class-attribute dictionary by their names. The models are
+    registered through the model class-attribute of the mappers. It can
+    return the mapper on demand: the mapper of an object is resolved
+    through the MRO of the object's class once per class, and every mapper
+    is instantiated only once per registry (i.e. per connection).
+    Optionally the registry can have a write-behind writer, which the
+    units of work then use to commit (see enable_write_behind), and
+    allocate the IDs of the models in the database (see
+    enable_id_allocation).
     """
     mappers = dict()
-    models = set()
 
-    def __init__(self, connection: Connection):
+    def __init__(self, connection: Union[Connection, SingleConnectionPool]):
         """
         Initializes the registry with the database connection.
 
         :param connection: connection to database (sqlite3 by default)
+            or a connection pool
         """
         self.connection = connection
+        self.pool = get_pool(connection)
+        self.model_mappers = {mapper.model: mapper
+                              for mapper in self.mappers.values()
+                              if mapper.model is not None}
+        self.instances = {}
+        self.type_cache = {}
+        self.writer = None
+        self.id_allocators = {}
+
+    def enable_write_behind(self, **kwargs) -> GroupCommitWriter:
+        """
+        Switches the units of work using this registry to the write-behind
+        mode: their commits are handed over to a writer thread merging
+        them into group transactions.
+
+        :param kwargs: parameters of the GroupCommitWriter
+        :return: the writer
+        """
+        self.writer = GroupCommitWriter(self, **kwargs)
+        return self.writer
+
+    def enable_id_allocation(self, block_size: int = 100):
+        """
+        Switches the models of the registered mappers to the IDs reserved
+        in blocks in the database, unique across all the processes using
+        it (see orm.ids.HiLoIdAllocator). The allocators belong to this
+        registry: the objects created within its units of work get their
+        IDs from them and are inserted with them, the models themselves
+        and the other registries aren't affected (so the new objects must
+        be created within the units of work of this registry, as the views
+        do). The allocators open their own connections, so
+        a ConnectionPool is required.
+
+        :param block_size: number of IDs reserved at once
+        """
+        if not isinstance(self.pool, ConnectionPool):
+            raise ValueError('The IDs can only be allocated in the database '
+                             'of a ConnectionPool.')
+        for model in self.model_mappers:
+            self.id_allocators[model] = HiLoIdAllocator(
+                self.pool, model.table_name, block_size)
+        for instance in self.instances.values():
+            instance.id_allocator = self.id_allocators.get(instance.model)
+
+    def get_id_allocator(self, cls: type):
+        """
+        Returns the ID allocator of the registry for the given model
+        class (or its closest registered parent), or None.
+
+        :param cls: model class
+        """
+        if not self.id_allocators:
+            return None
+        for model in cls.__mro__:
+            allocator = self.id_allocators.get(model)
+            if allocator is not None:
+                return allocator
+        return None
+
+    def get_instance(self, mapper: type) -> Mapper:
+        """
+        Returns the instance of the given mapper class working with
+        the registry's connection, creating it on the first call.
 
-    def get_mapper(self, obj: Mapper):
+        :param mapper: mapper class
         """
-        Returns a relevant mapper. The method checks the instance of
-        the object passed into it and returns the relevant mapper.
+        instance = self.instances.get(mapper)
+        if instance is None:
+            instance = mapper(self.pool)
+            instance.id_allocator = self.id_allocators.get(mapper.model)
+            instance = self.instances.setdefault(mapper, instance)
+        return instance
+
+    def get_mapper(self, obj: object) -> Mapper:
+        """
+        Returns a relevant mapper. The method looks up the mapper of
+        the closest class in the MRO of the object's class that has
+        a mapper registered. The result is cached by the object's class.
 
         :param obj: instance of one of models
         :return: relevant data mapper object
         """
-        for key, value in self.mappers.items():
-            for model in self.models:
-                if isinstance(obj, model):
-                    return value(self.connection)
+        cls = type(obj)
+        mapper = self.type_cache.get(cls)
+        if mapper is None:
+            for model in cls.__mro__:
+                if model in self.model_mappers:
+                    mapper = self.get_instance(self.model_mappers[model])
+                    break
+            else:
+                raise MapperNotFoundError(cls.__name__)
+            self.type_cache[cls] = mapper
+        return mapper
 
-    def get_current_mapper(self, name: str):
+    def get_current_mapper(self, name: str) -> Mapper:
         """
         Returns a relevant mapper by name. Checks if the string
         passed into it corresponds to a name in the class-attribute
@@ -133,4 +694,27 @@ class MapperRegistry:
         :param name: the data mapper name
         :return: relevant data mapper object
         """
-        return self.mappers[name](self.connection)
+        return self.get_instance(self.mappers[name])
+
+    def transaction(self) -> ContextManager[Cursor]:
+        """
+        Context manager wrapping a block of statements into a single
+        transaction. Commits it if the block succeeds, otherwise rolls
+        everything back and re-raises the exception.
+
+        :return: cursor to execute the statements with
+        """
+        return self.pool.transaction()
+
+
+def get_pool(connection: Union[Connection, SingleConnectionPool]) \
+        -> SingleConnectionPool:
+    """
+    Returns the connection pool for the given connection. A plain sqlite3
+    connection is wrapped into a pool-like object.
+
+    :param connection: database connection or connection pool
+    """
+    if isinstance(connection, SingleConnectionPool):
+        return connection
+    return SingleConnectionPool(connection)
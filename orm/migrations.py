@@ -0,0 +1,164 @@
+"""
+Module containing the schema migrations for the framework's ORM.
+A migration is an SQL script in the migrations directory named
+<version>_<name>.sql, e.g. 0002_indexes.sql. The applied versions are
+recorded in the schema_migrations table, so running the migrations again
+only applies the new ones and never touches the existing data. It also
+contains the check of the query plans, which finds the queries that
+read the whole table instead of using an index.
+"""
+import os
+import re
+from datetime import datetime, timezone
+from sqlite3 import Connection, Error
+from typing import Iterable, List, Tuple
+
+from orm.errors import DatabaseCommitError
+
+
+class Migration:
+    """
+    Class representing one migration script.
+    """
+    file_name_pattern = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+    def __init__(self, version: int, name: str, path: str):
+        """
+        Initializes the migration.
+
+        :param version: number of the migration
+        :param name: name of the migration
+        :param path: path to the SQL script
+        """
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f'{self.version:04d}_{self.name}'
+
+    def read(self) -> str:
+        """
+        Returns the SQL script of the migration.
+        """
+        with open(self.path, 'r') as file:
+            return file.read()
+
+
+class Migrator:
+    """
+    Runner of the migrations. Every migration is applied in its own
+    transaction together with its record in the schema_migrations table,
+    so a failed migration leaves neither changes nor the record behind
+    and can be fixed and applied again.
+    """
+    create_statement = 'CREATE TABLE IF NOT EXISTS schema_migrations (' \
+                       'version INTEGER PRIMARY KEY NOT NULL, ' \
+                       'name TEXT NOT NULL, applied_at TEXT NOT NULL)'
+
+    def __init__(self, connection: Connection, directory: str = 'migrations'):
+        """
+        Initializes the runner.
+
+        :param connection: connection to the database
+        :param directory: directory with the migration scripts
+        """
+        self.connection = connection
+        self.directory = directory
+
+    def migrations(self) -> List[Migration]:
+        """
+        Returns all the migrations from the directory sorted by version.
+        """
+        result = {}
+        for file_name in os.listdir(self.directory):
+            match = Migration.file_name_pattern.match(file_name)
+            if match is None:
+                continue
+            version = int(match.group(1))
+            if version in result:
+                raise ValueError(f'Duplicate migration version: {file_name}')
+            result[version] = Migration(
+                version, match.group(2),
+                os.path.join(self.directory, file_name))
+        return [result[version] for version in sorted(result)]
+
+    def applied(self) -> set:
+        """
+        Returns the versions of the migrations applied to the database.
+        """
+        self.connection.execute(self.create_statement)
+        return {row[0] for row in self.connection.execute(
+            'SELECT version FROM schema_migrations')}
+
+    def pending(self) -> List[Migration]:
+        """
+        Returns the migrations not yet applied to the database.
+        """
+        applied = self.applied()
+        return [migration for migration in self.migrations()
+                if migration.version not in applied]
+
+    def apply(self, migration: Migration):
+        """
+        Applies one migration in a transaction. If the script fails,
+        the transaction is rolled back and an exception is raised.
+
+        :param migration: migration to apply
+        """
+        name = migration.name.replace("'", "''")
+        applied_at = datetime.now(timezone.utc).isoformat()
+        try:
+            self.connection.executescript(
+                f'BEGIN;\n{migration.read()};\n'
+                f'INSERT INTO schema_migrations (version, name, applied_at) '
+                f"VALUES ({migration.version}, '{name}', '{applied_at}');\n"
+                f'COMMIT;')
+        except Error as e:
+            if self.connection.in_transaction:
+                self.connection.rollback()
+            raise DatabaseCommitError((repr(migration),) + e.args)
+
+    def migrate(self) -> List[Migration]:
+        """
+        Applies all the pending migrations in the order of their versions.
+
+        :return: list of the applied migrations
+        """
+        pending = self.pending()
+        for migration in pending:
+            self.apply(migration)
+        return pending
+
+
+def query_plan(connection: Connection, statement: str,
+               params: tuple = ()) -> List[str]:
+    """
+    Returns the query plan of the statement as reported by
+    EXPLAIN QUERY PLAN (one line per step).
+
+    :param connection: connection to the database
+    :param statement: SQL statement
+    :param params: parameters of the statement
+    """
+    return [row[3] for row in connection.execute(
+        f'EXPLAIN QUERY PLAN {statement}', params)]
+
+
+def find_full_scans(connection: Connection,
+                    queries: Iterable[Tuple[str, tuple]]) -> list:
+    """
+    Checks the query plans of the statements and returns the steps that
+    scan a whole table without an index (e.g. 'SCAN students').
+
+    :param connection: connection to the database
+    :param queries: statements with their parameters
+    :return: list of tuples with the statement and the scanning step
+    """
+    result = []
+    for statement, params in queries:
+        for step in query_plan(connection, statement, params):
+            if step.startswith('SCAN ') and ' USING ' not in step \
+                    and step != 'SCAN CONSTANT ROW':
+                result.append((statement, step))
+    return result
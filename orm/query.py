@@ -0,0 +1,264 @@
+"""
+Module containing the lazy QuerySet for the framework's ORM. A QuerySet
+is returned by the mappers instead of a list: it only builds the SQL
+statement, and nothing is read from the database until it's iterated,
+counted or sliced into a single object. Slices are translated into
+LIMIT / OFFSET, and the rows are fetched in batches.
+"""
+from typing import Iterator
+
+from orm.errors import RecordNotFoundError
+
+
+class QuerySet:
+    """
+    Lazy, chainable query over the table of a mapper. Every chaining
+    method returns a new QuerySet, the original one is never modified.
+    Supported lookups in filter(): field=value, field__gt, field__gte,
+    field__lt, field__lte, field__ne, field__in and field__startswith.
+    """
+    batch_size = 100
+    operators = {
+        'exact': '{} = ?',
+        'ne': '{} != ?',
+        'gt': '{} > ?',
+        'gte': '{} >= ?',
+        'lt': '{} < ?',
+        'lte': '{} <= ?',
+        'startswith': "{} LIKE ? ESCAPE '\\'",
+    }
+
+    def __init__(self, mapper, conditions: tuple = (), params: tuple = (),
+                 ordering: tuple = (), limit: int = None, offset: int = 0):
+        """
+        Initializes the QuerySet. Normally it's created by the mapper.
+
+        :param mapper: mapper of the table
+        :param conditions: SQL conditions joined with AND
+        :param params: parameters of the conditions
+        :param ordering: SQL ordering terms
+        :param limit: maximum number of rows or None
+        :param offset: number of rows to skip
+        """
+        self.mapper = mapper
+        self.conditions = conditions
+        self.params = params
+        self.ordering = ordering
+        self.limit = limit
+        self.offset = offset
+
+    def clone(self, **changes):
+        """
+        Returns a copy of the QuerySet with the given attributes changed.
+        """
+        attributes = {
+            'conditions': self.conditions,
+            'params': self.params,
+            'ordering': self.ordering,
+            'limit': self.limit,
+            'offset': self.offset,
+        }
+        attributes.update(changes)
+        return self.__class__(self.mapper, **attributes)
+
+    @staticmethod
+    def check_column(name: str) -> str:
+        """
+        Checks that the column name is a valid identifier, since it's put
+        into the statement as is.
+
+        :param name: column name
+        :return: the same name
+        """
+        if not name.isidentifier():
+            raise ValueError(f'Invalid column name: {name}')
+        return name
+
+    def filter(self, **lookups):
+        """
+        Returns a new QuerySet with the given conditions added.
+
+        :param lookups: conditions in the form of field__operator=value
+        """
+        conditions = list(self.conditions)
+        params = list(self.params)
+        for lookup, value in lookups.items():
+            column, _, operator = lookup.partition('__')
+            column = self.check_column(column)
+            if operator == 'in':
+                values = list(value)
+                if not values:
+                    conditions.append('0')
+                    continue
+                conditions.append(
+                    f'{column} IN ({", ".join("?" * len(values))})')
+                params.extend(values)
+                continue
+            if operator == 'startswith':
+                value = value.replace('\\', '\\\\').replace(
+                    '%', '\\%').replace('_', '\\_') + '%'
+            if operator not in self.operators and operator:
+                raise ValueError(f'Unsupported lookup: {lookup}')
+            conditions.append(
+                self.operators[operator or 'exact'].format(column))
+            params.append(value)
+        return self.clone(conditions=tuple(conditions), params=tuple(params))
+
+    def order_by(self, *fields: str):
+        """
+        Returns a new QuerySet ordered by the given fields. A field
+        prefixed with a minus sign is sorted in descending order.
+
+        :param fields: names of the fields
+        """
+        ordering = tuple(
+            f'{self.check_column(field[1:])} DESC' if field.startswith('-')
+            else f'{self.check_column(field)} ASC' for field in fields)
+        return self.clone(ordering=ordering)
+
+    def after(self, **values):
+        """
+        Keyset pagination: returns a new QuerySet with the rows following
+        the given values of the ordering field, e.g.
+        mapper.return_all().order_by('id').after(id=last_id)[:50].
+        Unlike OFFSET it doesn't read and skip all the previous rows.
+
+        :param values: the ordering field and its last seen value
+        """
+        (field, value), = values.items()
+        descending = f'{field} DESC' in self.ordering
+        return self.filter(**{f'{field}__{"lt" if descending else "gt"}':
+                              value})
+
+    def __getitem__(self, item):
+        """
+        Slicing returns a new QuerySet with LIMIT and OFFSET, indexing
+        executes the query and returns a single object.
+
+        :param item: slice with non-negative bounds or an index
+        """
+        if isinstance(item, slice):
+            if (item.start or 0) < 0 or (item.stop or 0) < 0 \
+                    or item.step not in (None, 1):
+                raise ValueError('Negative or stepped slices '
+                                 'are not supported.')
+            start = self.offset + (item.start or 0)
+            limit = self.limit
+            if item.stop is not None:
+                stop = self.offset + item.stop
+                if limit is not None:
+                    stop = min(stop, self.offset + limit)
+                limit = max(stop - start, 0)
+            elif limit is not None:
+                limit = max(self.offset + limit - start, 0)
+            return self.clone(limit=limit, offset=start)
+        for obj in self[item:item + 1]:
+            return obj
+        raise IndexError(item)
+
+    def where_clause(self) -> str:
+        """
+        Returns the WHERE clause of the statement (may be blank).
+        """
+        if not self.conditions:
+            return ''
+        return ' WHERE ' + ' AND '.join(self.conditions)
+
+    def statement(self) -> (str, tuple):
+        """
+        Builds the SELECT statement of the QuerySet.
+
+        :return: the statement and its parameters
+        """
+        statement = f'SELECT {self.mapper.select_columns} ' \
+                    f'FROM {self.mapper.table_name}{self.where_clause()}'
+        if self.ordering:
+            statement += ' ORDER BY ' + ', '.join(self.ordering)
+        if self.limit is not None or self.offset:
+            statement += ' LIMIT ? OFFSET ?'
+            return statement, self.params + (
+                -1 if self.limit is None else self.limit, self.offset)
+        return statement, self.params
+
+    def rows(self) -> Iterator[tuple]:
+        """
+        Executes the query and yields the raw rows, fetching them from
+        the database in batches of batch_size.
+        """
+        statement, params = self.statement()
+        cursor = self.mapper.pool.reader().execute(statement, params)
+        try:
+            rows = cursor.fetchmany(self.batch_size)
+            while rows:
+                yield from rows
+                rows = cursor.fetchmany(self.batch_size)
+        finally:
+            cursor.close()
+
+    def __iter__(self) -> Iterator:
+        """
+        Executes the query and yields the objects, fetching the rows from
+        the database in batches of batch_size.
+        """
+        identity_map = self.mapper.identity_map
+        load = self.mapper.load
+        for row in self.rows():
+            yield load(row, identity_map)
+
+    def cached(self) -> list:
+        """
+        Executes the query through the query cache of the mapper and
+        returns the list of objects. Meant for small hot queries: the rows
+        are kept in the cache until anything in the table is changed
+        through the ORM, or the database is changed by another connection
+        (see Mapper.check_cache). If the mapper has no cache, simply runs
+        the query.
+        """
+        cache = self.mapper.query_cache
+        if cache is None:
+            return list(self)
+        self.mapper.check_cache()
+        key = self.statement()
+        rows = cache.get(key)
+        if rows is None:
+            version = cache.version
+            rows = tuple(self.rows())
+            cache.set(key, rows, version)
+        identity_map = self.mapper.identity_map
+        return [self.mapper.load(row, identity_map) for row in rows]
+
+    def count(self) -> int:
+        """
+        Returns the number of rows with the SELECT COUNT statement.
+        """
+        statement, params = self.statement()
+        return self.mapper.pool.reader().execute(
+            f'SELECT COUNT(*) FROM ({statement})', params).fetchone()[0]
+
+    def __len__(self) -> int:
+        """
+        Returns the number of rows with the SELECT COUNT statement.
+        """
+        return self.count()
+
+    def exists(self) -> bool:
+        """
+        Checks if there's at least one row, reading not more than one.
+        """
+        for _ in self[:1]:
+            return True
+        return False
+
+    def __bool__(self) -> bool:
+        """
+        Checks if there's at least one row.
+        """
+        return self.exists()
+
+    def first(self):
+        """
+        Returns the first object. If nothing found, raises an exception.
+        """
+        for obj in self[:1]:
+            return obj
+        raise RecordNotFoundError(f'No records in {self.mapper.table_name}!')
@@ -0,0 +1,55 @@
+"""
+Module containing the retry helpers for the optimistic concurrency
+control of the framework's ORM. When a versioned object has been changed
+by another writer since it was read, the commit fails with
+a StaleObjectError. Instead of locking the rows, the whole operation
+(read - modify - commit) is simply repeated with the fresh data.
+"""
+from functools import wraps
+from random import random
+from time import sleep
+from typing import Callable
+
+from orm.core import UnitOfWork
+from orm.errors import StaleObjectError
+
+
+def retry_on_conflict(attempts: int = 3, delay: float = 0.01) -> Callable:
+    """
+    Decorates the function so that it's called again when it raises
+    a StaleObjectError. The function must read the objects, change them
+    and commit the unit of work itself, since a retry only makes sense
+    if it re-reads the data. Before every retry the current unit of work
+    is rolled back (which also forgets the loaded objects), and the
+    thread sleeps for a random, exponentially growing time, so that
+    the competing writers don't collide again. After the last attempt
+    the error is re-raised.
+
+    :param attempts: maximum number of calls
+    :param delay: base delay between the attempts (in seconds)
+    """
+    def decorator(func: Callable) -> Callable:
+        """
+        Decorator function with the given number of attempts.
+
+        :param func: callable function or method
+        """
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            """
+            Decorated callable function.
+            """
+            for attempt in range(1, attempts + 1):
+                try:
+                    return func(*args, **kwargs)
+                except StaleObjectError:
+                    if attempt == attempts:
+                        raise
+                unit_of_work = UnitOfWork.get_current()
+                if unit_of_work is not None:
+                    unit_of_work.rollback()
+                sleep(delay * 2 ** (attempt - 1) * (0.5 + random()))
+
+        return wrapped
+
+    return decorator
@@ -0,0 +1,273 @@
+"""
+Module containing the full-text search for the framework's ORM. With
+persistence the search runs on an SQLite FTS5 table indexing a column of
+the mapper's table (see the search_table attribute of the Mapper), so its
+cost depends on the number of matches rather than the size of the table.
+Without persistence the same kind of queries can be run on the in-memory
+InvertedIndex. Every word of the query matches the words starting with
+it, all the words must match, and the results are ranked by relevance.
+The PrefixIndex serves the autocompletion of whole names.
+"""
+import re
+from bisect import bisect_left, insort
+from itertools import count, islice
+from math import log
+from typing import Hashable, Iterable, Iterator, List, Tuple
+
+word_pattern = re.compile(r'\w+')
+
+
+def split_words(text: str) -> List[str]:
+    """
+    Splits the text into lowercase words, dropping the punctuation.
+
+    :param text: any text
+    """
+    return word_pattern.findall(text.lower())
+
+
+def match_expression(text: str) -> str:
+    """
+    Builds an FTS5 query from the text typed by a user: every word is
+    quoted (so no FTS5 syntax can be injected) and made a prefix query.
+
+    :param text: search query
+    :return: FTS5 MATCH expression, blank if there are no words
+    """
+    return ' '.join(f'"{word}"*' for word in split_words(text))
+
+
+class SearchQuery:
+    """
+    Lazy full-text query over the table of a mapper. Nothing is read
+    until it's iterated or sliced, a slice is translated into LIMIT and
+    OFFSET. The objects are returned from the most to the least relevant.
+    """
+
+    def __init__(self, mapper, text: str):
+        """
+        Initializes the query.
+
+        :param mapper: mapper of the table, must have a search_table
+        :param text: search query
+        """
+        self.mapper = mapper
+        self.expression = match_expression(text)
+        table = mapper.table_name
+        search_table = mapper.search_table
+        columns = ', '.join(f'{table}.{column}' for column in mapper.columns)
+        self.from_clause = f'FROM {search_table} JOIN {table} ' \
+                           f'ON {table}.id = {search_table}.rowid ' \
+                           f'WHERE {search_table} MATCH ?'
+        self.select_statement = f'SELECT {columns} {self.from_clause} ' \
+                                f'ORDER BY {search_table}.rank ' \
+                                f'LIMIT ? OFFSET ?'
+
+    def fetch(self, limit: int = -1, offset: int = 0) -> list:
+        """
+        Executes the query and returns the list of objects.
+
+        :param limit: maximum number of objects, -1 for all of them
+        :param offset: number of objects to skip
+        """
+        if not self.expression:
+            return []
+        identity_map = self.mapper.identity_map
+        return [self.mapper.load(row, identity_map)
+                for row in self.mapper.pool.reader().execute(
+                    self.select_statement, (self.expression, limit, offset))]
+
+    def __getitem__(self, item: slice) -> list:
+        """
+        Returns one page of the results.
+
+        :param item: slice with non-negative bounds
+        """
+        start = item.start or 0
+        if item.stop is None:
+            return self.fetch(offset=start)
+        return self.fetch(max(item.stop - start, 0), start)
+
+    def __iter__(self) -> Iterator:
+        """
+        Returns all the results.
+        """
+        return iter(self.fetch())
+
+    def count(self) -> int:
+        """
+        Returns the number of matching rows.
+        """
+        if not self.expression:
+            return 0
+        return self.mapper.pool.reader().execute(
+            f'SELECT COUNT(*) {self.from_clause}',
+            (self.expression,)).fetchone()[0]
+
+
+class InvertedIndex:
+    """
+    In-memory full-text index: maps every word to the objects containing
+    it. The words are also kept in a sorted list, so the prefix of a word
+    is looked up with a binary search. The results are ranked by the sum
+    of TF-IDF weights of the matched words (the rarer the word, the
+    higher the weight), the ties are kept in the order of addition.
+    """
+
+    def __init__(self):
+        """
+        Initializes the empty index.
+        """
+        self.postings = {}
+        self.words = []
+        self.documents = {}
+        self.order = {}
+        self.counter = count()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of indexed objects.
+        """
+        return len(self.documents)
+
+    def add(self, obj: Hashable, text: str):
+        """
+        Indexes the object by the given text, replacing its previous text.
+
+        :param obj: object to index (objects are compared by identity
+            unless their class defines __eq__ and __hash__)
+        :param text: text of the object, e.g. its name
+        """
+        self.remove(obj)
+        words = split_words(text)
+        self.documents[obj] = words
+        self.order[obj] = next(self.counter)
+        for word in words:
+            objects = self.postings.get(word)
+            if objects is None:
+                objects = self.postings[word] = {}
+                self.words.insert(bisect_left(self.words, word), word)
+            objects[obj] = objects.get(obj, 0) + 1
+
+    def remove(self, obj: Hashable):
+        """
+        Removes the object from the index if it's there.
+
+        :param obj: indexed object
+        """
+        words = self.documents.pop(obj, None)
+        if words is None:
+            return
+        del self.order[obj]
+        for word in set(words):
+            objects = self.postings[word]
+            del objects[obj]
+            if not objects:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def expand(self, prefix: str) -> List[str]:
+        """
+        Returns the indexed words starting with the prefix.
+
+        :param prefix: beginning of a word
+        """
+        result = []
+        for position in range(bisect_left(self.words, prefix),
+                              len(self.words)):
+            word = self.words[position]
+            if not word.startswith(prefix):
+                break
+            result.append(word)
+        return result
+
+    def search(self, text: str) -> list:
+        """
+        Returns the objects matching all the words of the query (each as
+        a prefix), from the most to the least relevant.
+
+        :param text: search query
+        """
+        scores = None
+        for prefix in split_words(text):
+            matches = {}
+            for word in self.expand(prefix):
+                objects = self.postings[word]
+                weight = log(1 + len(self.documents) / len(objects))
+                for obj, frequency in objects.items():
+                    matches[obj] = matches.get(obj, 0) + frequency * weight
+            if scores is None:
+                scores = matches
+            else:
+                scores = {obj: score + matches[obj]
+                          for obj, score in scores.items() if obj in matches}
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(scores,
+                      key=lambda obj: (-scores[obj], self.order[obj]))
+
+
+class PrefixIndex:
+    """
+    In-memory index for the autocompletion of names. The names are kept
+    in a sorted list (case-insensitively), so all the names starting with
+    a prefix are found with a binary search and lie next to each other:
+    a lookup costs O(log n) plus the number of returned names.
+    """
+
+    def __init__(self, items: Iterable[Tuple[Hashable, str]] = ()):
+        """
+        Initializes the index.
+
+        :param items: keys (e.g. IDs) with their names
+        """
+        self.names = {key: name for key, name in items if name is not None}
+        self.entries = sorted(
+            (name.casefold(), key) for key, name in self.names.items())
+
+    def __len__(self) -> int:
+        """
+        Returns the number of indexed names.
+        """
+        return len(self.names)
+
+    def add(self, key: Hashable, name: str):
+        """
+        Adds the name to the index, replacing the previous name of the key.
+
+        :param key: key of the name, e.g. the ID of an object
+        :param name: name to be completed
+        """
+        self.remove(key)
+        if name is not None:
+            self.names[key] = name
+            insort(self.entries, (name.casefold(), key))
+
+    def remove(self, key: Hashable):
+        """
+        Removes the name of the key from the index if it's there.
+
+        :param key: key of the name
+        """
+        name = self.names.pop(key, None)
+        if name is not None:
+            entry = (name.casefold(), key)
+            del self.entries[bisect_left(self.entries, entry)]
+
+    def complete(self, prefix: str, limit: int = 10) -> List[str]:
+        """
+        Returns the names starting with the prefix in alphabetical order.
+
+        :param prefix: beginning of a name (case-insensitive)
+        :param limit: maximum number of names
+        """
+        prefix = prefix.casefold()
+        result = []
+        position = bisect_left(self.entries, (prefix,))
+        for folded, key in islice(self.entries, position, None):
+            if len(result) == limit or not folded.startswith(prefix):
+                break
+            result.append(self.names[key])
+        return result
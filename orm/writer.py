@@ -0,0 +1,160 @@
+"""
+Module containing the write-behind writer for the framework's ORM.
+Instead of paying for a full transaction per commit, the units of work
+hand their changes over to a dedicated writer thread, which merges all
+the commits that arrive within a short time window into one transaction
+(group commit).
+"""
+import atexit
+import os
+from concurrent.futures import Future
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic
+
+from logs.config import Logger
+from orm.core import UnitOfWork
+from orm.errors import WriteQueueFullError
+
+
+class GroupCommitWriter:
+    """
+    Writer thread committing the changes of many units of work at once.
+    Each submitted unit of work gets a future resolved when its changes
+    are durable (or failed). The failed commits are logged and counted,
+    even if nobody waits for their futures. The queue is bounded: when
+    it's full the submitting threads wait for a free slot, which slows
+    the producers down to the pace of the database.
+    """
+
+    def __init__(self, registry, window: float = 0.002,
+                 max_batch: int = 256, max_queue: int = 1024,
+                 put_timeout: float = 5.0):
+        """
+        Initializes the writer. The thread is started on the first commit.
+
+        :param registry: mapper registry to write with
+        :param window: how long to wait for more commits to join the
+            transaction after the first one arrives (in seconds)
+        :param max_batch: maximum number of commits in one transaction
+        :param max_queue: maximum number of commits waiting in the queue
+        :param put_timeout: how long to wait for a free slot in the queue
+        """
+        self.registry = registry
+        self.window = window
+        self.max_batch = max_batch
+        self.put_timeout = put_timeout
+        self.queue = Queue(max_queue)
+        self.lock = Lock()
+        self.thread = None
+        self.pid = None
+        self.failures = 0
+
+    def start(self):
+        """
+        Starts the writer thread unless it's already running in this
+        process (a thread doesn't survive a fork, so it's started again
+        in the child process).
+        """
+        with self.lock:
+            if self.thread is not None and self.pid == os.getpid():
+                return
+            if self.pid is None:
+                atexit.register(self.close)
+            self.pid = os.getpid()
+            self.thread = Thread(
+                target=self.run, name='group-commit-writer', daemon=True)
+            self.thread.start()
+
+    def submit(self, unit_of_work: UnitOfWork) -> Future:
+        """
+        Puts the unit of work into the queue.
+
+        :param unit_of_work: unit of work with the changes to commit
+        :return: future resolved with the unit of work once it's committed
+        """
+        self.start()
+        future = Future()
+        try:
+            self.queue.put((unit_of_work, future), timeout=self.put_timeout)
+        except Full:
+            raise WriteQueueFullError(self.queue.maxsize)
+        future.add_done_callback(self.log_failure)
+        return future
+
+    def log_failure(self, future: Future):
+        """
+        Logs the failed commit, whose changes have been lost. The logger
+        is only created when something fails, so importing the module
+        doesn't create it.
+
+        :param future: resolved future of a commit
+        """
+        error = future.exception()
+        if error is None:
+            return
+        with self.lock:
+            self.failures += 1
+        Logger('file', 'main').logger(
+            f'Write-behind commit failed, its changes are lost: {error!r}.')
+
+    def run(self):
+        """
+        Main loop of the writer thread. Takes the first commit from the
+        queue, collects more of them during the time window and writes
+        them all in one transaction. Stops on the None sentinel.
+        """
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            items = [item]
+            deadline = monotonic() + self.window
+            while len(items) < self.max_batch:
+                try:
+                    item = self.queue.get(
+                        timeout=max(deadline - monotonic(), 0))
+                except Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                items.append(item)
+            self.write(items)
+
+    def write(self, items: list):
+        """
+        Writes the given commits in one transaction. If the transaction
+        fails, every commit is retried in a separate transaction, so that
+        one bad commit doesn't fail the others (the new objects get back
+        the IDs they had before the failed transaction).
+
+        :param items: list of tuples with units of work and their futures
+        """
+        units_of_work = [unit_of_work for unit_of_work, future in items]
+        try:
+            UnitOfWork.merge(units_of_work).write_transaction()
+        except Exception as e:
+            if len(items) == 1:
+                items[0][1].set_exception(e)
+            else:
+                for item in items:
+                    self.write([item])
+            return
+        for unit_of_work, future in items:
+            unit_of_work.finish()
+            future.set_result(unit_of_work)
+
+    def close(self, timeout: float = None):
+        """
+        Writes everything left in the queue and stops the writer thread.
+
+        :param timeout: how long to wait for the thread to finish
+        """
+        with self.lock:
+            thread, self.thread = self.thread, None
+        if thread is not None and thread.is_alive() \
+                and self.pid == os.getpid():
+            self.queue.put(None)
+            thread.join(timeout)
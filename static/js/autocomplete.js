@@ -0,0 +1,30 @@
+/*
+ * Autocompletion of the text inputs with the data-autocomplete attribute
+ * set to the URL of an autocomplete API view. The suggestions are put
+ * into the datalist of the input. Requests are debounced, and responses
+ * to outdated requests are ignored.
+ */
+document.querySelectorAll('input[data-autocomplete]').forEach(function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var timer = null;
+    var latest = 0;
+    input.addEventListener('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            var request = ++latest;
+            var url = input.dataset.autocomplete + '?q=' + encodeURIComponent(input.value);
+            fetch(url).then(function (response) {
+                return response.json();
+            }).then(function (names) {
+                if (request !== latest) {
+                    return;
+                }
+                list.replaceChildren.apply(list, names.map(function (name) {
+                    var option = document.createElement('option');
+                    option.value = name;
+                    return option;
+                }));
+            });
+        }, 150);
+    });
+});
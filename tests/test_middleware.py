@@ -0,0 +1,241 @@
+"""
+Tests of the WSGI middleware: the gzip compression with the ETags of
+the application and the commits of the units of work made before
+the responses are started.
+"""
+import gzip
+import io
+import sqlite3
+import unittest
+from wsgiref.util import FileWrapper
+
+from core.middleware import GzipMiddleware, UnitOfWorkMiddleware
+from core.wsgi_core import Application
+from models import Enrollment, Student
+from orm.core import UnitOfWork
+from orm.errors import StaleObjectError
+from tests.test_orm import DatabaseTestCase
+
+PAGE = b'<p>' + b'Course catalogue ' * 100 + b'</p>'
+
+
+def call(app, path: str = '/page/', **environment) -> tuple:
+    """
+    Calls the WSGI application and reads the whole body.
+
+    :param app: WSGI application
+    :param path: url path
+    :param environment: additional WSGI environment
+    :return: the status, the headers as a dictionary and the body
+    """
+    environment = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+        'wsgi.input': io.BytesIO(), **environment}
+    response = []
+
+    def start_response(status: str, headers: list, exc_info=None):
+        response[:] = [status, dict(headers)]
+        return lambda data: None
+
+    body = app(environment, start_response)
+    try:
+        data = b''.join(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return response[0], response[1], data
+
+
+class PageView:
+    """
+    View returning the same page with an ETag.
+    """
+    etag = True
+
+    def __call__(self, request: dict) -> (str, list):
+        return '200 Ok', [PAGE]
+
+
+class GzipMiddlewareTest(unittest.TestCase):
+    """
+    Tests of the GzipMiddleware wrapping the Application.
+    """
+
+    def setUp(self):
+        """
+        Creates the application with a page sending an ETag.
+        """
+        self.app = GzipMiddleware(Application({'/page/': PageView()}, []))
+
+    def test_compresses_list_body(self):
+        status, headers, data = call(self.app, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(status, '200 Ok')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(headers['Content-Length'], str(len(data)))
+        self.assertTrue(headers['ETag'].endswith('-gzip"'))
+        self.assertEqual(gzip.decompress(data), PAGE)
+
+    def test_plain_without_accept_encoding(self):
+        status, headers, data = call(self.app)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertFalse(headers['ETag'].endswith('-gzip"'))
+        self.assertEqual(data, PAGE)
+
+    def test_compressed_variant_cached(self):
+        data = call(self.app, HTTP_ACCEPT_ENCODING='gzip')[2]
+        self.assertEqual(len(self.app.cache), 1)
+        self.assertEqual(call(self.app, HTTP_ACCEPT_ENCODING='gzip')[2], data)
+
+    def test_large_variant_not_cached(self):
+        self.app.max_cached_size = 10
+        call(self.app, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(len(self.app.cache), 0)
+
+    def test_revalidates_compressed_copy(self):
+        etag = call(self.app, HTTP_ACCEPT_ENCODING='gzip')[1]['ETag']
+        status, headers, data = call(
+            self.app, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(data, b'')
+
+    def test_revalidates_plain_copy(self):
+        etag = call(self.app)[1]['ETag']
+        status, headers, data = call(
+            self.app, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(headers['ETag'], etag)
+
+    def test_small_body_not_compressed(self):
+        app = GzipMiddleware(Application({'/page/': PageView()}, []),
+                             minimum_size=len(PAGE) + 1)
+        status, headers, data = call(app, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(data, PAGE)
+
+    def test_file_wrapper_passed_through(self):
+        def app(environment: dict, start_response):
+            start_response('200 OK', [('Content-Type', 'text/css'),
+                                      ('ETag', '"1"')])
+            return FileWrapper(io.BytesIO(PAGE))
+
+        body = GzipMiddleware(app)({
+            'HTTP_ACCEPT_ENCODING': 'gzip',
+            'wsgi.file_wrapper': FileWrapper}, lambda *args: None)
+        self.assertIsInstance(body, FileWrapper)
+
+    def test_streams_other_iterables(self):
+        def app(environment: dict, start_response):
+            start_response('200 OK', [('Content-Type', 'text/css'),
+                                      ('ETag', '"1"'),
+                                      ('Content-Length', str(len(PAGE)))])
+            return iter([PAGE[:100], PAGE[100:]])
+
+        status, headers, data = call(GzipMiddleware(app),
+                                     HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(headers['ETag'], '"1-gzip"')
+        self.assertNotIn('Content-Length', headers)
+        self.assertEqual(gzip.decompress(data), PAGE)
+
+    def test_written_data_kept(self):
+        def app(environment: dict, start_response):
+            write = start_response('200 OK', [('Content-Type', 'text/html')])
+            write(PAGE[:100])
+            return [PAGE[100:]]
+
+        data = call(GzipMiddleware(app), HTTP_ACCEPT_ENCODING='gzip')[2]
+        self.assertEqual(gzip.decompress(data), PAGE)
+
+    def test_lazy_start_response(self):
+        def app(environment: dict, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            yield PAGE
+
+        status, headers, data = call(GzipMiddleware(app),
+                                     HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(gzip.decompress(data), PAGE)
+
+
+class UnitOfWorkMiddlewareTest(DatabaseTestCase):
+    """
+    Tests of the UnitOfWorkMiddleware with a real database.
+    """
+
+    def count_students(self, name: str) -> int:
+        """
+        Counts the students with the name through a separate connection.
+
+        :param name: name of the students
+        """
+        with sqlite3.connect(self.database) as connection:
+            return connection.execute(
+                'SELECT COUNT(*) FROM students WHERE name=?',
+                (name,)).fetchone()[0]
+
+    def test_commits_before_response(self):
+        counts = []
+
+        def app(environment: dict, start_response):
+            Student('Saved').mark_new()
+            start_response('200 Ok', [('Content-Type', 'text/plain')])
+            return [b'saved']
+
+        def start_response(status: str, headers: list, exc_info=None):
+            counts.append(self.count_students('Saved'))
+
+        middleware = UnitOfWorkMiddleware(app, self.new_registry())
+        middleware({'PATH_INFO': '/'}, start_response)
+        self.assertEqual(counts, [1])
+        self.assertIsNone(UnitOfWork.get_current())
+
+    def test_failed_commit_is_conflict(self):
+        registry = self.new_registry()
+        notified = []
+
+        def app(environment: dict, start_response):
+            course = registry.get_current_mapper('course').find_by_id(1)
+            student = registry.get_current_mapper('student').find_by_id(1)
+            Student('Rolled back').mark_new()
+            Enrollment(course, student).mark_new()
+            UnitOfWork.get_current().register_after_commit(
+                lambda: notified.append(True))
+            start_response('200 Ok', [('Content-Type', 'text/plain')])
+            return [b'enlisted']
+
+        status, headers, data = call(UnitOfWorkMiddleware(app, registry))
+        self.assertEqual(status, '409 Conflict')
+        self.assertEqual(notified, [])
+        self.assertEqual(self.count_students('Rolled back'), 0)
+        self.assertIsNone(UnitOfWork.get_current())
+
+    def test_stale_object_in_view_is_conflict(self):
+        def app(environment: dict, start_response):
+            raise StaleObjectError('courses id=1 version=1')
+
+        status = call(UnitOfWorkMiddleware(app, self.new_registry()))[0]
+        self.assertEqual(status, '409 Conflict')
+
+    def test_other_errors_roll_back(self):
+        def app(environment: dict, start_response):
+            Student('Never saved').mark_new()
+            raise KeyError('name')
+
+        with self.assertRaises(KeyError):
+            call(UnitOfWorkMiddleware(app, self.new_registry()))
+        self.assertEqual(self.count_students('Never saved'), 0)
+        self.assertIsNone(UnitOfWork.get_current())
+
+    def test_lazy_start_response_passed_through(self):
+        def app(environment: dict, start_response):
+            start_response('200 Ok', [('Content-Type', 'text/plain')])
+            yield b'lazy'
+
+        status, headers, data = call(
+            UnitOfWorkMiddleware(app, self.new_registry()))
+        self.assertEqual(status, '200 Ok')
+        self.assertEqual(data, b'lazy')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+"""
+Tests of the ORM: the optimistic concurrency control, the caches of
+the mappers and their invalidation by other connections, the slicing of
+the QuerySets and the units of work (in the normal and the write-behind
+mode). Every test works with its own small database, and every registry
+stands for a separate worker process with its own connection pool.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import Future
+
+from benchmarks.dataset import Dataset
+from mappers import ProjectMapperRegistry
+from models import Enrollment, Student
+from orm.connections import ConnectionPool
+from orm.core import UnitOfWork
+from orm.errors import DatabaseCommitError, StaleObjectError
+from orm.retry import retry_on_conflict
+
+MIGRATIONS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'migrations')
+
+
+class DatabaseTestCase(unittest.TestCase):
+    """
+    Base test case creating a small database for every test.
+    """
+
+    def setUp(self):
+        """
+        Creates the database in a temporary directory.
+        """
+        self.directory = tempfile.mkdtemp(prefix='tests-')
+        self.database = os.path.join(self.directory, 'test_db.sqlite3')
+        Dataset(2, 10, 10, 5).populate(self.database, MIGRATIONS)
+        self.pools = []
+
+    def tearDown(self):
+        """
+        Closes the connections and removes the database.
+        """
+        UnitOfWork.set_current(None)
+        for pool in self.pools:
+            pool.close_all()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def new_registry(self) -> ProjectMapperRegistry:
+        """
+        Returns a new registry with its own connection pool.
+        """
+        pool = ConnectionPool(self.database)
+        self.pools.append(pool)
+        return ProjectMapperRegistry(pool)
+
+    @staticmethod
+    def new_unit_of_work(registry: ProjectMapperRegistry) -> UnitOfWork:
+        """
+        Sets a new current unit of work working with the registry.
+
+        :param registry: mapper registry
+        """
+        UnitOfWork.new_current()
+        unit_of_work = UnitOfWork.get_current()
+        unit_of_work.set_mapper_registry(registry)
+        return unit_of_work
+
+    def rename_course(self, registry: ProjectMapperRegistry, course_id: int,
+                      name: str):
+        """
+        Renames the course within a new unit of work and commits it.
+
+        :param registry: mapper registry
+        :param course_id: ID of the course
+        :param name: new name of the course
+        """
+        unit_of_work = self.new_unit_of_work(registry)
+        course = registry.get_current_mapper('course').find_by_id(course_id)
+        course.name = name
+        course.mark_dirty()
+        unit_of_work.commit()
+
+
+class OptimisticConcurrencyTest(DatabaseTestCase):
+    """
+    Tests of the row versions of the courses.
+    """
+
+    def test_stale_update_raises(self):
+        first, second = self.new_registry(), self.new_registry()
+        self.new_unit_of_work(first)
+        course = first.get_current_mapper('course').find_by_id(1)
+        self.rename_course(second, 1, 'Renamed elsewhere')
+        unit_of_work = self.new_unit_of_work(first)
+        course.name = 'Renamed here'
+        course.mark_dirty()
+        with self.assertRaises(StaleObjectError):
+            unit_of_work.commit()
+        unit_of_work.rollback()
+        self.new_unit_of_work(first)
+        self.assertEqual(
+            first.get_current_mapper('course').find_by_id(1).name,
+            'Renamed elsewhere')
+
+    def test_versions_advance_on_commit(self):
+        registry = self.new_registry()
+        self.rename_course(registry, 1, 'First')
+        self.rename_course(registry, 1, 'Second')
+        self.new_unit_of_work(registry)
+        course = registry.get_current_mapper('course').find_by_id(1)
+        self.assertEqual(course.name, 'Second')
+        self.assertEqual(course.version, 3)
+
+    def test_retry_on_conflict_rereads_the_data(self):
+        first, second = self.new_registry(), self.new_registry()
+        attempts = []
+
+        @retry_on_conflict(attempts=3, delay=0)
+        def rename(name: str):
+            """
+            Renames the first course, conflicting on the first attempt.
+            """
+            unit_of_work = UnitOfWork.get_current()
+            course = first.get_current_mapper('course').find_by_id(1)
+            attempts.append(course.name)
+            if len(attempts) == 1:
+                self.rename_course(second, 1, 'Concurrent')
+                UnitOfWork.set_current(unit_of_work)
+            course.name = name
+            course.mark_dirty()
+            unit_of_work.commit()
+
+        self.new_unit_of_work(first)
+        rename('Retried')
+        self.assertEqual(attempts, ['Course 1', 'Concurrent'])
+        self.assertEqual(rename.__name__, 'rename')
+        self.new_unit_of_work(second)
+        self.assertEqual(
+            second.get_current_mapper('course').find_by_id(1).name,
+            'Retried')
+
+
+class CacheInvalidationTest(DatabaseTestCase):
+    """
+    Tests of the caches of the mappers.
+    """
+
+    def test_commit_of_another_connection_clears_cache(self):
+        first, second = self.new_registry(), self.new_registry()
+        self.new_unit_of_work(first)
+        first.get_current_mapper('course').find_by_id(2)
+        self.rename_course(second, 2, 'Changed elsewhere')
+        self.new_unit_of_work(first)
+        self.assertEqual(
+            first.get_current_mapper('course').find_by_id(2).name,
+            'Changed elsewhere')
+
+    def test_query_cache_cleared_by_another_connection(self):
+        first, second = self.new_registry(), self.new_registry()
+        self.new_unit_of_work(first)
+        mapper = first.get_current_mapper('course')
+        self.assertEqual(
+            [course.name for course in mapper.return_all().filter(
+                name='Course 3').cached()], ['Course 3'])
+        self.rename_course(second, 3, 'Course 3 renamed')
+        self.new_unit_of_work(first)
+        self.assertEqual(
+            mapper.return_all().filter(name='Course 3').cached(), [])
+
+    def test_own_commit_clears_cache(self):
+        registry = self.new_registry()
+        self.new_unit_of_work(registry)
+        registry.get_current_mapper('course').find_by_id(4)
+        self.rename_course(registry, 4, 'Changed here')
+        self.new_unit_of_work(registry)
+        self.assertEqual(
+            registry.get_current_mapper('course').find_by_id(4).name,
+            'Changed here')
+
+
+class QuerySetTest(DatabaseTestCase):
+    """
+    Tests of the lazy QuerySets.
+    """
+
+    def test_slices_compose(self):
+        registry = self.new_registry()
+        self.new_unit_of_work(registry)
+        courses = registry.get_current_mapper('course').return_all()
+        statement, params = courses[5:10][2:4].statement()
+        self.assertTrue(statement.endswith('LIMIT ? OFFSET ?'))
+        self.assertEqual(params, (2, 7))
+        self.assertEqual(courses[5:10][3:].statement()[1], (2, 8))
+        self.assertEqual(courses[5:10][8:].statement()[1], (0, 13))
+
+    def test_slice_reads_the_rows(self):
+        registry = self.new_registry()
+        self.new_unit_of_work(registry)
+        courses = registry.get_current_mapper(
+            'course').return_all().order_by('id')
+        self.assertEqual([course.id for course in courses[5:10][2:4]],
+                         [8, 9])
+
+
+class UnitOfWorkTest(DatabaseTestCase):
+    """
+    Tests of the registration and the commits of the changes.
+    """
+
+    def test_objects_registered_once(self):
+        registry = self.new_registry()
+        unit_of_work = self.new_unit_of_work(registry)
+        course = registry.get_current_mapper('course').find_by_id(1)
+        student = Student('New student')
+        student.mark_new()
+        for _ in range(3):
+            course.mark_dirty()
+            student.mark_dirty()
+        self.assertEqual(unit_of_work.dirty_objects, [course])
+        self.assertEqual(unit_of_work.new_objects, [student])
+        unit_of_work.rollback()
+        course.mark_dirty()
+        self.assertEqual(unit_of_work.dirty_objects, [course])
+
+    def test_after_commit_callbacks(self):
+        registry = self.new_registry()
+        unit_of_work = self.new_unit_of_work(registry)
+        called = []
+        Student('Committed').mark_new()
+        unit_of_work.register_after_commit(lambda: called.append(True))
+        unit_of_work.commit()
+        self.assertEqual(called, [True])
+
+    def test_after_commit_callbacks_skipped_on_failure(self):
+        registry = self.new_registry()
+        course = registry.get_current_mapper('course').find_by_id(1)
+        student = registry.get_current_mapper('student').find_by_id(1)
+        unit_of_work = self.new_unit_of_work(registry)
+        called = []
+        Enrollment(course, student).mark_new()
+        unit_of_work.register_after_commit(lambda: called.append(True))
+        with self.assertRaises(DatabaseCommitError):
+            unit_of_work.commit()
+        unit_of_work.rollback()
+        unit_of_work.commit()
+        self.assertEqual(called, [])
+
+    def test_write_behind_retry_resets_ids(self):
+        registry = self.new_registry()
+        registry.enable_id_allocation(10)
+        writer = registry.enable_write_behind()
+        course = registry.get_current_mapper('course').find_by_id(1)
+        enrolled = registry.get_current_mapper('student').find_by_id(1)
+        student = Student('Without ID')
+        student.id = None
+        good = self.new_unit_of_work(registry)
+        student.mark_new()
+        bad = self.new_unit_of_work(registry)
+        Enrollment(course, enrolled).mark_new()
+        ids = []
+        write = writer.write
+
+        def spy(items: list):
+            """
+            Records the IDs of the new objects of every retry.
+            """
+            if len(items) == 1:
+                ids.append([obj.id for obj in items[0][0].new_objects])
+            write(items)
+
+        writer.write = spy
+        futures = [Future(), Future()]
+        writer.write([(good, futures[0]), (bad, futures[1])])
+        self.assertEqual(ids[0], [None])
+        self.assertIsNone(futures[0].exception())
+        self.assertIsInstance(futures[1].exception(), DatabaseCommitError)
+        self.assertIsNotNone(student.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Tests of the startup of the application. The application is created in
+fresh interpreters (see benchmarks startup), so the modules imported by
+the test runner don't hide the cost of the imports.
+"""
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+from statistics import median
+
+from benchmarks.__main__ import ROOT, STARTUP_SCRIPT, prepare_workdir
+from benchmarks.dataset import Dataset
+
+
+class StartupTest(unittest.TestCase):
+    """
+    Checks that the import of the application factory and the creation of
+    the application fit into the budget, and that no database connection
+    is opened before the first request.
+    """
+    budget_ms = 150.0
+    repeat = 3
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Creates the application in fresh interpreters in a temporary
+        working directory with a small database.
+        """
+        cwd = os.getcwd()
+        try:
+            cls.workdir = prepare_workdir(Dataset(2, 5, 10, 10))
+        finally:
+            os.chdir(cwd)
+        runs = []
+        for _ in range(cls.repeat):
+            completed = subprocess.run(
+                [sys.executable, '-c', STARTUP_SCRIPT, ROOT],
+                cwd=cls.workdir, capture_output=True, text=True)
+            if completed.returncode:
+                raise RuntimeError(completed.stderr)
+            runs.append(json.loads(completed.stdout.splitlines()[-1]))
+        cls.runs = runs
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Removes the working directory.
+        """
+        shutil.rmtree(cls.workdir, ignore_errors=True)
+
+    def test_startup_within_budget(self):
+        startup_ms = median(run['import_ms'] + run['create_ms']
+                            for run in self.runs)
+        self.assertLessEqual(startup_ms, self.budget_ms)
+
+    def test_no_connections_before_first_request(self):
+        for run in self.runs:
+            self.assertEqual(run['connections_at_startup'], 0)
+
+    def test_first_request_succeeds(self):
+        for run in self.runs:
+            self.assertEqual(run['first_request_status'], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
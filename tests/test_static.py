@@ -0,0 +1,142 @@
+"""
+Tests of the static files handler: the containment of the paths,
+the conditional and the Range-requests and the bodies handed over to
+the server.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from wsgiref.util import FileWrapper
+
+from core.static import RangeFileWrapper, StaticFiles
+
+
+class StaticFilesTest(unittest.TestCase):
+    """
+    Tests of the StaticFiles handler serving a temporary directory.
+    """
+    content = b'body { color: black; }\n' * 10
+
+    def setUp(self):
+        """
+        Creates the directory with a file, a file outside of it and
+        a symbolic link pointing to the outside file.
+        """
+        self.root = tempfile.mkdtemp(prefix='tests-')
+        self.directory = os.path.join(self.root, 'static')
+        os.mkdir(self.directory)
+        with open(os.path.join(self.directory, 'main.css'), 'wb') as file:
+            file.write(self.content)
+        with open(os.path.join(self.root, 'secret.txt'), 'wb') as file:
+            file.write(b'secret')
+        os.symlink(os.path.join(self.root, 'secret.txt'),
+                   os.path.join(self.directory, 'link.txt'))
+        self.handler = StaticFiles(self.directory)
+
+    def tearDown(self):
+        """
+        Removes the directory.
+        """
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def get(self, path: str, method: str = 'GET', **environment) -> tuple:
+        """
+        Requests the file and reads the whole body.
+
+        :param path: path relative to the directory
+        :param method: request method
+        :param environment: additional WSGI environment
+        :return: the status, the headers as a dictionary and the body
+        """
+        status, body, headers = self.handler({
+            'method': method, 'path': path, 'environ': environment})
+        try:
+            data = b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+        return status, dict(headers), data
+
+    def test_serves_file(self):
+        status, headers, data = self.get('main.css')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(data, self.content)
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertEqual(headers['Content-Length'], str(len(self.content)))
+        self.assertIn('ETag', headers)
+
+    def test_paths_outside_directory_not_found(self):
+        for path in ('../secret.txt', 'link.txt', 'missing.css', ''):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(path)[0], '404 NOT FOUND')
+
+    def test_post_not_found(self):
+        self.assertEqual(self.get('main.css', 'POST')[0], '404 NOT FOUND')
+
+    def test_not_modified(self):
+        etag = self.get('main.css')[1]['ETag']
+        status, headers, data = self.get(
+            'main.css', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '304 Not Modified')
+        self.assertEqual(headers['ETag'], etag)
+        self.assertEqual(data, b'')
+
+    def test_etag_changes_with_file(self):
+        etag = self.get('main.css')[1]['ETag']
+        with open(os.path.join(self.directory, 'main.css'), 'ab') as file:
+            file.write(b'a { color: red; }\n')
+        status, headers, data = self.get(
+            'main.css', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(status, '200 OK')
+        self.assertNotEqual(headers['ETag'], etag)
+
+    def test_range(self):
+        status, headers, data = self.get('main.css', HTTP_RANGE='bytes=5-9')
+        self.assertEqual(status, '206 Partial Content')
+        self.assertEqual(data, self.content[5:10])
+        self.assertEqual(headers['Content-Range'],
+                         f'bytes 5-9/{len(self.content)}')
+        self.assertEqual(headers['Content-Length'], '5')
+
+    def test_suffix_and_open_ranges(self):
+        self.assertEqual(
+            self.get('main.css', HTTP_RANGE='bytes=-4')[2],
+            self.content[-4:])
+        self.assertEqual(
+            self.get('main.css', HTTP_RANGE='bytes=200-')[2],
+            self.content[200:])
+
+    def test_unsatisfiable_range(self):
+        status, headers, data = self.get(
+            'main.css', HTTP_RANGE=f'bytes={len(self.content)}-')
+        self.assertEqual(status, '416 Range Not Satisfiable')
+        self.assertEqual(headers['Content-Range'],
+                         f'bytes */{len(self.content)}')
+
+    def test_range_ignored_for_other_version(self):
+        status, headers, data = self.get(
+            'main.css', HTTP_RANGE='bytes=0-1', HTTP_IF_RANGE='"other"')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(data, self.content)
+
+    def test_head(self):
+        status, headers, data = self.get('main.css', 'HEAD')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Length'], str(len(self.content)))
+        self.assertEqual(data, b'')
+
+    def test_bodies(self):
+        status, body, headers = self.handler({
+            'method': 'GET', 'path': 'main.css',
+            'environ': {'wsgi.file_wrapper': FileWrapper}})
+        self.assertIsInstance(body, FileWrapper)
+        body.close()
+        status, body, headers = self.handler({
+            'method': 'GET', 'path': 'main.css', 'environ': {}})
+        self.assertIsInstance(body, RangeFileWrapper)
+        body.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,13 @@
 """
-Module with class-based views for the project.
+Module with class-based views for the project. Importing it doesn't open
+any resources: the views are registered by register_routes() when the
+application is created (see app.py), and they get the mapper registry
+from the unit of work of the current request. All the data is read and
+written through the mappers: the OnlineUniversity only serves as the
+factory of the new objects, its in-memory collections aren't used.
 """
+import json
 from datetime import datetime
-from sqlite3 import connect
 
 from core.bases import BaseSerializer
 from core.templator import render_template
@@ -11,30 +16,40 @@ from core.wsgi_core import Application
 from logs.config import Logger
 from mappers import ProjectMapperRegistry
 from models import OnlineUniversity, EmailNotifier, TextMessageNotifier, \
-    Student
+    Enrollment
 from core.decorators import UrlPaths, debug
 from orm.core import UnitOfWork
+from orm.errors import RecordNotFoundError
+from orm.query import QuerySet
+from orm.search import SearchQuery
 
 site = OnlineUniversity()
 email_notifier = EmailNotifier()
 text_notifier = TextMessageNotifier()
 logger = Logger('file', 'main')
-routes = UrlPaths()
-connection = connect('test_db.sqlite3')
-mapper_registry = ProjectMapperRegistry(connection)
-UnitOfWork.new_current()
-UnitOfWork.get_current().set_mapper_registry(mapper_registry)
 
 
-@routes.add_route('/api/')
+def get_registry() -> ProjectMapperRegistry:
+    """
+    Returns the mapper registry of the application serving the current
+    request (the UnitOfWorkMiddleware sets it on the unit of work).
+    """
+    return UnitOfWork.get_current().mapper_registry
+
+
 class CoursesApiView:
+    etag = True
+
     def __call__(self, request: dict) -> (str, list):
         logger.logger(f'{__name__}.py; CoursesApiView; sending the list of'
                       f'courses via API.')
-        return '200 Ok', [BaseSerializer(site.courses).save().encode('utf-8')]
+        mapper = get_registry().get_current_mapper('course')
+        courses = list(mapper.return_all())
+        return '200 Ok', [
+            BaseSerializer(courses).save().encode('utf-8')], [
+            ('Content-Type', 'application/json')]
 
 
-@routes.add_route('/')
 class IndexView(TemplateView):
     """
     Class-based view for an index page. Subclass to TemplateView.
@@ -43,7 +58,6 @@ class IndexView(TemplateView):
     template_name = 'templates/index.html'
 
 
-@routes.add_route('/about/')
 class AboutView(TemplateView):
     """
     Class-based view for an about page. Subclass to TemplateView.
@@ -52,7 +66,6 @@ class AboutView(TemplateView):
     template_name = 'templates/about.html'
 
 
-@routes.add_route('/contacts/')
 class ContactsView(TemplateView):
     """
     Class-based view for a contacts page. Subclass to TemplateView.
@@ -72,10 +85,12 @@ class ContactsView(TemplateView):
         try:
             logger.logger('Trying to save the POST-data to file.')
             with open(f"incoming_msg_{datetime.now()}.txt", 'w') as f:
+                data = {key: Application.decode_value(value)
+                        for key, value in request['data'].items()}
                 text = f"Incoming message:\n" \
-                       f"From: {request['data']['email']};\n" \
-                       f"Subject: {request['data']['header']};\n" \
-                       f"Text:\n{request['data']['message']}"
+                       f"From: {data['email']};\n" \
+                       f"Subject: {data['header']};\n" \
+                       f"Text:\n{data['message']}"
                 f.write(text)
                 f.close()
         except Exception as e:
@@ -100,7 +115,6 @@ class ContactsView(TemplateView):
                 'templates/contacts.html').encode('utf-8')]
 
 
-@routes.add_route('/all_courses/')
 class CoursesListView(ListView):
     """
     Class-based view for a list of all available courses.
@@ -108,29 +122,43 @@ class CoursesListView(ListView):
     parent class.
     """
     template_name = 'templates/courses_list.html'
-    queryset = site.courses
+    paginate_by = 50
+    timeout = 2.0
+    etag = True
+
+    def get_queryset(self, request: dict = None) -> QuerySet:
+        """
+        Retrieves the lazy queryset of the courses from the database.
+
+        :param request: HTTP-request
+        :return: all current courses
+        """
+        mapper = get_registry().get_current_mapper('course')
+        return mapper.return_all().order_by('id')
 
 
-@routes.add_route('/create_course/')
 class CreateCourseView(CreateView):
     """
     Class-based view for the course creation page.
     """
     template_name = 'templates/create_course.html'
 
-    def get_context_data(self) -> dict:
+    def get_context_data(self, request: dict = None) -> dict:
         """
         Retrieves the context data for the template and updates it
         with the list of existing courses.
+
+        :param request: HTTP-request
         """
-        context = super().get_context_data()
-        context['categories'] = site.course_categories
+        context = super().get_context_data(request)
+        context['categories'] = get_registry().get_current_mapper(
+            'category').return_all().cached()
         return context
 
     def create_object(self, data: dict):
         """
         Creates a new course object from the data pulled from
-        the POST-request.
+        the POST-request and registers it to be saved to the database.
 
         :param data: new course data
         """
@@ -139,45 +167,159 @@ class CreateCourseView(CreateView):
         cat_id = data.get('category_id')
         category = None
         if cat_id:
-            category = site.find_category(int(cat_id))
+            category = get_registry().get_current_mapper(
+                'category').find_by_id(int(cat_id))
         new_course = site.create_course('online', name, category)
         new_course.observers.append(email_notifier)
         new_course.observers.append(text_notifier)
-        site.courses.append(new_course)
+        new_course.mark_new()
 
 
-@routes.add_route('/copy_course/')
 class CopyCourseView:
     """
     Class-based view to handle the copying of a course.
     """
 
     @debug
-    def __call__(self, request: dict) -> (str, list):
+    def __call__(self, request: dict) -> (str, list, list):
         """
         Main callable method. Handles the copying of a given
-        course by invoking a Prototype Mixin method 'clone'.
+        course by invoking a Prototype Mixin method 'clone', then
+        redirects to the paginated list of the courses.
 
         :param request: HTTP-requests
-        :return: tuple, first element is string, second HTML code
+        :return: tuple with the status, the empty body and the headers
         """
-        params = request['request_params']
+        params = request['req_params']
         name = params['name']
         name = Application.decode_value(name)
         logger.logger(
             f'{__name__}.py; CopyCourseView; copying course {name}.')
-        old_course = site.get_course(name)
+        mapper = get_registry().get_current_mapper('course')
+        try:
+            old_course = mapper.return_all().filter(name=name).first()
+        except RecordNotFoundError:
+            old_course = None
         if old_course:
             new_name = f'{name}_copy'
             new_course = old_course.clone()
+            new_course.id = new_course.allocate_id()
             new_course.name = new_name
-            site.courses.append(new_course)
-        return '200 Ok', [render_template(
-            'templates/course_list.html',
-            objects_list=site.courses).encode('utf-8')]
+            new_course.mark_new()
+        return '302 Found', [], [('Location', '/all_courses/')]
+
+
+def get_search_text(request: dict) -> str:
+    """
+    Returns the decoded search query from the 'q' query parameter.
+
+    :param request: HTTP-request
+    """
+    return Application.decode_value(request['req_params'].get('q', ''))
+
+
+class SearchView(ListView):
+    """
+    Class-based view for the full-text search of the courses and the
+    categories. The courses are paginated, the most relevant categories
+    are shown on the first page.
+    """
+    template_name = 'templates/search.html'
+    paginate_by = 20
+    timeout = 2.0
+    etag = True
+    categories_limit = 10
+
+    def get_queryset(self, request: dict = None) -> SearchQuery:
+        """
+        Returns the lazy full-text query over the courses.
+
+        :param request: HTTP-request
+        :return: courses matching the search query
+        """
+        return get_registry().get_current_mapper('course').search(
+            get_search_text(request))
+
+    def get_context_data(self, request: dict = None) -> dict:
+        """
+        Retrieves the context data for the template and updates it with
+        the search query and the matching categories.
+
+        :param request: HTTP-request
+        """
+        context = super().get_context_data(request)
+        text = get_search_text(request)
+        context['query'] = text
+        context['categories'] = get_registry().get_current_mapper(
+            'category').search(text)[:self.categories_limit] \
+            if context['page'] == 1 else []
+        return context
+
+
+class SearchApiView:
+    """
+    API view for the full-text search. Returns one page of the matching
+    courses or categories (the 'type' query parameter) as JSON.
+    """
+    page_size = 20
+    etag = True
+    types = ('course', 'category')
+
+    def __call__(self, request: dict) -> (str, list, list):
+        mapper_name = request['req_params'].get('type', 'course')
+        if mapper_name not in self.types:
+            return '400 Bad Request', [b'{"error": "unknown type"}'], [
+                ('Content-Type', 'application/json')]
+        page = ListView.get_page_number(request)
+        start = (page - 1) * self.page_size
+        objects = get_registry().get_current_mapper(mapper_name).search(
+            get_search_text(request))[start:start + self.page_size + 1]
+        result = {
+            'page': page,
+            'has_next': len(objects) > self.page_size,
+            'results': [{'id': obj.id, 'name': obj.name}
+                        for obj in objects[:self.page_size]],
+        }
+        return '200 Ok', [json.dumps(result).encode('utf-8')], [
+            ('Content-Type', 'application/json')]
+
+
+class AutocompleteApiView:
+    """
+    API view completing the names of the objects of one mapper. Returns
+    up to 'limit' names starting with the 'q' query parameter as JSON.
+    """
+    mapper_name = None
+    etag = True
+    default_limit = 10
+    max_limit = 50
+
+    def __call__(self, request: dict) -> (str, list, list):
+        params = request['req_params']
+        limit = params.get('limit', '')
+        limit = min(int(limit), self.max_limit) if limit.isdigit() \
+            else self.default_limit
+        names = get_registry().get_current_mapper(
+            self.mapper_name).autocomplete(
+            Application.decode_value(params.get('q', '')), limit)
+        return '200 Ok', [json.dumps(names).encode('utf-8')], [
+            ('Content-Type', 'application/json')]
+
+
+class StudentAutocompleteView(AutocompleteApiView):
+    """
+    API view completing the names of the students.
+    """
+    mapper_name = 'student'
+
+
+class CourseAutocompleteView(AutocompleteApiView):
+    """
+    API view completing the names of the courses.
+    """
+    mapper_name = 'course'
 
 
-@routes.add_route('/all_categories/')
 class CategoryListView(ListView):
     """
     Class-based view for the list of existing course categories.
@@ -185,29 +327,45 @@ class CategoryListView(ListView):
     parent class.
     """
     template_name = 'templates/categories_list.html'
-    queryset = site.course_categories
+    timeout = 2.0
+    etag = True
+
+    def get_queryset(self, request: dict = None) -> list:
+        """
+        Retrieves the categories from the database along with their
+        parents and courses, loaded in batches.
+
+        :param request: HTTP-request
+        :return: all current categories
+        """
+        mapper = get_registry().get_current_mapper('category')
+        categories = list(mapper.return_all().order_by('id'))
+        get_registry().load_categories(categories)
+        return categories
 
 
-@routes.add_route('/create_category/')
 class CreateCategoryView(CreateView):
     """
     Class-based view for a category creation page.
     """
     template_name = 'templates/create_category.html'
 
-    def get_context_data(self) -> dict:
+    def get_context_data(self, request: dict = None) -> dict:
         """
         Retrieves the context data for the template and updates it
         with the list of existing courses.
+
+        :param request: HTTP-request
         """
-        context = super().get_context_data()
-        context['categories'] = site.course_categories
+        context = super().get_context_data(request)
+        context['categories'] = get_registry().get_current_mapper(
+            'category').return_all().cached()
         return context
 
     def create_object(self, data: dict):
         """
         Creates a new course category object from the data pulled from
-        the POST-request.
+        the POST-request and registers it to be saved to the database.
 
         :param data: new course data
         """
@@ -216,37 +374,45 @@ class CreateCategoryView(CreateView):
         cat_id = data.get('category_id')
         category = None
         if cat_id:
-            category = site.find_category(int(cat_id))
+            category = get_registry().get_current_mapper(
+                'category').find_by_id(int(cat_id))
         new_category = site.create_category(name, category)
-        site.course_categories.append(new_category)
+        new_category.mark_new()
 
 
-@routes.add_route('/all_students/')
 class StudentsListView(ListView):
     """
     Class-based view for the list of all students.
     """
     template_name = 'templates/students_list.html'
+    paginate_by = 50
+    timeout = 2.0
+    etag = True
 
-    def get_queryset(self) -> list:
+    def get_queryset(self, request: dict = None) -> QuerySet:
         """
-        Retrieves the queryset from the database, then creates class
-        objects from the queries.
+        Retrieves the lazy queryset of the students from the database.
+        Only the students of the requested page are actually read.
 
+        :param request: HTTP-request
         :return: all current students
         """
-        mapper = mapper_registry.get_current_mapper('student')
-        query_list = mapper.return_all()
-        result = []
-        for query in query_list:
-            student_id, student_name = query
-            student = Student(student_name)
-            student.id = student_id
-            result.append(student)
-        return result
+        mapper = get_registry().get_current_mapper('student')
+        return mapper.return_all().order_by('id')
+
+    def get_context_data(self, request: dict = None) -> dict:
+        """
+        Retrieves the context data for the template and loads the
+        courses attended by the students of the page in batches.
+
+        :param request: HTTP-request
+        """
+        context = super().get_context_data(request)
+        get_registry().load_courses_in_attendance(
+            context[self.get_context_objects_name()])
+        return context
 
 
-@routes.add_route('/create_student/')
 class StudentCreateView(CreateView):
     """
     Class-based view for the creation of a new student.
@@ -263,40 +429,103 @@ class StudentCreateView(CreateView):
         name = data['name']
         name = Application.decode_value(name)
         new_student = site.create_user('student', name)
-        site.students.append(new_student)
         new_student.mark_new()
-        UnitOfWork.get_current().commit()
 
 
-@routes.add_route('/enlist_student/')
 class EnlistStudentView(CreateView):
     """
     Class-based view for the enrollment of a student on a course.
+    The form completes the names through the autocomplete API, so
+    the page doesn't grow with the number of students and courses.
+    Since the names are typed in, the form is shown again with an error
+    if there's no course or student with the given name.
     """
     template_name = 'templates/enlist_student.html'
 
-    def get_context_data(self) -> dict:
+    @debug
+    def get_context_data(self, request: dict = None) -> dict:
         """
-        Retrieves the context data for the template and updates it
-        with the list of existing courses and students.
+        Returns the error of the submitted form, if any.
+
+        :param request: HTTP-request
         """
-        context = super().get_context_data()
-        context['students'] = site.students
-        context['courses'] = site.courses
-        return context
+        return {'error': request.get('error') if request else None}
+
+    @staticmethod
+    def find_by_name(mapper_name: str, name: str):
+        """
+        Returns the object with the given name.
+        If nothing found raises a RecordNotFoundError naming it.
+
+        :param mapper_name: name of the mapper of the objects
+        :param name: name of the object
+        """
+        try:
+            return get_registry().get_current_mapper(
+                mapper_name).return_all().filter(name=name).first()
+        except RecordNotFoundError:
+            raise RecordNotFoundError(
+                f'there is no {mapper_name} named {name}') from None
 
     def create_object(self, data: dict):
         """
         Retrieves the course and student's name from the POST-request
-        data. Then retrieves the objects for the two. And finally
-        enlists the student in the course.
+        data. Then retrieves the objects for the two from the database.
+        And finally enlists the student in the course and registers
+        the enrollment to be saved.
 
         :param data: POST-request data
         """
         course_name = data['course_name']
         course_name = Application.decode_value(course_name)
-        course = site.get_course(course_name)
+        course = self.find_by_name('course', course_name)
         student_name = data['student_name']
         student_name = Application.decode_value(student_name)
-        student = site.get_student(student_name)
+        student = self.find_by_name('student', student_name)
+        if not course.observers:
+            course.observers.extend((email_notifier, text_notifier))
         course.add_student(student)
+        Enrollment(course, student).mark_new()
+
+    @debug
+    def __call__(self, request: dict) -> (str, list):
+        """
+        Main callable method. Enlists the student like the other
+        CreateViews, but if the course or the student doesn't exist,
+        renders the form again with the error and the 400 status.
+
+        :param request: HTTP-request
+        """
+        try:
+            return super().__call__(request)
+        except RecordNotFoundError as e:
+            request['error'] = str(e)
+            _, body = self.render_template_with_context(request)
+            return '400 Bad Request', body
+
+
+def register_routes(routes: UrlPaths):
+    """
+    Registers all the views of the project under their URLs.
+
+    :param routes: URL paths of the application
+    """
+    for url, view in (
+        ('/api/', CoursesApiView),
+        ('/', IndexView),
+        ('/about/', AboutView),
+        ('/contacts/', ContactsView),
+        ('/all_courses/', CoursesListView),
+        ('/create_course/', CreateCourseView),
+        ('/copy_course/', CopyCourseView),
+        ('/search/', SearchView),
+        ('/api/search/', SearchApiView),
+        ('/api/autocomplete/students/', StudentAutocompleteView),
+        ('/api/autocomplete/courses/', CourseAutocompleteView),
+        ('/all_categories/', CategoryListView),
+        ('/create_category/', CreateCategoryView),
+        ('/all_students/', StudentsListView),
+        ('/create_student/', StudentCreateView),
+        ('/enlist_student/', EnlistStudentView),
+    ):
+        routes.add_route(url)(view)